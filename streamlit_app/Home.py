@@ -1,17 +1,33 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import os
+from page_profiler import page_profiler
+
+profiler = page_profiler("Home")
+
+with profiler.section("imports"):
+    import streamlit as st
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from datetime import datetime, timedelta
+    import os
 
 # Try to import database, fallback if not available
 try:
-    from database import Database
-    db = Database()
+    from database import shared_db
+    from query_cache import shared_cache
+    from query_stats import shared_stats
+    from timeseries import chart_width_px, downsample_series
+    db = shared_db()
+    cache = shared_cache(db)
+    shared_stats(db, page="Home")
 except ImportError:
     db = None
 
+def format_change(current, previous):
+    """Percent change for st.metric deltas, None when there is no baseline"""
+    if not previous:
+        return None
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
 st.set_page_config(
     page_title="Rental Manager",
     page_icon="🏠",
@@ -33,6 +49,17 @@ def dashboard_page():
     """Main dashboard page"""
     st.title(f"Welcome, {st.session_state.user['username']}!")
     
+    if db is None:
+        st.error("Database is not available")
+        st.stop()
+    company_id = st.session_state.user['company_id']
+    with profiler.section("dashboard summary"):
+        summary = cache.get(
+            ('dashboard_summary', company_id, datetime.now().date()),
+            ('Bookings', 'RentalItems'),
+            lambda: db.get_dashboard_summary(company_id)
+        )
+    
     # Sidebar
     with st.sidebar:
         st.markdown(f"**Role:** {st.session_state.user['role'].title()}")
@@ -40,9 +67,9 @@ def dashboard_page():
         
         # Quick stats
         st.subheader("Quick Stats")
-        st.metric("Active Items", "24")
-        st.metric("Total Bookings", "156")
-        st.metric("Monthly Revenue", "€2,450")
+        st.metric("Active Items", summary['available_items'])
+        st.metric("Total Bookings", f"{summary['total_bookings']:,}")
+        st.metric("Monthly Revenue", f"€{summary['revenue_this_month']:,.0f}")
         
         st.markdown("---")
         
@@ -61,22 +88,22 @@ def dashboard_page():
     with col1:
         st.metric(
             label="Total Revenue",
-            value="€12,450",
-            delta="12.5%"
+            value=f"€{summary['total_revenue']:,.0f}",
+            delta=format_change(summary['revenue_this_month'], summary['revenue_last_month'])
         )
     
     with col2:
         st.metric(
             label="Active Bookings",
-            value="23",
-            delta="3"
+            value=summary['active_bookings'],
+            delta=f"{summary['status_counts']['pending']} pending"
         )
     
     with col3:
         st.metric(
             label="Total Items",
-            value="45",
-            delta="2"
+            value=summary['total_items'],
+            delta=summary['items_added_this_month'] or None
         )
     
     with col4:
@@ -91,37 +118,37 @@ def dashboard_page():
     
     col1, col2 = st.columns(2)
     
-    with col1:
+    with col1, profiler.section("revenue chart"):
         st.subheader("Revenue Trend")
         
-        # Sample revenue data
-        dates = pd.date_range(start='2025-01-01', end='2025-09-05', freq='D')
+        daily = cache.get(
+            ('daily_stats', company_id),
+            ('Bookings', 'RentalItems'),
+            lambda: db.get_daily_stats(company_id)
+        )
         revenue_data = pd.DataFrame({
-            'date': dates,
-            'revenue': [100 + i * 2 + (i % 7) * 50 for i in range(len(dates))]
+            'date': pd.to_datetime([row.day for row in daily]),
+            'revenue': [float(row.revenue) for row in daily]
         })
+        # Sent to the browser at most one point per pixel of chart width
+        revenue_data, resolution = downsample_series(revenue_data, 'date', 'revenue', width_px=chart_width_px())
         
         fig_revenue = px.line(
             revenue_data, 
             x='date', 
             y='revenue',
-            title="Daily Revenue"
+            title=f"{resolution} Revenue"
         )
         fig_revenue.update_layout(height=400)
         st.plotly_chart(fig_revenue, use_container_width=True)
     
-    with col2:
+    with col2, profiler.section("status chart"):
         st.subheader("Booking Status")
         
-        # Sample booking status data
-        status_data = {
-            'Status': ['Confirmed', 'Pending', 'Completed', 'Cancelled'],
-            'Count': [45, 12, 89, 5]
-        }
-        
+        status_counts = summary['status_counts']
         fig_status = px.pie(
-            values=status_data['Count'],
-            names=status_data['Status'],
+            values=list(status_counts.values()),
+            names=[status.title() for status in status_counts],
             title="Booking Distribution"
         )
         fig_status.update_layout(height=400)
@@ -180,16 +207,19 @@ def dashboard_page():
     
     with col1:
         st.markdown("#### This Month")
-        st.metric("Bookings", "67", "+15%")
-        st.metric("Revenue", "€3,240", "+22%")
-        st.metric("New Customers", "12", "+8%")
+        st.metric("Bookings", summary['bookings_this_month'],
+                  format_change(summary['bookings_this_month'], summary['bookings_last_month']))
+        st.metric("Revenue", f"€{summary['revenue_this_month']:,.0f}",
+                  format_change(summary['revenue_this_month'], summary['revenue_last_month']))
+        st.metric("New Customers", summary['new_customers_this_month'],
+                  format_change(summary['new_customers_this_month'], summary['new_customers_last_month']))
     
-    with col2:
+    with col2, profiler.section("top items"):
         st.markdown("#### Top Items")
         top_items = pd.DataFrame({
-            'Item': ['Professional Camera', 'Power Drill', 'Mountain Bike', 'Projector'],
-            'Bookings': [23, 18, 15, 12],
-            'Revenue': ['€1,150', '€720', '€900', '€480']
+            'Item': [item['name'] for item in summary['top_items']],
+            'Bookings': [item['bookings'] for item in summary['top_items']],
+            'Revenue': [f"€{item['revenue']:,.0f}" for item in summary['top_items']]
         })
         st.dataframe(top_items, use_container_width=True)
     
@@ -214,6 +244,7 @@ def dashboard_page():
 def main():
     """Main application entry point"""
     dashboard_page()
+    profiler.render_sidebar()
 
 if __name__ == "__main__":
     main()
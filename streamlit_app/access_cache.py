@@ -0,0 +1,87 @@
+"""In-process cache of access codes, for contactless door unlocks.
+
+Door controllers call RentsterDB.validate_access every time a code is
+presented, so validations are answered from memory. For each location the
+cache holds the grants valid at any time in a window of `window` seconds,
+keyed by code. A validation inside the window is a dict lookup plus a
+comparison of timestamps. One outside it, because the window has run out
+or `at` lies elsewhere, reloads that location for a new window starting at
+`at` through the (location_id, valid_to) index.
+
+Grants written through RentsterDB drop their location's entry once the
+write has committed, and the cache counts the write against the
+AccessControl change counter. Any other change to the counter, such as a
+write from another process, is noticed within `max_staleness` seconds
+and clears the whole cache.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import to_timestamp
+
+class AccessCodeCache:
+    def __init__(self, db, window=3600, max_staleness=1.0):
+        self.db = db
+        self.window = window
+        self.max_staleness = max_staleness
+        self.version = None
+        self.loads = 0
+        self._checked_at = 0.0
+        self._generation = 0
+        self._locations = {}  # location_id -> (window start, window end, {code: [AccessGrant, ...]})
+        self._lock = threading.Lock()
+
+    def validate(self, location_id, code, at=None):
+        """The AccessGrant letting `code` open location_id at `at` (default now), or None"""
+        stamp = to_timestamp(datetime.now(timezone.utc) if at is None else at)
+        self._sync()
+        entry = self._locations.get(location_id)
+        if entry is None or not entry[0] <= stamp <= entry[1]:
+            entry = self._load(location_id, stamp)
+        for grant in entry[2].get(str(code), ()):
+            if grant.valid_from <= stamp <= grant.valid_to:
+                return grant
+        return None
+
+    def invalidate(self, location_id=None):
+        """Forget one location's codes, or every location's"""
+        with self._lock:
+            self._generation += 1
+            if location_id is None:
+                self._locations = {}
+            else:
+                self._locations.pop(location_id, None)
+
+    def grant_written(self, location_id):
+        """A write of one AccessControl row at location_id committed through our RentsterDB"""
+        with self._lock:
+            self._generation += 1
+            self._locations.pop(location_id, None)
+            if self.version is not None:
+                self.version += 1
+
+    def _load(self, location_id, stamp):
+        end = to_timestamp(datetime.fromisoformat(stamp) + timedelta(seconds=self.window))
+        generation = self._generation
+        codes = {}
+        for grant in self.db.get_access_grants(location_id, stamp, end):
+            codes.setdefault(grant.access_code, []).append(grant)
+        entry = (stamp, end, codes)
+        with self._lock:
+            self.loads += 1
+            # A write committed while loading may be missing from this result
+            if generation == self._generation:
+                self._locations[location_id] = entry
+        return entry
+
+    def _sync(self):
+        """Clear the cache if AccessControl changed, checking at most every max_staleness seconds"""
+        now = time.monotonic()
+        if now - self._checked_at < self.max_staleness:
+            return
+        self._checked_at = now
+        version = self.db.table_versions(('AccessControl',))[0]
+        if version != self.version:
+            self.invalidate()
+            self.version = version
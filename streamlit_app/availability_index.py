@@ -0,0 +1,247 @@
+"""In-memory per-item availability bitmaps for fast "is it free?" checks.
+
+Each item gets one row of booleans, one per day over a rolling horizon
+starting today, set where a non-cancelled booking covers that day. The
+array lives in a memory-mapped .npy file next to the database, so a new
+process maps it instead of rebuilding it from SQL.
+
+The index tracks the Bookings change counter. Writes made through the
+attached RentsterDB (create_booking, the status transitions) patch the
+affected item rows in memory; any other write, e.g. from another process,
+is noticed within `max_staleness` seconds and triggers a full rebuild.
+
+Several processes may share the file. It is mapped copy-on-write, so
+patches stay private to the process that made them, and only a rebuild
+publishes a new file: data and metadata are written to temporary files
+and both replaced under an exclusive lock on `<path>.lock`, and read as a
+pair under a shared one. A process starting after bookings changed since
+the last rebuild rebuilds rather than map a stale file.
+Ranges outside the horizon fall back to RentsterDB.find_conflicts.
+Availability here means "no active booking"; availability_status is not
+considered.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+import numpy as np
+
+from database import epoch_day
+
+class AvailabilityIndex:
+    def __init__(self, db, horizon_days=730, path=None, max_staleness=1.0, rebuild_after_days=30):
+        self.db = db
+        self.horizon_days = horizon_days
+        self.path = path
+        self.max_staleness = max_staleness
+        self.rebuild_after_days = rebuild_after_days
+        self._lock = threading.Lock()
+        self._days = np.zeros((0, horizon_days), dtype=bool)
+        self.origin = None
+        self.version = None
+        self._checked_at = 0.0
+        if not self._load():
+            self.rebuild()
+
+    def is_free(self, item_id, start_date, end_date):
+        """True if the item has no active booking on any day of [start_date, end_date]"""
+        first, last = self._window(start_date, end_date)
+        if first is None:
+            return not self.db.find_conflicts([item_id], start_date, end_date)
+        days = self._days
+        if item_id >= len(days):
+            return True
+        return not days[item_id, first:last + 1].any()
+
+    def free_items(self, item_ids, start_date, end_date):
+        """The item_ids (as a NumPy array, in the given order) free for the whole range"""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        first, last = self._window(start_date, end_date)
+        if first is None:
+            busy = self.db.find_conflicts(item_ids.tolist(), start_date, end_date)
+            return item_ids[~np.isin(item_ids, list(busy))]
+        days = self._days
+        busy = np.zeros(len(item_ids), dtype=bool)
+        known = item_ids < len(days)
+        busy[known] = days[item_ids[known], first:last + 1].any(axis=1)
+        return item_ids[~busy]
+
+    def bookings_changed(self, item_ids, version, writes=1):
+        """Patch rows for items whose bookings a transaction of `writes` row writes, ending at `version`, touched.
+
+        If any other write happened since the index was last in sync, the
+        index is marked stale and rebuilt on the next lookup instead.
+        """
+        with self._lock:
+            if self.version is None or version != self.version + writes:
+                self.version = None
+                return
+            if item_ids and max(item_ids) >= len(self._days):
+                self.version = None
+                return
+            for item_id in set(item_ids):
+                self._days[item_id] = self._item_row(item_id)
+            self.version = version
+
+    def rebuild(self):
+        """Rebuild every row from BookingSpans and persist the result"""
+        with self._lock:
+            version = self.db.table_versions(('Bookings',))[0]
+            origin = epoch_day(date.today())
+            with self.db.connection() as conn:
+                max_item = conn.execute("SELECT COALESCE(MAX(item_id), 0) FROM RentalItems").fetchone()[0]
+                spans = np.array(conn.execute('''
+                    SELECT item_lo, start_day, end_day FROM BookingSpans
+                    WHERE end_day >= ? AND start_day < ?
+                ''', (origin, origin + self.horizon_days)).fetchall(), dtype=np.int64).reshape(-1, 3)
+            # Headroom so new items don't force a rebuild on their first booking
+            n_rows = max(max_item, int(spans[:, 0].max(initial=0))) * 5 // 4 + 1024
+
+            days, data_path = self._allocate(n_rows)
+            self._fill(days, spans, origin)
+            if data_path:
+                days.flush()
+                # Remap privately before publishing, so later patches never reach the shared file
+                days = np.lib.format.open_memmap(data_path, mode='c')
+                self._publish(data_path, {'origin': origin, 'version': version,
+                                          'horizon_days': self.horizon_days, 'rows': n_rows})
+            self._days, self.origin, self.version = days, origin, version
+            self._checked_at = time.monotonic()
+
+    def _window(self, start_date, end_date):
+        """Column range for the dates, or (None, None) if outside the horizon"""
+        self._sync()
+        first = epoch_day(start_date) - self.origin
+        last = epoch_day(end_date) - self.origin
+        if first < 0 or last >= self.horizon_days or last < first:
+            return None, None
+        return first, last
+
+    def _sync(self):
+        """Rebuild if the Bookings table changed behind our back or the horizon has drifted"""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.max_staleness:
+            return
+        self._checked_at = now
+        stale = (
+            self.version != self.db.table_versions(('Bookings',))[0]
+            or epoch_day(date.today()) - self.origin > self.rebuild_after_days
+        )
+        if stale:
+            self.rebuild()
+
+    def _fill(self, days, spans, origin):
+        """Set every day covered by a span, a block of items at a time"""
+        horizon = self.horizon_days
+        items = spans[:, 0]
+        first = np.clip(spans[:, 1] - origin, 0, horizon - 1)
+        after = np.clip(spans[:, 2] - origin, -1, horizon - 1) + 1
+        block = max(1, (1 << 22) // (horizon + 1))
+        order = np.argsort(items, kind='stable')
+        items, first, after = items[order], first[order], after[order]
+        bounds = np.searchsorted(items, np.arange(0, len(days) + block, block))
+        for n, lo in enumerate(range(0, len(days), block)):
+            a, b = bounds[n], bounds[n + 1]
+            if a == b:
+                continue
+            rows = min(block, len(days) - lo)
+            # +1 where a span starts, -1 the day after it ends, then a running sum
+            base = (items[a:b] - lo) * (horizon + 1)
+            size = rows * (horizon + 1)
+            diff = (np.bincount(base + first[a:b], minlength=size)
+                    - np.bincount(base + after[a:b], minlength=size))
+            covered = np.cumsum(diff.reshape(rows, horizon + 1), axis=1)[:, :horizon] > 0
+            days[lo:lo + rows] = covered
+
+    def _item_row(self, item_id):
+        row = np.zeros(self.horizon_days, dtype=bool)
+        with self.db.connection() as conn:
+            spans = conn.execute('''
+                SELECT start_day, end_day FROM BookingSpans
+                WHERE item_lo <= ? AND item_hi >= ? AND end_day >= ? AND start_day < ?
+            ''', (item_id, item_id, self.origin, self.origin + self.horizon_days)).fetchall()
+        for start_day, end_day in spans:
+            row[max(start_day - self.origin, 0):end_day - self.origin + 1] = True
+        return row
+
+    def _allocate(self, n_rows):
+        """A zeroed array for n_rows items and the temporary file backing it (None in memory)"""
+        shape = (n_rows, self.horizon_days)
+        if not self.path:
+            return np.zeros(shape, dtype=bool), None
+        data_path = self._temp_path()
+        return np.lib.format.open_memmap(data_path, mode='w+', dtype=bool, shape=shape), data_path
+
+    def _temp_path(self):
+        """A new file next to the index, unique to this writer"""
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=directory)
+        os.close(fd)
+        return temp_path
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        """Hold <path>.lock, so the data file and its metadata change and are read as a pair"""
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows): each file is still replaced atomically on its own
+            yield
+            return
+        with open(self.path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _publish(self, data_path, meta):
+        """Replace the shared data file and its metadata with a freshly built pair"""
+        meta_path = self._temp_path()
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+        with self._file_lock(exclusive=True):
+            os.replace(data_path, self.path)
+            os.replace(meta_path, self.path + '.json')
+
+    def _load(self):
+        """Map a previously persisted index, copy-on-write, if it is still current"""
+        if not self.path or not os.path.exists(self.path) or not os.path.exists(self.path + '.json'):
+            return False
+        try:
+            with self._file_lock(exclusive=False):
+                with open(self.path + '.json') as f:
+                    meta = json.load(f)
+                days = np.lib.format.open_memmap(self.path, mode='c')
+        except (OSError, ValueError):
+            return False
+        current = (
+            days.dtype == bool
+            and days.shape == (meta.get('rows'), self.horizon_days)
+            and meta.get('horizon_days') == self.horizon_days
+            and meta.get('version') == self.db.table_versions(('Bookings',))[0]
+            and 0 <= epoch_day(date.today()) - meta.get('origin', 0) <= self.rebuild_after_days
+        )
+        if not current:
+            return False
+        self._days, self.origin, self.version = days, meta['origin'], meta['version']
+        self._checked_at = time.monotonic()
+        return True
+
+_shared_indexes = {}
+_shared_indexes_lock = threading.Lock()
+
+def shared_availability(db, horizon_days=730):
+    """Process-wide AvailabilityIndex for a RentsterDB, persisted next to the database file"""
+    with _shared_indexes_lock:
+        index = _shared_indexes.get(db.db_path)
+        if index is None or index.db is not db:
+            index = _shared_indexes[db.db_path] = AvailabilityIndex(
+                db, horizon_days, path=db.db_path + '.avail.npy'
+            )
+            db.availability = index
+        return index
@@ -0,0 +1,25 @@
+"""Re-runnable benchmarks for RentsterDB.
+
+Run them from the streamlit_app directory through manage.py:
+
+    python manage.py bench pool
+    python manage.py bench pool --scale 0.1 --dir /tmp/rentster-bench --keep
+
+Each benchmark seeds its own databases in a scratch directory and prints
+what it measured. The default sizes are the ones the performance work was
+specified against; --scale multiplies them for a quicker run.
+"""
+
+# Benchmark name -> module defining run(workdir, scale)
+BENCHMARKS = {
+    'pool': 'bench.pool',
+    'bulk-import': 'bench.bulk_import',
+    'nearby': 'bench.nearby',
+    'search-available': 'bench.search_available',
+    'group-commit': 'bench.group_commit',
+    'access-cache': 'bench.access_cache',
+    'report-export': 'bench.report_export',
+    'booking-transitions': 'bench.booking_transitions',
+    'record-memory': 'bench.record_memory',
+    'downsampling': 'bench.downsampling',
+}
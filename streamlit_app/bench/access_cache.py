@@ -0,0 +1,94 @@
+"""Door-controller validations per second through validate_access.
+
+Seeds grants spread over 100 locations with validity windows of one to
+seven days around now, then validates a mix of codes currently valid
+and unknown codes: through the cache, straight from the index with
+find_access_grant, and through the cache while another thread writes
+a new grant every 100 ms, each dropping its location from the cache.
+"""
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from bench.common import fresh_db, latency_summary, scaled, seed_catalog
+from database import to_timestamp
+
+LOCATIONS = 100
+
+def seed_grants(db, count, rng, now):
+    """Random grants; returns (location_id, code) pairs valid at `now`"""
+    valid = []
+    rows = []
+    for _ in range(count):
+        location_id = rng.randint(1, LOCATIONS)
+        code = f"{rng.randint(0, 999999):06d}"
+        valid_from = now + timedelta(hours=rng.randint(-30 * 24, 30 * 24))
+        valid_to = valid_from + timedelta(hours=rng.randint(24, 7 * 24))
+        if valid_from <= now <= valid_to:
+            valid.append((location_id, code))
+        rows.append((location_id, rng.randint(1, 1000), code, to_timestamp(valid_from), to_timestamp(valid_to)))
+    with db.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO AccessControl (location_id, user_id, access_code, valid_from, valid_to)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+    return valid
+
+def validations(validate, probes, seconds):
+    latencies, granted = [], 0
+    deadline = time.perf_counter() + seconds
+    for location_id, code in itertools.cycle(probes):
+        started = time.perf_counter()
+        granted += validate(location_id, code) is not None
+        latencies.append(time.perf_counter() - started)
+        if started > deadline:
+            return latencies, granted
+
+def run(workdir, scale):
+    grants = scaled(1000000, scale)
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db = fresh_db(workdir, 'access_cache')
+    seed_catalog(db, 0, users=1000, locations=LOCATIONS)
+    valid = seed_grants(db, grants, rng, now)
+    print(f"{grants:,} grants at {LOCATIONS} locations, {len(valid):,} valid now")
+
+    # Three in four presented codes are valid, the rest unknown at that door
+    probes = [
+        rng.choice(valid) if rng.random() < 0.75 else (rng.randint(1, LOCATIONS), 'x' + str(rng.randint(0, 99999)))
+        for _ in range(200000)
+    ]
+    # Load every location's window before timing
+    for location_id in range(1, LOCATIONS + 1):
+        db.validate_access(location_id, '000000')
+    loads = db.access_cache.loads
+
+    stop = threading.Event()
+
+    def write_grants():
+        while not stop.wait(0.1):
+            db.create_access_code(rng.randint(1, LOCATIONS), 1, '424242', now, now + timedelta(days=1))
+
+    for label, validate, writer in (
+        ('validate_access', db.validate_access, False),
+        ('find_access_grant', db.find_access_grant, False),
+        ('validate_access + writes', db.validate_access, True),
+    ):
+        if writer:
+            stop.clear()
+            thread = threading.Thread(target=write_grants)
+            thread.start()
+        started = time.perf_counter()
+        latencies, granted = validations(validate, probes, 2.0)
+        elapsed = time.perf_counter() - started
+        if writer:
+            stop.set()
+            thread.join()
+        print(f"{label:25} {len(latencies) / elapsed:9,.0f} validations/s  {latency_summary(latencies)}  "
+              f"{granted / len(latencies):.0%} granted")
+    print(f"cache reloads after warm-up: {db.access_cache.loads - loads:,}")
+    db.close()
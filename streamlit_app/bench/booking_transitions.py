@@ -0,0 +1,45 @@
+"""Booking state transitions: one at a time, in batches, and the nightly sweep.
+
+Single confirms run confirm_booking() once per booking, each in its own
+transaction. Batches hand transition_bookings() 10k and 48k ids at once.
+The sweep is complete_past_bookings(), run a second time to show the cost
+of a night with nothing to do.
+"""
+import random
+import time
+
+from bench.common import fresh_db, scaled, seed_bookings, seed_catalog
+
+def run(workdir, scale):
+    items, bookings = scaled(100000, scale), scaled(1000000, scale)
+    db = fresh_db(workdir, 'booking_transitions')
+    seed_catalog(db, items, users=1000)
+    seed_bookings(db, bookings, items, 1000)
+    print(f"{bookings:,} bookings across {items:,} items")
+
+    with db.connection() as conn:
+        pending = [row[0] for row in conn.execute("SELECT booking_id FROM Bookings WHERE status = 'pending'")]
+    random.Random(1).shuffle(pending)
+
+    singles = scaled(2000, scale, minimum=10)
+    started = time.perf_counter()
+    confirmed = sum(db.confirm_booking(booking_id) for booking_id in pending[:singles])
+    elapsed = time.perf_counter() - started
+    print(f"single confirm     {confirmed:8,} bookings in {elapsed:6.2f}s  {confirmed / elapsed:9,.0f}/s")
+
+    offset = singles
+    for size in (scaled(10000, scale, minimum=10), scaled(48000, scale, minimum=10)):
+        batch = pending[offset:offset + size]
+        offset += size
+        started = time.perf_counter()
+        changed = db.transition_bookings(batch, 'confirm')
+        elapsed = time.perf_counter() - started
+        print(f"batch confirm {len(batch):>6,} {len(changed):7,} bookings in {elapsed:6.2f}s  "
+              f"{len(changed) / elapsed:9,.0f}/s")
+
+    for label in ('sweep', 'sweep again'):
+        started = time.perf_counter()
+        completed = db.complete_past_bookings('2027-01-01')
+        elapsed = time.perf_counter() - started
+        print(f"{label:18} {completed:8,} bookings in {elapsed * 1e3:9.1f}ms")
+    db.close()
@@ -0,0 +1,76 @@
+"""Rows per second through bulk_insert_items/bookings/payments.
+
+Items are imported from a CSV file, bookings from a JSONL file and
+payments from an iterable of dicts, covering each input path. Each runs
+once on clean data and once with 1% bad rows (a non-numeric price, an
+unknown item or booking), which adds the row-by-row replay of failed
+batches.
+"""
+import csv
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from bench.common import CATEGORIES, STATUSES, fresh_db, scaled, seed_catalog
+
+def is_bad(i, bad_every):
+    return bad_every is not None and i % bad_every == bad_every - 1
+
+def write_items_csv(path, count, rng, bad_every):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'description', 'category', 'company_id', 'rental_price_per_day'])
+        for i in range(count):
+            price = 'n/a' if is_bad(i, bad_every) else rng.randint(5, 200)
+            writer.writerow([f"Imported item {i}", f"Description {i}", rng.choice(CATEGORIES), 1, price])
+
+def write_bookings_jsonl(path, count, items, users, rng, bad_every):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            start = date(2026, 1, 1) + timedelta(days=rng.randint(0, 700))
+            f.write(json.dumps({
+                'item_id': items + 1 if is_bad(i, bad_every) else rng.randint(1, items),
+                'user_id': rng.randint(1, users),
+                'start_date': start.isoformat(),
+                'end_date': (start + timedelta(days=rng.randint(0, 6))).isoformat(),
+                'total_price': rng.randint(10, 500),
+                'status': rng.choice(STATUSES),
+            }) + '\n')
+
+def payment_rows(count, bookings, rng, bad_every):
+    # Bad rows alternate between an unknown booking and a non-numeric amount
+    for i in range(count):
+        bad = is_bad(i, bad_every)
+        yield {
+            'booking_id': bookings + 1 if bad and i % 2 else rng.randint(1, bookings),
+            'amount': 'free' if bad and not i % 2 else rng.randint(10, 500),
+            'payment_date': f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'payment_method': 'card',
+        }
+
+def run(workdir, scale):
+    rows = scaled(200000, scale)
+    for label, bad_every in (('clean', None), ('1% bad', 100)):
+        rng = random.Random(0)
+        db = fresh_db(workdir, 'bulk_import')
+        seed_catalog(db, 0, users=1000)
+        items_path = os.path.join(workdir, 'items.csv')
+        bookings_path = os.path.join(workdir, 'bookings.jsonl')
+        write_items_csv(items_path, rows, rng, bad_every)
+        # Bad items are never inserted, so bookings only reference the good ones
+        items = rows - (rows // bad_every if bad_every else 0)
+        write_bookings_jsonl(bookings_path, rows, items, 1000, rng, bad_every)
+
+        for kind, bulk_insert, source in (
+            ('items (CSV)', db.bulk_insert_items, items_path),
+            ('bookings (JSONL)', db.bulk_insert_bookings, bookings_path),
+            ('payments (dicts)', db.bulk_insert_payments, payment_rows(rows, items, rng, bad_every)),
+        ):
+            started = time.perf_counter()
+            result = bulk_insert(source)
+            elapsed = time.perf_counter() - started
+            print(f"{label:7} {kind:17} {result.inserted:9,} inserted {len(result.errors):6,} rejected "
+                  f"in {elapsed:6.2f}s  {(result.inserted + len(result.errors)) / elapsed:9,.0f} rows/s")
+        db.close()
@@ -0,0 +1,91 @@
+"""Seeding and timing helpers shared by the benchmarks"""
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from database import RentsterDB
+from query_stats import percentile
+
+CATEGORIES = ('Tools', 'Vehicles', 'Laptops', 'Camping', 'Party')
+STATUSES = ('confirmed', 'pending', 'completed', 'cancelled')
+
+def scaled(count, scale, minimum=1):
+    return max(minimum, int(count * scale))
+
+def fresh_db(workdir, name, **kwargs):
+    """A RentsterDB on a new, empty database file in workdir"""
+    path = os.path.join(workdir, f"{name}.db")
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return RentsterDB(path, **kwargs)
+
+def seed_catalog(db, items, users=1000, companies=1, locations=0, seed=0):
+    """Companies, users, locations and items with random categories and prices.
+
+    Locations get random coordinates worldwide; items are spread evenly
+    over companies and at random over locations. 3% of items are under
+    maintenance.
+    """
+    rng = random.Random(seed)
+    with db.transaction() as conn:
+        conn.executemany("INSERT INTO Companies (name) VALUES (?)", [(f"Company {i}",) for i in range(companies)])
+        conn.executemany('''
+            INSERT INTO Users (username, email, password_hash, role, company_id)
+            VALUES (?, ?, ?, 'customer', 1)
+        ''', [(f"user{i}", f"user{i}@example.com", db.hash_password('secret')) for i in range(users)])
+        conn.executemany('''
+            INSERT INTO Locations (name, company_id, latitude, longitude) VALUES (?, ?, ?, ?)
+        ''', [
+            (f"Location {i}", 1 + i % companies, rng.uniform(-60, 70), rng.uniform(-180, 180))
+            for i in range(locations)
+        ])
+        conn.executemany('''
+            INSERT INTO RentalItems
+                (name, description, category, company_id, location_id, availability_status, rental_price_per_day)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            (f"Item {i}", f"Description of item {i}", rng.choice(CATEGORIES), 1 + i % companies,
+             rng.randint(1, locations) if locations else None,
+             'maintenance' if rng.random() < 0.03 else 'available', float(rng.randint(5, 200)))
+            for i in range(items)
+        ))
+
+def seed_bookings(db, count, items, users, first_day=date(2026, 1, 1), days=700, seed=0, chunk_size=100000):
+    """Random bookings of up to a week, created at some hour on their start day"""
+    rng = random.Random(seed)
+    for done in range(0, count, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, count - done)):
+            start = first_day + timedelta(days=rng.randint(0, days))
+            end = start + timedelta(days=rng.randint(0, 6))
+            rows.append((
+                rng.randint(1, items), rng.randint(1, users), start.isoformat(), end.isoformat(),
+                float(rng.randint(10, 500)), rng.choice(STATUSES), f"{start.isoformat()} {rng.randint(0, 23):02d}:00:00",
+            ))
+        with db.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO Bookings (item_id, user_id, start_date, end_date, total_price, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+
+def calls_per_second(func, seconds=1.0, min_calls=10):
+    """Call func repeatedly for about `seconds`; returns calls per second"""
+    calls, started = 0, time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds and calls >= min_calls:
+            return calls / elapsed
+
+def latency_summary(seconds):
+    """'p50=… p99=…' in microseconds or milliseconds for a list of latencies in seconds"""
+    values = sorted(seconds)
+    p50, p99 = percentile(values, 0.5), percentile(values, 0.99)
+    if p99 < 0.001:
+        return f"p50={p50 * 1e6:.1f}us p99={p99 * 1e6:.1f}us"
+    return f"p50={p50 * 1e3:.2f}ms p99={p99 * 1e3:.2f}ms"
@@ -0,0 +1,66 @@
+"""Points and payload sent to the browser for a revenue chart, raw against downsampled.
+
+For each series length and chart width this prints the point count and
+serialized size of the raw series and of downsample_series() output, and
+the time it took. With plotly installed the size is that of the px.line
+figure JSON (the payload st.plotly_chart sends) and the time includes
+building it. Without plotly it is the JSON of the x/y arrays that go
+into the figure.
+"""
+import importlib.util
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench.common import scaled
+from timeseries import downsample_series
+
+def revenue_series(points, freq='D', seed=0):
+    """A noisy revenue series with a trend, a 7-point cycle and occasional spikes"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(points)
+    revenue = 1000 + t * 0.5 + 200 * np.sin(2 * np.pi * t / 7) + rng.normal(0, 80, points)
+    revenue[rng.random(points) < 0.01] *= 3
+    return pd.DataFrame({'date': pd.date_range('2000-01-01', periods=points, freq=freq), 'revenue': revenue})
+
+def payload(data):
+    """Serialized figure for the series; (bytes, seconds)"""
+    started = time.perf_counter()
+    try:
+        import plotly.express as px
+    except ImportError:
+        body = json.dumps({
+            'x': data['date'].dt.strftime('%Y-%m-%dT%H:%M:%S').tolist(),
+            'y': data['revenue'].tolist(),
+        })
+    else:
+        body = px.line(data, x='date', y='revenue').to_json()
+    return len(body.encode('utf-8')), time.perf_counter() - started
+
+def run(workdir, scale):
+    if importlib.util.find_spec('plotly'):
+        print("payload: px.line figure JSON")
+    else:
+        print("payload: x/y JSON (plotly not installed)")
+
+    # The long series is per minute, so it stays within pandas' date range; it is thinned without resampling
+    series = (
+        ('1 year daily', revenue_series(365), {}),
+        ('10 years daily', revenue_series(3650), {}),
+        (f"{scaled(1000000, scale):,} points", revenue_series(scaled(1000000, scale), freq='min'), {'resample': False}),
+    )
+    for label, data, kwargs in series:
+        raw_bytes, raw_seconds = payload(data)
+        print(f"{label:18} raw {len(data):9,} points {raw_bytes / 1024:9.1f} KB {raw_seconds * 1e3:8.1f}ms")
+        for width_px in (300, 600, 1200):
+            for method in ('lttb', 'minmax'):
+                started = time.perf_counter()
+                reduced, resolution = downsample_series(data, 'date', 'revenue', width_px=width_px, method=method, **kwargs)
+                resolution = resolution if kwargs.get('resample', True) else '-'
+                downsample_seconds = time.perf_counter() - started
+                reduced_bytes, reduced_seconds = payload(reduced)
+                print(f"{'':18} {width_px:4}px {method:6} {resolution:7} {len(reduced):6,} points "
+                      f"{reduced_bytes / 1024:7.1f} KB  downsample {downsample_seconds * 1e3:6.1f}ms "
+                      f"serialize {reduced_seconds * 1e3:6.1f}ms")
@@ -0,0 +1,60 @@
+"""Writes per second and write latency with and without write-behind.
+
+Each of 1, 8 or 64 threads calls create_booking in a loop for a fixed
+time, every call booking a distinct item and week so none conflict.
+"Direct" is one transaction per call; "write-behind" queues the calls on
+the group-commit writer thread.
+"""
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from bench.common import fresh_db, latency_summary, seed_catalog
+
+def hammer(db, writers, items, seconds):
+    """Run `writers` threads of create_booking for `seconds`; returns (latencies, errors)"""
+    latencies, errors = [], []
+    barrier = threading.Barrier(writers)
+    lock = threading.Lock()
+
+    def write(w):
+        mine, failed = [], 0
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        n = 0
+        while time.perf_counter() < deadline:
+            slot = n * writers + w
+            start = date(2030, 1, 1) + timedelta(days=7 * (slot // items))
+            started = time.perf_counter()
+            try:
+                db.create_booking(1 + slot % items, 1, start, start + timedelta(days=1), 10.0)
+            except sqlite3.OperationalError:
+                failed += 1
+            mine.append(time.perf_counter() - started)
+            n += 1
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors)
+
+def run(workdir, scale):
+    items = 5000
+    seconds = max(0.5, 3.0 * scale)
+    for writers in (1, 8, 64):
+        for label, write_behind in (('direct', False), ('write-behind', True)):
+            db = fresh_db(workdir, 'group_commit', pool_size=writers + 1)
+            seed_catalog(db, items, users=10)
+            if write_behind:
+                db.enable_write_behind()
+            latencies, errors = hammer(db, writers, items, seconds)
+            groups = f"  {db.writer.writes / max(db.writer.groups, 1):5.1f} writes/group" if write_behind else ''
+            print(f"{writers:3} writers  {label:12} {len(latencies) / seconds:8,.0f} writes/s  "
+                  f"{latency_summary(latencies)}  {errors} locked{groups}")
+            db.close()
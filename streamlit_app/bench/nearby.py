@@ -0,0 +1,53 @@
+"""Latency of find_items_near against scanning every location.
+
+The scan is what "items near me" took before the R*Tree: read the
+coordinates of every location, compute all the distances, then fetch the
+items of those in range.
+"""
+import math
+import random
+import time
+
+from bench.common import latency_summary, fresh_db, scaled, seed_catalog
+from database import EARTH_RADIUS_KM
+
+def scan_every_location(db, latitude, longitude, radius_km):
+    import numpy as np
+
+    with db.connection() as conn:
+        rows = conn.execute('''
+            SELECT location_id, latitude, longitude FROM Locations WHERE latitude IS NOT NULL
+        ''').fetchall()
+        ids = np.array([row[0] for row in rows])
+        coords = np.radians(np.array([row[1:] for row in rows], dtype=float))
+        lat0, lon0 = math.radians(latitude), math.radians(longitude)
+        a = (np.sin((coords[:, 0] - lat0) / 2) ** 2
+             + math.cos(lat0) * np.cos(coords[:, 0]) * np.sin((coords[:, 1] - lon0) / 2) ** 2)
+        near = ids[2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0))) <= radius_km]
+        return conn.execute(f'''
+            SELECT * FROM RentalItems WHERE location_id IN ({','.join('?' * len(near))})
+        ''', [int(i) for i in near]).fetchall()
+
+def run(workdir, scale):
+    items, locations = scaled(1000000, scale), scaled(100000, scale)
+    db = fresh_db(workdir, 'nearby')
+    seed_catalog(db, items, users=10, companies=20, locations=locations)
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+    print(f"{items:,} items at {locations:,} locations")
+    # Warm the page cache and the NumPy import before timing
+    db.find_items_near(0.0, 0.0, 1)
+    scan_every_location(db, 0.0, 0.0, 1)
+
+    rng = random.Random(1)
+    # Centres drawn from the same band the locations were placed in
+    centres = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(50)]
+    for radius_km in (10, 50, 200):
+        for label, search in (('find_items_near', db.find_items_near), ('scan', lambda *a: scan_every_location(db, *a))):
+            latencies, found = [], 0
+            for latitude, longitude in centres:
+                started = time.perf_counter()
+                found += len(search(latitude, longitude, radius_km))
+                latencies.append(time.perf_counter() - started)
+            print(f"{radius_km:4} km  {label:16} {found / len(centres):8.1f} items/query  {latency_summary(latencies)}")
+    db.close()
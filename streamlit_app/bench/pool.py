@@ -0,0 +1,63 @@
+"""Calls per second through the connection pool versus a connection per call.
+
+The "per call" side is RentsterDB with connection() swapped for one that
+opens a plain sqlite3 connection and closes it when the call returns,
+which is what every method did before the pool.
+"""
+import itertools
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from bench.common import calls_per_second, fresh_db, scaled, seed_bookings, seed_catalog
+from database import RentsterDB
+
+class ConnectPerCallDB(RentsterDB):
+    """RentsterDB opening and closing a connection for every call"""
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            conn.close()
+
+def run(workdir, scale):
+    items, users, bookings = scaled(2000, scale), scaled(1000, scale), scaled(100000, scale)
+    db = fresh_db(workdir, 'pool')
+    seed_catalog(db, items, users=users, companies=20)
+    seed_bookings(db, bookings, items, users)
+    db.close()
+    print(f"{bookings:,} bookings, {items:,} items, {users:,} users")
+
+    results = {}
+    for label, factory in (('per call', ConnectPerCallDB), ('pooled', RentsterDB)):
+        db = factory(db.db_path)
+        counter = itertools.count()
+
+        def book():
+            # A new item, or a new week once every item has been booked
+            n = next(counter)
+            start = date(2030, 1, 1) + timedelta(days=7 * (n // items))
+            return db.create_booking(1 + n % items, 1, start, start + timedelta(days=1), 10.0)
+
+        calls = {
+            'authenticate_user': lambda: db.authenticate_user('user7@example.com', 'secret'),
+            'get_rental_items(company)': lambda: db.get_rental_items(3),
+            'get_bookings(user)': lambda: db.get_bookings(user_id=7),
+            'create_booking': book,
+        }
+        for name, call in calls.items():
+            results.setdefault(name, {})[label] = calls_per_second(call)
+        db.close()
+
+    print(f"{'call':28} {'per call':>12} {'pooled':>12}  speedup")
+    for name, rates in results.items():
+        print(f"{name:28} {rates['per call']:10,.0f}/s {rates['pooled']:10,.0f}/s  "
+              f"{rates['pooled'] / rates['per call']:.1f}x")
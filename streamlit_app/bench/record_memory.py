@@ -0,0 +1,44 @@
+"""Python memory held by booking listings, per 1M bookings.
+
+Each listing runs under tracemalloc on its own: get_bookings() as Booking
+records, as column lists and as NumPy columns, and iter_bookings()
+streamed through without keeping the rows. "held" is what the result
+still occupies once returned, "peak" the most allocated along the way.
+"""
+import gc
+import time
+import tracemalloc
+
+from bench.common import fresh_db, scaled, seed_bookings, seed_catalog
+
+def traced(func):
+    """Run func under tracemalloc; returns (bytes held by its result, peak bytes, seconds)"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return held, peak, elapsed
+
+def run(workdir, scale):
+    items, bookings = scaled(10000, scale), scaled(1000000, scale)
+    db = fresh_db(workdir, 'record_memory')
+    seed_catalog(db, items, users=1000)
+    seed_bookings(db, bookings, items, 1000)
+    print(f"{bookings:,} bookings, memory scaled to 1M")
+    # Open the pooled connection before tracing
+    db.get_bookings(limit=1)
+
+    per_million = 1e6 / bookings / 2 ** 20
+    for label, listing in (
+        ('get_bookings()', lambda: db.get_bookings()),
+        ("columnar=True", lambda: db.get_bookings(columnar=True)),
+        ("columnar='numpy'", lambda: db.get_bookings(columnar='numpy')),
+        ('iter_bookings()', lambda: sum(1 for _ in db.iter_bookings())),
+    ):
+        held, peak, elapsed = traced(listing)
+        print(f"{label:18} held {held * per_million:7.1f} MB  peak {peak * per_million:7.1f} MB  in {elapsed:6.2f}s")
+    db.close()
@@ -0,0 +1,65 @@
+"""Peak memory and rows per second exporting a large Booking Report to CSV.
+
+The export runs in a fresh child process, so its peak RSS covers only
+the report and not the seeding done here. The target is under 200 MB for
+5M rows.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+from datetime import date
+
+from bench.common import fresh_db, scaled, seed_bookings, seed_catalog
+
+def peak_rss():
+    """Peak resident set size of this process in bytes.
+
+    Linux keeps ru_maxrss across exec, so a child would report its parent's
+    peak; VmHWM belongs to the current process image only.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+def export(db_path):
+    """Export every booking of company 1 to CSV; returns rows, seconds, file size and peak RSS"""
+    from database import RentsterDB
+    from reports import start_report
+
+    db = RentsterDB(db_path)
+    job = start_report(db, "Booking Report", 'CSV', 1, date(2020, 1, 1), date(2030, 12, 31), chunk_size=5000)
+    job.wait()
+    if job.error is not None:
+        raise job.error
+    size = os.path.getsize(job.path)
+    job.cleanup()
+    db.close()
+    return {'rows': job.rows_written, 'seconds': job.finished_at - job.started_at, 'bytes': size, 'peak_rss': peak_rss()}
+
+def run(workdir, scale):
+    bookings = scaled(5000000, scale)
+    db = fresh_db(workdir, 'report_export')
+    # One company, so the report covers every booking
+    seed_catalog(db, 10000, users=10000)
+    seed_bookings(db, bookings, 10000, 10000)
+    db.close()
+    print(f"{bookings:,} bookings")
+
+    streamlit_app = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, '-c', f"import json; from bench.report_export import export; print(json.dumps(export({db.db_path!r})))"],
+        cwd=streamlit_app, check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    print(f"{result['rows']:,} rows, {result['bytes'] / 1e6:,.0f} MB of CSV in {result['seconds']:.1f}s "
+          f"({result['rows'] / result['seconds']:,.0f} rows/s)")
+    verdict = 'under' if result['peak_rss'] < 200e6 else 'OVER'
+    print(f"peak RSS of the exporting process: {result['peak_rss'] / 1e6:.0f} MB ({verdict} the 200 MB target)")
@@ -0,0 +1,59 @@
+"""Latency of search_available against filtering in Python.
+
+The Python side is what the request described: fetch every item with
+get_rental_items() and every booking with get_bookings(), then keep the
+items of the category with no active booking overlapping the dates.
+"""
+import random
+import time
+from datetime import date, timedelta
+
+from bench.common import CATEGORIES, fresh_db, latency_summary, scaled, seed_bookings, seed_catalog
+
+def filter_in_python(db, category, start_date, end_date, limit):
+    busy = {
+        b.item_id for b in db.get_bookings()
+        if b.status != 'cancelled' and b.start_date <= end_date and b.end_date >= start_date
+    }
+    free = [
+        item for item in db.get_rental_items()
+        if item.category == category and item.availability_status != 'maintenance' and item.item_id not in busy
+    ]
+    return free[:limit]
+
+def run(workdir, scale):
+    items, bookings = scaled(100000, scale), scaled(1000000, scale)
+    db = fresh_db(workdir, 'search_available')
+    seed_catalog(db, items, users=1000, companies=20, locations=scaled(1000, scale))
+    seed_bookings(db, bookings, items, 1000)
+    print(f"{bookings:,} bookings across {items:,} items")
+
+    rng = random.Random(1)
+    windows = []
+    for _ in range(50):
+        start = date(2026, 1, 1) + timedelta(days=rng.randint(0, 700))
+        windows.append((rng.choice(CATEGORIES), start.isoformat(), (start + timedelta(days=2)).isoformat()))
+
+    for label, kwargs in (('category', {}), ('location + price', {'location_id': 7, 'price_range': (20, 80)})):
+        latencies, found = [], 0
+        for category, start, end in windows:
+            # The first page, then the one after it
+            after = None
+            for _ in range(2):
+                started = time.perf_counter()
+                page = db.search_available(category, start, end, after=after, limit=50, **kwargs)
+                latencies.append(time.perf_counter() - started)
+                found += len(page)
+                if len(page) < 50:
+                    break
+                after = page[-1].item_id
+        print(f"search_available {label:18} {latency_summary(latencies)}  {found / len(latencies):.1f} rows/page")
+
+    # The Python filter reads every row, so a few runs are enough
+    latencies = []
+    for category, start, end in windows[:3]:
+        started = time.perf_counter()
+        filter_in_python(db, category, start, end, 50)
+        latencies.append(time.perf_counter() - started)
+    print(f"{'filter in Python':35} {latency_summary(latencies)}")
+    db.close()
@@ -0,0 +1,45 @@
+"""Day bucketing for the calendar views.
+
+Bookings are expanded across every day they cover in one vectorized pass,
+so rendering a month grid is one dictionary lookup per cell no matter how
+many bookings there are.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+def bucket_bookings(bookings, start, end, date_column='date', duration_column='duration'):
+    """Map every day in [start, end] to the row positions of bookings active that day.
+
+    A booking starting on day D with duration n (days, at least 1) covers
+    D .. D+n-1. Positions index into `bookings` (use .iloc) and keep the
+    frame's order within each day.
+    """
+    window_start = np.datetime64(start, 'D')
+    window_end = np.datetime64(end, 'D')
+    n_days = int((window_end - window_start) // np.timedelta64(1, 'D')) + 1
+    
+    starts = pd.to_datetime(bookings[date_column]).to_numpy().astype('datetime64[D]')
+    durations = np.maximum(bookings[duration_column].to_numpy(dtype=np.int64), 1)
+    ends = starts + (durations - 1).astype('timedelta64[D]')
+    
+    # Clip each booking that overlaps the window to the part inside it
+    positions = np.flatnonzero((starts <= window_end) & (ends >= window_start))
+    first = (np.maximum(starts[positions], window_start) - window_start).astype(np.int64)
+    last = (np.minimum(ends[positions], window_end) - window_start).astype(np.int64)
+    lengths = last - first + 1
+    
+    # One entry per (booking, day): repeat each booking over its clipped span
+    rows = np.repeat(positions, lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    days = np.repeat(first, lengths) + offsets
+    
+    order = np.argsort(days, kind='stable')
+    rows, days = rows[order], days[order]
+    bounds = np.searchsorted(days, np.arange(n_days + 1))
+    
+    return {
+        start + timedelta(days=day): rows[bounds[day]:bounds[day + 1]]
+        for day in range(n_days)
+    }
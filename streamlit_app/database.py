@@ -1,20 +1,406 @@
 import sqlite3
+import csv
 import hashlib
-from datetime import datetime
+import json
+import math
+import queue
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from functools import wraps
 import os
 
+# Connection-level settings applied once when a pooled connection is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",      # 16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Mean Earth radius used for great-circle distances
+EARTH_RADIUS_KM = 6371.0088
+
+def to_iso_date(value):
+    """Normalize a date, datetime or ISO string to 'YYYY-MM-DD'"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    return date.fromisoformat(str(value)[:10]).isoformat()
+
+def to_timestamp(value):
+    """Normalize a datetime, date or ISO string to UTC 'YYYY-MM-DD HH:MM:SS', as CURRENT_TIMESTAMP stores it.
+
+    Naive datetimes are taken to be UTC already.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    elif not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def epoch_day(value):
+    """Days since 1970-01-01 for a date, datetime or ISO string"""
+    return date.fromisoformat(to_iso_date(value)).toordinal() - date(1970, 1, 1).toordinal()
+
+# Typed result records. They are namedtuples, so they stay as compact as
+# plain tuples and positional access keeps working for existing callers.
+RentalItem = namedtuple('RentalItem', [
+    'item_id', 'name', 'description', 'category', 'company_id', 'location_id',
+    'availability_status', 'rental_price_per_day', 'image_url', 'created_at',
+    'company_name', 'location_name',
+])
+Booking = namedtuple('Booking', [
+    'booking_id', 'item_id', 'user_id', 'start_date', 'end_date', 'total_price',
+    'status', 'created_at', 'item_name', 'username',
+])
+User = namedtuple('User', ['user_id', 'username', 'email', 'role', 'company_id'])
+NearbyItem = namedtuple('NearbyItem', RentalItem._fields + ('latitude', 'longitude', 'distance_km'))
+Location = namedtuple('Location', [
+    'location_id', 'name', 'address', 'company_id', 'latitude', 'longitude',
+])
+CalendarBooking = namedtuple('CalendarBooking', [
+    'booking_id', 'item_id', 'item_name', 'customer', 'start_date', 'end_date', 'status',
+])
+DailyStats = namedtuple('DailyStats', [
+    'day', 'bookings', 'confirmed', 'pending', 'completed', 'cancelled', 'revenue',
+])
+FeedBooking = namedtuple('FeedBooking', [
+    'booking_id', 'seq', 'deleted', 'item_id', 'item_name', 'location_id', 'customer',
+    'start_date', 'end_date', 'status', 'created_at',
+])
+CategoryStats = namedtuple('CategoryStats', ['month', 'category', 'bookings', 'revenue'])
+AccessGrant = namedtuple('AccessGrant', [
+    'access_id', 'location_id', 'user_id', 'access_code', 'valid_from', 'valid_to',
+])
+Payment = namedtuple('Payment', [
+    'payment_id', 'booking_id', 'amount', 'payment_date', 'payment_method',
+    'transaction_id', 'status',
+])
+
+# Outcome of a bulk import: rows inserted and (line_number, message) per rejected row
+ImportResult = namedtuple('ImportResult', ['inserted', 'errors'])
+
+def read_rows(source):
+    """Yield (line_number, row) pairs from a CSV/JSONL path or an iterable of dicts.
+
+    A JSONL line that isn't valid JSON comes back as the ValueError raised
+    parsing it, so the caller can reject that line and carry on.
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        yield from enumerate(source, start=1)
+        return
+    with open(source, newline='', encoding='utf-8') as f:
+        if str(source).endswith('.jsonl'):
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        row = e
+                    yield line_number, row
+        else:
+            # Line 1 is the CSV header
+            yield from enumerate(csv.DictReader(f), start=2)
+
+def to_number(value, kind=float):
+    """An imported value as a finite float, or a whole int; ValueError for anything else"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"not a number: {value!r}")
+    number = kind(value)
+    if kind is float and not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    if kind is int and isinstance(value, float) and number != value:
+        raise ValueError(f"not a whole number: {value!r}")
+    return number
+
+def record_factory(record):
+    """Build a row_factory that turns result rows into `record` instances"""
+    make = record._make
+    return lambda cursor, row: make(row)
+
+def fetch_columns(cursor, record, chunk_size=10000, as_numpy=False):
+    """Read a cursor into a dict of column name -> list (or NumPy array).
+
+    Rows are consumed in chunks so no per-row objects are kept alive.
+    """
+    columns = [[] for _ in record._fields]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for column, values in zip(columns, zip(*rows)):
+            column.extend(values)
+    if as_numpy:
+        import numpy as np
+        columns = [np.array(column) for column in columns]
+    return dict(zip(record._fields, columns))
+
+def env_flag(name):
+    """True if the environment variable is set to 1/true/yes/on"""
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+_shared_dbs = {}
+_shared_dbs_lock = threading.Lock()
+
+def shared_db(db_path="rentster.db"):
+    """Process-wide RentsterDB for db_path, so every page and rerun reuses one pool.
+
+    RENTSTER_WRITE_BEHIND=1 turns on group commit for its writes, and
+    RENTSTER_AVAILABILITY_INDEX=1 attaches the shared AvailabilityIndex.
+    """
+    with _shared_dbs_lock:
+        db = _shared_dbs.get(db_path)
+        if db is None:
+            db = _shared_dbs[db_path] = RentsterDB(db_path, write_behind=env_flag('RENTSTER_WRITE_BEHIND'))
+            if env_flag('RENTSTER_AVAILABILITY_INDEX'):
+                from availability_index import shared_availability
+                shared_availability(db)
+        return db
+
+def queued_write(method):
+    """Run a write method through the group-commit writer when one is attached.
+
+    The caller blocks until the group holding its write commits; use
+    RentsterDB.submit_write for the Future instead. A call made while the
+    thread already holds a connection, e.g. inside db.transaction(), runs
+    inline as part of that transaction: the writer would otherwise wait on
+    the caller's write lock while the caller waits on the writer.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self._queues_writes():
+            return method(self, *args, **kwargs)
+        return self.writer.submit(method, self, *args, **kwargs).result()
+    return wrapper
+
 class RentsterDB:
-    def __init__(self, db_path="rentster.db"):
+    def __init__(self, db_path="rentster.db", pool_size=8, pool_timeout=30.0, write_behind=False):
         self.db_path = db_path
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._idle = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+        self._local = threading.local()
+        # Optional AvailabilityIndex told about booking writes (see availability_index.py)
+        self.availability = None
+        # Optional QueryStats recording query timings (see query_stats.py)
+        self.stats = None
+        # Optional GroupCommitWriter that write methods are queued on (see group_commit.py)
+        self.writer = None
+        # AccessCodeCache behind validate_access, created on first use (see access_cache.py)
+        self.access_cache = None
         self.init_database()
+        if write_behind:
+            self.enable_write_behind()
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """Open a new connection with the connection-level PRAGMAs applied"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def _acquire(self):
+        """Take an idle connection from the pool, opening one if below pool_size"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("RentsterDB pool is closed")
+            grow = self._opened < self.pool_size
+            if grow:
+                self._opened += 1
+        if grow:
+            try:
+                return self.get_connection()
+            except Exception:
+                with self._pool_lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.pool_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("timed out waiting for a pooled connection")
+    
+    def _release(self, conn):
+        """Return a connection to the pool, discarding it if the pool was closed"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._pool_lock:
+            if self._closed:
+                self._opened -= 1
+                conn.close()
+                return
+        self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; nested use in one thread shares it"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        stats = self.stats
+        if stats is not None:
+            conn.set_trace_callback(stats.trace)
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+            if stats is not None:
+                stats.statement_done()
+    
+    @contextmanager
+    def transaction(self, immediate=True):
+        """Run a block in a transaction: commit on success, roll back on error.
+
+        Nested transactions in the same thread become savepoints.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                conn.execute("SAVEPOINT nested")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute("ROLLBACK TO nested")
+                    conn.execute("RELEASE nested")
+                    raise
+                conn.execute("RELEASE nested")
+                return
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+    
+    def enable_write_behind(self, max_batch=256, max_delay=0.002):
+        """Start a writer thread that commits create_booking, create_user etc. in groups"""
+        from group_commit import GroupCommitWriter
+        
+        if self.writer is None:
+            self.writer = GroupCommitWriter(self, max_batch=max_batch, max_delay=max_delay)
+        return self.writer
+    
+    def submit_write(self, method, *args, **kwargs):
+        """Queue a write, e.g. submit_write(db.create_booking, ...); returns a Future of its result.
+
+        Without write-behind, or inside a connection this thread already holds,
+        the write runs now and the Future is already done.
+        """
+        if self._queues_writes():
+            return self.writer.submit(method, *args, **kwargs)
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(method(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def _queues_writes(self):
+        """Whether a write from this thread goes to the writer: only top-level calls from other threads"""
+        return (
+            self.writer is not None
+            and not self.writer.in_writer_thread()
+            and getattr(self._local, 'conn', None) is None
+        )
+    
+    def close(self):
+        """Close all idle pooled connections; borrowed ones close on release"""
+        if self.writer is not None:
+            self.writer.close()
+        with self._pool_lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._pool_lock:
+                self._opened -= 1
+    
+    # Ordered schema migrations. PRAGMA user_version records how many have
+    # been applied, so an up-to-date database skips all DDL with one read.
+    # Append new migrations; never edit or reorder ones that have shipped.
+    MIGRATIONS = (
+        '_migrate_001_base_schema',
+        '_migrate_002_lookup_indexes',
+        '_migrate_003_booking_spans',
+        '_migrate_004_bookings_created_index',
+        '_migrate_005_bookings_summary_index',
+        '_migrate_006_booking_rollups',
+        '_migrate_007_table_versions',
+        '_migrate_008_item_search',
+        '_migrate_009_location_coordinates',
+        '_migrate_010_category_index',
+        '_migrate_011_hourly_activity',
+        '_migrate_012_booking_changes',
+        '_migrate_013_booking_transitions',
+        '_migrate_014_access_window_index',
+        '_migrate_015_company_bookings',
+        '_migrate_016_listing_indexes',
+        '_migrate_017_feed_item_changes',
+        '_migrate_018_booking_moves',
+        '_migrate_019_item_rollup_moves',
+    )
+    
+    @property
+    def schema_version(self):
+        """Number of migrations applied to the database file"""
+        with self.connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
     
     def init_database(self):
-        """Initialize the database with all required tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Bring the schema up to date, applying pending migrations in one transaction"""
+        target = len(self.MIGRATIONS)
+        if self.schema_version == target:
+            return
+        
+        with self.transaction() as conn:
+            # Re-read under the write lock in case another process migrated first
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current > target:
+                raise RuntimeError(
+                    f"{self.db_path} has schema version {current}, newer than this code ({target})"
+                )
+            cursor = conn.cursor()
+            for version in range(current + 1, target + 1):
+                getattr(self, self.MIGRATIONS[version - 1])(cursor)
+            conn.execute(f"PRAGMA user_version = {target}")
+    
+    def explain(self, sql, params=()):
+        """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+        with self.connection() as conn:
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    
+    @staticmethod
+    def _add_column(cursor, table, column, definition):
+        """ALTER TABLE ... ADD COLUMN unless the column already exists"""
+        columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    def _migrate_001_base_schema(self, cursor):
+        """Create the base tables and default plans"""
         
         # Create Plans table
         cursor.execute('''
@@ -144,156 +530,1682 @@ class RentsterDB:
             )
         ''')
         
-        conn.commit()
-        conn.close()
-        
         # Insert default plans if they don't exist
-        self.insert_default_plans()
+        self._insert_default_plans(cursor)
+    
+    def _migrate_002_lookup_indexes(self, cursor):
+        """Add secondary indexes for the booking, inventory and access lookups"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_item_dates ON Bookings (item_id, start_date, end_date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_user_created ON Bookings (user_id, created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rentalitems_company_location ON RentalItems (company_id, location_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_booking ON Payments (booking_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_signatures_booking ON DigitalSignatures (booking_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_location_code ON AccessControl (location_id, access_code)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_user ON AccessControl (user_id)')
+    
+    # BookingSpans row for NEW, and whether NEW should have one
+    _SPAN_VALUES = (
+        "NEW.booking_id, NEW.item_id, NEW.item_id, "
+        "CAST(julianday(date(NEW.start_date)) - 2440587.5 AS INTEGER), "
+        "CAST(julianday(date(NEW.end_date)) - 2440587.5 AS INTEGER)"
+    )
+    _SPAN_ACTIVE = (
+        "NEW.status NOT IN ('cancelled') AND julianday(NEW.start_date) IS NOT NULL "
+        "AND julianday(NEW.end_date) IS NOT NULL"
+    )
+    
+    def _migrate_003_booking_spans(self, cursor):
+        """Index active booking date spans in an R*Tree for overlap checks.
+
+        Each row is a box (item_id, item_id) x (start_day, end_day) in epoch
+        days with an inclusive end; triggers keep it in step with Bookings.
+        """
+        values, active = self._SPAN_VALUES, self._SPAN_ACTIVE
+        
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS BookingSpans USING rtree_i32(
+                booking_id, item_lo, item_hi, start_day, end_day
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_span_insert
+            AFTER INSERT ON Bookings WHEN {active}
+            BEGIN
+                INSERT INTO BookingSpans VALUES ({values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_span_update
+            AFTER UPDATE OF item_id, start_date, end_date, status ON Bookings
+            BEGIN
+                DELETE FROM BookingSpans WHERE booking_id = OLD.booking_id;
+                INSERT INTO BookingSpans SELECT {values} WHERE {active};
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_span_delete
+            AFTER DELETE ON Bookings
+            BEGIN
+                DELETE FROM BookingSpans WHERE booking_id = OLD.booking_id;
+            END
+        ''')
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO BookingSpans
+            SELECT {values.replace('NEW.', '')}
+            FROM Bookings
+            WHERE {active.replace('NEW.', '')}
+        ''')
+    
+    def _migrate_004_bookings_created_index(self, cursor):
+        """Index Bookings by creation time for newest-first keyset paging"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_created ON Bookings (created_at)')
+    
+    def _migrate_005_bookings_summary_index(self, cursor):
+        """Covering index so per-item booking aggregates never touch the table"""
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bookings_item_summary
+            ON Bookings (item_id, status, created_at, end_date, total_price, user_id)
+        ''')
+    
+    def _migrate_006_booking_rollups(self, cursor):
+        """Daily and per-category monthly booking rollups, maintained by triggers"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS DailyBookingStats (
+                company_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                bookings INTEGER NOT NULL DEFAULT 0,
+                confirmed INTEGER NOT NULL DEFAULT 0,
+                pending INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                cancelled INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (company_id, day)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS CategoryMonthlyStats (
+                company_id INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                month TEXT NOT NULL,
+                bookings INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (company_id, category, month)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_insert
+            AFTER INSERT ON Bookings
+            BEGIN
+                {self._rollup_upserts('NEW', 1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_update
+            AFTER UPDATE OF item_id, status, total_price, created_at ON Bookings
+            BEGIN
+                {self._rollup_upserts('OLD', -1)}
+                {self._rollup_upserts('NEW', 1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_delete
+            AFTER DELETE ON Bookings
+            BEGIN
+                {self._rollup_upserts('OLD', -1)}
+            END
+        ''')
+        self._rebuild_rollups(cursor)
+    
+    @staticmethod
+    def _rollup_upserts(row, sign):
+        """Trigger body adding (sign=1) or removing (sign=-1) one booking from the rollups"""
+        revenue = f"CASE WHEN {row}.status IN ('confirmed', 'completed') THEN {row}.total_price ELSE 0 END"
+        source = f'''
+            FROM RentalItems ri
+            WHERE ri.item_id = {row}.item_id
+              AND ri.company_id IS NOT NULL AND {row}.created_at IS NOT NULL
+        '''
+        return f'''
+            INSERT INTO DailyBookingStats
+                (company_id, day, bookings, confirmed, pending, completed, cancelled, revenue)
+            SELECT ri.company_id, date({row}.created_at), {sign},
+                   {sign} * ({row}.status = 'confirmed'), {sign} * ({row}.status = 'pending'),
+                   {sign} * ({row}.status = 'completed'), {sign} * ({row}.status = 'cancelled'),
+                   {sign} * ({revenue})
+            {source}
+            ON CONFLICT (company_id, day) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                confirmed = confirmed + excluded.confirmed,
+                pending = pending + excluded.pending,
+                completed = completed + excluded.completed,
+                cancelled = cancelled + excluded.cancelled,
+                revenue = revenue + excluded.revenue;
+            INSERT INTO CategoryMonthlyStats (company_id, category, month, bookings, revenue)
+            SELECT ri.company_id, COALESCE(ri.category, 'Other'), strftime('%Y-%m', {row}.created_at),
+                   {sign}, {sign} * ({revenue})
+            {source}
+            ON CONFLICT (company_id, category, month) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                revenue = revenue + excluded.revenue;
+        '''
+    
+    def rebuild_rollups(self):
+        """Recompute the rollup tables from Bookings, e.g. after restoring rows written with triggers off"""
+        with self.transaction() as conn:
+            self._rebuild_rollups(conn.cursor())
+            self._rebuild_activity(conn.cursor())
+    
+    def _rebuild_rollups(self, cursor):
+        revenue = "CASE WHEN b.status IN ('confirmed', 'completed') THEN b.total_price ELSE 0 END"
+        cursor.execute("DELETE FROM DailyBookingStats")
+        cursor.execute("DELETE FROM CategoryMonthlyStats")
+        cursor.execute(f'''
+            INSERT INTO DailyBookingStats
+                (company_id, day, bookings, confirmed, pending, completed, cancelled, revenue)
+            SELECT ri.company_id, date(b.created_at), COUNT(*),
+                   SUM(b.status = 'confirmed'), SUM(b.status = 'pending'),
+                   SUM(b.status = 'completed'), SUM(b.status = 'cancelled'),
+                   TOTAL({revenue})
+            FROM Bookings b
+            JOIN RentalItems ri ON ri.item_id = b.item_id
+            WHERE ri.company_id IS NOT NULL AND b.created_at IS NOT NULL
+            GROUP BY ri.company_id, date(b.created_at)
+        ''')
+        cursor.execute(f'''
+            INSERT INTO CategoryMonthlyStats (company_id, category, month, bookings, revenue)
+            SELECT ri.company_id, COALESCE(ri.category, 'Other'), strftime('%Y-%m', b.created_at),
+                   COUNT(*), TOTAL({revenue})
+            FROM Bookings b
+            JOIN RentalItems ri ON ri.item_id = b.item_id
+            WHERE ri.company_id IS NOT NULL AND b.created_at IS NOT NULL
+            GROUP BY ri.company_id, COALESCE(ri.category, 'Other'), strftime('%Y-%m', b.created_at)
+        ''')
+    
+    # Tables whose writes bump a counter in TableVersions, for cache invalidation
+    VERSIONED_TABLES = (
+        'Companies', 'Users', 'Locations', 'RentalItems', 'Bookings', 'Payments', 'AccessControl',
+    )
+    
+    def _migrate_007_table_versions(self, cursor):
+        """Per-table change counters bumped by triggers on every write"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS TableVersions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        for table in self.VERSIONED_TABLES:
+            cursor.execute("INSERT OR IGNORE INTO TableVersions (table_name) VALUES (?)", (table,))
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE TableVersions SET version = version + 1 WHERE table_name = '{table}';
+                    END
+                ''')
+    
+    def table_versions(self, tables):
+        """Current change counters for `tables`, as a tuple in the same order"""
+        with self.connection() as conn:
+            versions = dict(conn.execute(
+                f"SELECT table_name, version FROM TableVersions WHERE table_name IN ({', '.join('?' * len(tables))})",
+                tuple(tables),
+            ))
+        return tuple(versions.get(table, 0) for table in tables)
+    
+    def _migrate_008_item_search(self, cursor):
+        """FTS5 index over RentalItems name, description and category, kept in sync by triggers"""
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS RentalItemsSearch USING fts5(
+                name, description, category,
+                content='RentalItems', content_rowid='item_id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rentalitems_search_insert
+            AFTER INSERT ON RentalItems
+            BEGIN
+                INSERT INTO RentalItemsSearch (rowid, name, description, category)
+                VALUES (NEW.item_id, NEW.name, NEW.description, NEW.category);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rentalitems_search_update
+            AFTER UPDATE OF name, description, category ON RentalItems
+            BEGIN
+                INSERT INTO RentalItemsSearch (RentalItemsSearch, rowid, name, description, category)
+                VALUES ('delete', OLD.item_id, OLD.name, OLD.description, OLD.category);
+                INSERT INTO RentalItemsSearch (rowid, name, description, category)
+                VALUES (NEW.item_id, NEW.name, NEW.description, NEW.category);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rentalitems_search_delete
+            AFTER DELETE ON RentalItems
+            BEGIN
+                INSERT INTO RentalItemsSearch (RentalItemsSearch, rowid, name, description, category)
+                VALUES ('delete', OLD.item_id, OLD.name, OLD.description, OLD.category);
+            END
+        ''')
+        cursor.execute("INSERT INTO RentalItemsSearch (RentalItemsSearch) VALUES ('rebuild')")
+    
+    def _migrate_009_location_coordinates(self, cursor):
+        """Latitude/longitude on Locations with an R*Tree over the points"""
+        self._add_column(cursor, 'Locations', 'latitude', 'REAL')
+        self._add_column(cursor, 'Locations', 'longitude', 'REAL')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS LocationPoints USING rtree(
+                location_id, min_lat, max_lat, min_lon, max_lon
+            )
+        ''')
+        point = "NEW.location_id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude"
+        located = "NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL"
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_locations_point_insert
+            AFTER INSERT ON Locations WHEN {located}
+            BEGIN
+                INSERT INTO LocationPoints VALUES ({point});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_locations_point_update
+            AFTER UPDATE OF latitude, longitude ON Locations
+            BEGIN
+                DELETE FROM LocationPoints WHERE location_id = OLD.location_id;
+                INSERT INTO LocationPoints SELECT {point} WHERE {located};
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_locations_point_delete
+            AFTER DELETE ON Locations
+            BEGIN
+                DELETE FROM LocationPoints WHERE location_id = OLD.location_id;
+            END
+        ''')
+        cursor.execute('''
+            INSERT OR REPLACE INTO LocationPoints
+            SELECT location_id, latitude, latitude, longitude, longitude
+            FROM Locations
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rentalitems_location ON RentalItems (location_id)')
+    
+    def _migrate_010_category_index(self, cursor):
+        """Index for walking one category's items in item_id order"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rentalitems_category ON RentalItems (category)')
+    
+    def _migrate_011_hourly_activity(self, cursor):
+        """Bookings created per company, category, day and hour, maintained by triggers
+
+        weekday (0 = Monday) is stored so the heatmap query needs no date math.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS HourlyBookingActivity (
+                company_id INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                day TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                weekday INTEGER NOT NULL,
+                bookings INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (company_id, day, hour, category)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_activity_insert
+            AFTER INSERT ON Bookings
+            BEGIN
+                {self._activity_upsert('NEW', 1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_activity_update
+            AFTER UPDATE OF item_id, created_at ON Bookings
+            BEGIN
+                {self._activity_upsert('OLD', -1)}
+                {self._activity_upsert('NEW', 1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_activity_delete
+            AFTER DELETE ON Bookings
+            BEGIN
+                {self._activity_upsert('OLD', -1)}
+            END
+        ''')
+        self._rebuild_activity(cursor)
+    
+    @staticmethod
+    def _activity_upsert(row, sign):
+        """Trigger body adding (sign=1) or removing (sign=-1) one booking from HourlyBookingActivity"""
+        return f'''
+            INSERT INTO HourlyBookingActivity (company_id, category, day, hour, weekday, bookings)
+            SELECT ri.company_id, COALESCE(ri.category, 'Other'), date({row}.created_at),
+                   CAST(strftime('%H', {row}.created_at) AS INTEGER),
+                   (CAST(strftime('%w', {row}.created_at) AS INTEGER) + 6) % 7, {sign}
+            FROM RentalItems ri
+            WHERE ri.item_id = {row}.item_id
+              AND ri.company_id IS NOT NULL AND {row}.created_at IS NOT NULL
+            ON CONFLICT (company_id, day, hour, category) DO UPDATE SET
+                bookings = bookings + excluded.bookings;
+        '''
+    
+    def _rebuild_activity(self, cursor):
+        cursor.execute("DELETE FROM HourlyBookingActivity")
+        cursor.execute('''
+            INSERT INTO HourlyBookingActivity (company_id, category, day, hour, weekday, bookings)
+            SELECT ri.company_id, COALESCE(ri.category, 'Other'), date(b.created_at),
+                   CAST(strftime('%H', b.created_at) AS INTEGER),
+                   (CAST(strftime('%w', b.created_at) AS INTEGER) + 6) % 7, COUNT(*)
+            FROM Bookings b
+            JOIN RentalItems ri ON ri.item_id = b.item_id
+            WHERE ri.company_id IS NOT NULL AND b.created_at IS NOT NULL
+            GROUP BY 1, 2, 3, 4
+        ''')
+    
+    def _migrate_012_booking_changes(self, cursor):
+        """Latest change sequence number per booking, for incremental calendar feeds
+
+        Each write to a booking moves its row to a new, highest seq; deleted
+        bookings keep a tombstone row so feeds can drop them. Existing
+        bookings are backfilled with seq = booking_id.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BookingChanges (
+                booking_id INTEGER PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                company_id INTEGER,
+                item_id INTEGER,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_booking_changes_seq ON BookingChanges (seq)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_booking_changes_company_seq ON BookingChanges (company_id, seq)')
+        for event in ('INSERT', 'UPDATE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_bookings_changes_{event.lower()}
+                AFTER {event} ON Bookings
+                BEGIN
+                    INSERT INTO BookingChanges (booking_id, seq, company_id, item_id, deleted)
+                    SELECT NEW.booking_id, COALESCE((SELECT MAX(seq) FROM BookingChanges), 0) + 1,
+                           (SELECT company_id FROM RentalItems WHERE item_id = NEW.item_id), NEW.item_id, 0
+                    WHERE true
+                    ON CONFLICT (booking_id) DO UPDATE SET
+                        seq = excluded.seq, company_id = excluded.company_id,
+                        item_id = excluded.item_id, deleted = 0;
+                END
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_changes_delete
+            AFTER DELETE ON Bookings
+            BEGIN
+                UPDATE BookingChanges
+                SET seq = (SELECT MAX(seq) FROM BookingChanges) + 1, deleted = 1
+                WHERE booking_id = OLD.booking_id;
+            END
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO BookingChanges (booking_id, seq, company_id, item_id)
+            SELECT b.booking_id, b.booking_id, ri.company_id, b.item_id
+            FROM Bookings b
+            LEFT JOIN RentalItems ri ON ri.item_id = b.item_id
+        ''')
+    
+    def _migrate_013_booking_transitions(self, cursor):
+        """Support cheap status transitions.
+
+        Adds a partial index of confirmed bookings by end date for the
+        completion sweep. Re-creates the BookingSpans update trigger so it
+        only fires when a booking's span or its cancelled state changes;
+        before, every status change rewrote the R*Tree entry.
+        """
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bookings_confirmed_end
+            ON Bookings (end_date) WHERE status = 'confirmed'
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS trg_bookings_span_update')
+        cursor.execute(f'''
+            CREATE TRIGGER trg_bookings_span_update
+            AFTER UPDATE OF item_id, start_date, end_date, status ON Bookings
+            WHEN OLD.item_id IS NOT NEW.item_id
+              OR OLD.start_date IS NOT NEW.start_date
+              OR OLD.end_date IS NOT NEW.end_date
+              OR (OLD.status = 'cancelled') IS NOT (NEW.status = 'cancelled')
+            BEGIN
+                DELETE FROM BookingSpans WHERE booking_id = OLD.booking_id;
+                INSERT INTO BookingSpans SELECT {self._SPAN_VALUES} WHERE {self._SPAN_ACTIVE};
+            END
+        ''')
+    
+    def _migrate_014_access_window_index(self, cursor):
+        """Index access codes by expiry per location, to load the ones still valid"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_location_valid_to ON AccessControl (location_id, valid_to)')
+    
+    def _migrate_015_company_bookings(self, cursor):
+        """Bookings keyed by (company_id, created_at, booking_id), for newest-first paging per company
+
+        Bookings has no company column, so without this a company's bookings
+        are found through its items and sorted on every page. Triggers keep
+        it in step with Bookings and with items moving between companies;
+        bookings without a created_at are left out.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS CompanyBookings (
+                company_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                booking_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                PRIMARY KEY (company_id, created_at, booking_id)
+            ) WITHOUT ROWID
+        ''')
+        insert = '''
+            INSERT OR REPLACE INTO CompanyBookings (company_id, created_at, booking_id, status)
+            SELECT ri.company_id, NEW.created_at, NEW.booking_id, NEW.status
+            FROM RentalItems ri
+            WHERE ri.item_id = NEW.item_id AND ri.company_id IS NOT NULL AND NEW.created_at IS NOT NULL;
+        '''
+        delete = '''
+            DELETE FROM CompanyBookings
+            WHERE company_id IN (SELECT company_id FROM RentalItems WHERE item_id = OLD.item_id)
+              AND created_at = OLD.created_at AND booking_id = OLD.booking_id;
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_company_insert
+            AFTER INSERT ON Bookings
+            BEGIN
+                {insert}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_company_update
+            AFTER UPDATE OF item_id, status, created_at ON Bookings
+            BEGIN
+                {delete}
+                {insert}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bookings_company_delete
+            AFTER DELETE ON Bookings
+            BEGIN
+                {delete}
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rentalitems_company_bookings
+            AFTER UPDATE OF company_id ON RentalItems
+            WHEN OLD.company_id IS NOT NEW.company_id
+            BEGIN
+                DELETE FROM CompanyBookings
+                WHERE (company_id, created_at, booking_id) IN (
+                    SELECT OLD.company_id, created_at, booking_id FROM Bookings WHERE item_id = OLD.item_id
+                );
+                INSERT OR REPLACE INTO CompanyBookings (company_id, created_at, booking_id, status)
+                SELECT NEW.company_id, created_at, booking_id, status
+                FROM Bookings
+                WHERE item_id = NEW.item_id AND NEW.company_id IS NOT NULL AND created_at IS NOT NULL;
+            END
+        ''')
+        cursor.execute('''
+            INSERT OR REPLACE INTO CompanyBookings (company_id, created_at, booking_id, status)
+            SELECT ri.company_id, b.created_at, b.booking_id, b.status
+            FROM Bookings b
+            JOIN RentalItems ri ON ri.item_id = b.item_id
+            WHERE ri.company_id IS NOT NULL AND b.created_at IS NOT NULL
+        ''')
+    
+    def _migrate_016_listing_indexes(self, cursor):
+        """Indexes that return per-company item and location lists, and payments, already in order"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rentalitems_company_item ON RentalItems (company_id, item_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_locations_company_name ON Locations (company_id, name)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_date ON Payments (payment_date)')
+        # (booking_id, payment_date) serves everything idx_payments_booking did
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_booking_date ON Payments (booking_id, payment_date)')
+        cursor.execute('DROP INDEX IF EXISTS idx_payments_booking')
+    
+    def _migrate_017_feed_item_changes(self, cursor):
+        """Keep calendar feeds current through item changes, one company at a time
+
+        Renaming an item gives its bookings new change seqs, so feeds patch
+        just those events. Moving an item to another location or company
+        moves its BookingChanges rows along and bumps FeedVersions for the
+        companies involved, whose feeds rebuild; deleting one bumps its
+        company. Other companies' feeds are unaffected. BookingChanges also
+        keeps each booking's dates, so a tombstone can still say when the
+        deleted booking was.
+        """
+        self._add_column(cursor, 'BookingChanges', 'start_date', 'DATE')
+        self._add_column(cursor, 'BookingChanges', 'end_date', 'DATE')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_booking_changes_item ON BookingChanges (item_id)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS FeedVersions (
+                company_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        for event in ('INSERT', 'UPDATE'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS trg_bookings_changes_{event.lower()}')
+            cursor.execute(f'''
+                CREATE TRIGGER trg_bookings_changes_{event.lower()}
+                AFTER {event} ON Bookings
+                BEGIN
+                    INSERT INTO BookingChanges (booking_id, seq, company_id, item_id, deleted, start_date, end_date)
+                    SELECT NEW.booking_id, COALESCE((SELECT MAX(seq) FROM BookingChanges), 0) + 1,
+                           (SELECT company_id FROM RentalItems WHERE item_id = NEW.item_id), NEW.item_id, 0,
+                           NEW.start_date, NEW.end_date
+                    WHERE true
+                    ON CONFLICT (booking_id) DO UPDATE SET
+                        seq = excluded.seq, company_id = excluded.company_id, item_id = excluded.item_id,
+                        deleted = 0, start_date = excluded.start_date, end_date = excluded.end_date;
+                END
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rentalitems_feed_name
+            AFTER UPDATE OF name ON RentalItems
+            WHEN OLD.name IS NOT NEW.name
+            BEGIN
+                UPDATE BookingChanges SET seq = (SELECT MAX(seq) FROM BookingChanges) + 1
+                WHERE item_id = NEW.item_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rentalitems_feed_scope
+            AFTER UPDATE OF location_id, company_id ON RentalItems
+            WHEN OLD.location_id IS NOT NEW.location_id OR OLD.company_id IS NOT NEW.company_id
+            BEGIN
+                UPDATE BookingChanges
+                SET seq = (SELECT MAX(seq) FROM BookingChanges) + 1, company_id = NEW.company_id
+                WHERE item_id = NEW.item_id;
+                INSERT INTO FeedVersions (company_id, version)
+                SELECT company_id, 1 FROM (SELECT OLD.company_id AS company_id UNION SELECT NEW.company_id)
+                WHERE company_id IS NOT NULL
+                ON CONFLICT (company_id) DO UPDATE SET version = version + 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rentalitems_feed_delete
+            AFTER DELETE ON RentalItems
+            WHEN OLD.company_id IS NOT NULL
+            BEGIN
+                INSERT INTO FeedVersions (company_id, version) VALUES (OLD.company_id, 1)
+                ON CONFLICT (company_id) DO UPDATE SET version = version + 1;
+            END
+        ''')
+        # Rows of items that changed company before this migration still name the old one
+        cursor.execute('''
+            UPDATE BookingChanges SET company_id = ri.company_id
+            FROM RentalItems ri
+            WHERE ri.item_id = BookingChanges.item_id AND BookingChanges.company_id IS NOT ri.company_id
+        ''')
+        # Tombstones from before this migration stay without dates
+        cursor.execute('''
+            UPDATE BookingChanges SET start_date = b.start_date, end_date = b.end_date
+            FROM Bookings b
+            WHERE b.booking_id = BookingChanges.booking_id
+        ''')
+    
+    def _migrate_018_booking_moves(self, cursor):
+        """Record bookings moved off an item, so feeds synced before the move can drop them
+
+        A booking's BookingChanges row only names the item it is on now.
+        When a booking moves to another item, BookingMoves keeps the item
+        and company it left, at the booking's new change seq, so item-,
+        location- and company-scoped feeds the booking left can send a
+        cancellation for it.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BookingMoves (
+                booking_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                company_id INTEGER,
+                item_id INTEGER,
+                PRIMARY KEY (booking_id, seq)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_booking_moves_company_seq ON BookingMoves (company_id, seq)')
+        cursor.execute('DROP TRIGGER IF EXISTS trg_bookings_changes_update')
+        cursor.execute('''
+            CREATE TRIGGER trg_bookings_changes_update
+            AFTER UPDATE ON Bookings
+            BEGIN
+                INSERT INTO BookingChanges (booking_id, seq, company_id, item_id, deleted, start_date, end_date)
+                SELECT NEW.booking_id, COALESCE((SELECT MAX(seq) FROM BookingChanges), 0) + 1,
+                       (SELECT company_id FROM RentalItems WHERE item_id = NEW.item_id), NEW.item_id, 0,
+                       NEW.start_date, NEW.end_date
+                WHERE true
+                ON CONFLICT (booking_id) DO UPDATE SET
+                    seq = excluded.seq, company_id = excluded.company_id, item_id = excluded.item_id,
+                    deleted = 0, start_date = excluded.start_date, end_date = excluded.end_date;
+                INSERT INTO BookingMoves (booking_id, seq, company_id, item_id)
+                SELECT NEW.booking_id, (SELECT seq FROM BookingChanges WHERE booking_id = NEW.booking_id),
+                       (SELECT company_id FROM RentalItems WHERE item_id = OLD.item_id), OLD.item_id
+                WHERE OLD.item_id IS NOT NEW.item_id;
+            END
+        ''')
+    
+    def _migrate_019_item_rollup_moves(self, cursor):
+        """Move an item's bookings between rollup rows when its company or category changes
+
+        The Bookings triggers key each booking's rollup rows on its item's
+        company and category at write time. Re-assigning an item now takes
+        its bookings out of the old rows and adds them to the new ones, a
+        day, month or hour at a time.
+        """
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_rentalitems_rollup_move
+            AFTER UPDATE OF company_id, category ON RentalItems
+            WHEN OLD.company_id IS NOT NEW.company_id OR OLD.category IS NOT NEW.category
+            BEGIN
+                {self._item_rollup_upserts('OLD', -1)}
+                {self._item_rollup_upserts('NEW', 1)}
+            END
+        ''')
+    
+    @staticmethod
+    def _item_rollup_upserts(item, sign):
+        """Trigger body adding (sign=1) or removing (sign=-1) all of an item's bookings under the item row's company and category"""
+        revenue = "CASE WHEN b.status IN ('confirmed', 'completed') THEN b.total_price ELSE 0 END"
+        source = f'''
+            FROM Bookings b
+            WHERE b.item_id = {item}.item_id
+              AND {item}.company_id IS NOT NULL AND b.created_at IS NOT NULL
+        '''
+        return f'''
+            INSERT INTO DailyBookingStats
+                (company_id, day, bookings, confirmed, pending, completed, cancelled, revenue)
+            SELECT {item}.company_id, date(b.created_at), {sign} * COUNT(*),
+                   {sign} * SUM(b.status = 'confirmed'), {sign} * SUM(b.status = 'pending'),
+                   {sign} * SUM(b.status = 'completed'), {sign} * SUM(b.status = 'cancelled'),
+                   {sign} * TOTAL({revenue})
+            {source}
+            GROUP BY date(b.created_at)
+            ON CONFLICT (company_id, day) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                confirmed = confirmed + excluded.confirmed,
+                pending = pending + excluded.pending,
+                completed = completed + excluded.completed,
+                cancelled = cancelled + excluded.cancelled,
+                revenue = revenue + excluded.revenue;
+            INSERT INTO CategoryMonthlyStats (company_id, category, month, bookings, revenue)
+            SELECT {item}.company_id, COALESCE({item}.category, 'Other'), strftime('%Y-%m', b.created_at),
+                   {sign} * COUNT(*), {sign} * TOTAL({revenue})
+            {source}
+            GROUP BY strftime('%Y-%m', b.created_at)
+            ON CONFLICT (company_id, category, month) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                revenue = revenue + excluded.revenue;
+            INSERT INTO HourlyBookingActivity (company_id, category, day, hour, weekday, bookings)
+            SELECT {item}.company_id, COALESCE({item}.category, 'Other'), date(b.created_at),
+                   CAST(strftime('%H', b.created_at) AS INTEGER),
+                   (CAST(strftime('%w', b.created_at) AS INTEGER) + 6) % 7, {sign} * COUNT(*)
+            {source}
+            GROUP BY date(b.created_at), strftime('%H', b.created_at)
+            ON CONFLICT (company_id, day, hour, category) DO UPDATE SET
+                bookings = bookings + excluded.bookings;
+        '''
     
     def insert_default_plans(self):
         """Insert default subscription plans"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        with self.transaction() as conn:
+            self._insert_default_plans(conn.cursor())
+    
+    def _insert_default_plans(self, cursor):
         plans = [
             ("Free", 0.0, 9.0, 1, 1),
             ("Business", 59.0, 0.0, 10, 5),
             ("Premium", 99.0, 0.0, 100, 50)
         ]
         
-        for plan in plans:
-            cursor.execute('''
-                INSERT OR IGNORE INTO Plans (name, price, transaction_fee, max_users, max_locations)
-                VALUES (?, ?, ?, ?, ?)
-            ''', plan)
-        
-        conn.commit()
-        conn.close()
+        cursor.executemany('''
+            INSERT OR IGNORE INTO Plans (name, price, transaction_fee, max_users, max_locations)
+            VALUES (?, ?, ?, ?, ?)
+        ''', plans)
     
     def hash_password(self, password):
         """Hash a password for storing"""
         return hashlib.sha256(password.encode()).hexdigest()
     
+    @queued_write
     def create_user(self, username, email, password, role='customer', company_id=None):
         """Create a new user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         password_hash = self.hash_password(password)
         
         try:
-            cursor.execute('''
-                INSERT INTO Users (username, email, password_hash, role, company_id)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (username, email, password_hash, role, company_id))
-            
-            user_id = cursor.lastrowid
-            conn.commit()
-            return user_id
+            with self.transaction() as conn:
+                cursor = conn.execute('''
+                    INSERT INTO Users (username, email, password_hash, role, company_id)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (username, email, password_hash, role, company_id))
+                return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None
-        finally:
-            conn.close()
     
     def authenticate_user(self, email, password):
         """Authenticate a user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         password_hash = self.hash_password(password)
         
-        cursor.execute('''
-            SELECT user_id, username, email, role, company_id
-            FROM Users
-            WHERE email = ? AND password_hash = ?
-        ''', (email, password_hash))
-        
-        user = cursor.fetchone()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(User)
+            user = cursor.execute('''
+                SELECT user_id, username, email, role, company_id
+                FROM Users
+                WHERE email = ? AND password_hash = ?
+            ''', (email, password_hash)).fetchone()
         
         if user:
-            return {
-                'user_id': user[0],
-                'username': user[1],
-                'email': user[2],
-                'role': user[3],
-                'company_id': user[4]
-            }
+            return user._asdict()
         return None
     
-    def get_rental_items(self, company_id=None):
-        """Get all rental items, optionally filtered by company"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    @queued_write
+    def create_location(self, name, company_id, address=None, latitude=None, longitude=None):
+        """Create a new location"""
+        with self.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO Locations (name, address, company_id, latitude, longitude)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, address, company_id, latitude, longitude))
+            return cursor.lastrowid
+    
+    def find_items_near(self, latitude, longitude, radius_km, category=None, available_between=None):
+        """Items at locations within radius_km of a point, nearest first.
+
+        Candidates come from a bounding-box query on the LocationPoints
+        R*Tree; exact great-circle distances are then computed for all of
+        them at once with NumPy. With available_between=(start, end) items
+        under maintenance or with an active booking overlapping those dates
+        are left out; the bookings are checked against the attached
+        AvailabilityIndex when there is one, else with an anti-join.
+        """
+        import numpy as np
+        
+        # Bounding box of the circle: its latitude extent is the angular radius,
+        # its longitude extent the widest point, which lies poleward of the centre
+        angle = radius_km / EARTH_RADIUS_KM
+        lat_delta = math.degrees(angle)
+        cos_lat = math.cos(math.radians(latitude))
+        if abs(latitude) + lat_delta >= 90 or math.sin(angle) >= cos_lat:
+            # The circle takes in a pole; every longitude is in reach
+            lon_ranges = [(-180.0, 180.0)]
+        else:
+            lon_delta = math.degrees(math.asin(math.sin(angle) / cos_lat))
+            min_lon, max_lon = longitude - lon_delta, longitude + lon_delta
+            if min_lon < -180:
+                # The box wraps the antimeridian; search both sides of it
+                lon_ranges = [(min_lon + 360, 180.0), (-180.0, max_lon)]
+            elif max_lon > 180:
+                lon_ranges = [(min_lon, 180.0), (-180.0, max_lon - 360)]
+            else:
+                lon_ranges = [(min_lon, max_lon)]
+        
+        where = [
+            "p.min_lat <= ? AND p.max_lat >= ? AND p.min_lon <= ? AND p.max_lon >= ?",
+        ]
+        params = []
+        if category:
+            where.append("ri.category = ?")
+            params.append(category)
+        availability = self.availability if available_between else None
+        if available_between:
+            start_date, end_date = available_between
+            where.append("ri.availability_status != 'maintenance'")
+        if available_between and availability is None:
+            where.append('''
+                NOT EXISTS (
+                    SELECT 1 FROM BookingSpans s
+                    WHERE s.item_lo <= ri.item_id AND s.item_hi >= ri.item_id
+                      AND s.start_day <= ? AND s.end_day >= ?
+                )
+            ''')
+            params.extend((epoch_day(end_date), epoch_day(start_date)))
+        
+        rows = []
+        with self.connection() as conn:
+            for min_lon, max_lon in lon_ranges:
+                rows += conn.execute(f'''
+                    SELECT ri.item_id, ri.name, ri.description, ri.category, ri.company_id,
+                           ri.location_id, ri.availability_status, ri.rental_price_per_day,
+                           ri.image_url, ri.created_at,
+                           c.name as company_name, l.name as location_name,
+                           l.latitude, l.longitude
+                    FROM LocationPoints p
+                    CROSS JOIN Locations l ON l.location_id = p.location_id
+                    JOIN RentalItems ri ON ri.location_id = l.location_id
+                    LEFT JOIN Companies c ON ri.company_id = c.company_id
+                    WHERE {' AND '.join(where)}
+                ''', [latitude + lat_delta, latitude - lat_delta, max_lon, min_lon, *params]).fetchall()
+        if rows and availability is not None:
+            free = set(availability.free_items([row[0] for row in rows], start_date, end_date).tolist())
+            rows = [row for row in rows if row[0] in free]
+        if not rows:
+            return []
+        
+        # Haversine distance for every candidate in one vectorized pass
+        coords = np.radians(np.array([row[-2:] for row in rows], dtype=float))
+        lat0, lon0 = math.radians(latitude), math.radians(longitude)
+        a = (np.sin((coords[:, 0] - lat0) / 2) ** 2
+             + math.cos(lat0) * np.cos(coords[:, 0]) * np.sin((coords[:, 1] - lon0) / 2) ** 2)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
         
+        nearest = np.argsort(distances, kind='stable')
+        nearest = nearest[distances[nearest] <= radius_km]
+        return [NearbyItem(*rows[i], float(distances[i])) for i in nearest]
+    
+    def get_rental_items(self, company_id=None, after=None, limit=None, columnar=False):
+        """Get rental items ordered by item_id, optionally filtered by company.
+
+        Pass the last item_id of a page as `after` to fetch the next page of
+        `limit` rows (keyset pagination). Rows are RentalItem records, or with
+        columnar=True a dict of column lists ('numpy' for NumPy arrays).
+        """
+        where, params = [], []
         if company_id:
-            cursor.execute('''
-                SELECT ri.*, c.name as company_name, l.name as location_name
+            where.append("ri.company_id = ?")
+            params.append(company_id)
+        if after is not None:
+            where.append("ri.item_id > ?")
+            params.append(after)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if not columnar:
+                cursor.row_factory = record_factory(RentalItem)
+            cursor.execute(f'''
+                SELECT ri.item_id, ri.name, ri.description, ri.category, ri.company_id,
+                       ri.location_id, ri.availability_status, ri.rental_price_per_day,
+                       ri.image_url, ri.created_at,
+                       c.name as company_name, l.name as location_name
                 FROM RentalItems ri
                 LEFT JOIN Companies c ON ri.company_id = c.company_id
                 LEFT JOIN Locations l ON ri.location_id = l.location_id
-                WHERE ri.company_id = ?
-            ''', (company_id,))
-        else:
-            cursor.execute('''
-                SELECT ri.*, c.name as company_name, l.name as location_name
+                {where_sql}
+                ORDER BY ri.item_id
+                LIMIT ?
+            ''', (*params, -1 if limit is None else limit))
+            if columnar:
+                return fetch_columns(cursor, RentalItem, as_numpy=columnar == 'numpy')
+            return cursor.fetchall()
+    
+    def search_available(self, category, start_date, end_date, location_id=None, price_range=None,
+                         after=None, limit=50):
+        """Items free to rent for the whole of start_date..end_date, by item_id.
+
+        Items under maintenance, or with a non-cancelled booking overlapping
+        the dates, are left out. price_range is a (min, max) pair of daily
+        prices where either bound may be None. Pass the last item_id of a
+        page as `after` to fetch the next one.
+        """
+        start_date, end_date = to_iso_date(start_date), to_iso_date(end_date)
+        if end_date < start_date:
+            raise ValueError("end_date must not be before start_date")
+        
+        where = ["ri.availability_status != 'maintenance'"]
+        params = []
+        if category:
+            where.append("ri.category = ?")
+            params.append(category)
+        if location_id:
+            where.append("ri.location_id = ?")
+            params.append(location_id)
+        if price_range:
+            min_price, max_price = price_range
+            if min_price is not None:
+                where.append("ri.rental_price_per_day >= ?")
+                params.append(min_price)
+            if max_price is not None:
+                where.append("ri.rental_price_per_day <= ?")
+                params.append(max_price)
+        if after is not None:
+            where.append("ri.item_id > ?")
+            params.append(after)
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(RentalItem)
+            cursor.execute(f'''
+                SELECT ri.item_id, ri.name, ri.description, ri.category, ri.company_id,
+                       ri.location_id, ri.availability_status, ri.rental_price_per_day,
+                       ri.image_url, ri.created_at,
+                       c.name as company_name, l.name as location_name
                 FROM RentalItems ri
                 LEFT JOIN Companies c ON ri.company_id = c.company_id
                 LEFT JOIN Locations l ON ri.location_id = l.location_id
-            ''')
+                WHERE {' AND '.join(where)}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM Bookings b
+                      WHERE b.item_id = ri.item_id
+                        AND b.start_date <= ? AND b.end_date >= ?
+                        AND b.status != 'cancelled'
+                  )
+                ORDER BY ri.item_id
+                LIMIT ?
+            ''', (*params, end_date, start_date, -1 if limit is None else limit))
+            return cursor.fetchall()
+    
+    def search_items(self, query, company_id=None, category=None, status=None, limit=20):
+        """Full-text search over item name, description and category.
+
+        Every word in `query` must match, as a prefix ("proj" finds
+        "Projector"); results are ranked by BM25 with name matches weighted
+        highest. An empty query lists the filtered items by item_id.
+        """
+        terms = re.findall(r"\w+", query or "")
+        where, params = [], []
+        if terms:
+            where.append("RentalItemsSearch MATCH ?")
+            params.append(" ".join(f'"{term}"*' for term in terms))
+        if company_id:
+            where.append("ri.company_id = ?")
+            params.append(company_id)
+        if category:
+            where.append("ri.category = ?")
+            params.append(category)
+        if status:
+            where.append("ri.availability_status = ?")
+            params.append(status)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
         
-        items = cursor.fetchall()
-        conn.close()
-        return items
+        if terms:
+            source_sql = "RentalItemsSearch JOIN RentalItems ri ON ri.item_id = RentalItemsSearch.rowid"
+            order_sql = "bm25(RentalItemsSearch, 10.0, 1.0, 2.0)"
+        else:
+            source_sql = "RentalItems ri"
+            order_sql = "ri.item_id"
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(RentalItem)
+            cursor.execute(f'''
+                SELECT ri.item_id, ri.name, ri.description, ri.category, ri.company_id,
+                       ri.location_id, ri.availability_status, ri.rental_price_per_day,
+                       ri.image_url, ri.created_at,
+                       c.name as company_name, l.name as location_name
+                FROM {source_sql}
+                LEFT JOIN Companies c ON ri.company_id = c.company_id
+                LEFT JOIN Locations l ON ri.location_id = l.location_id
+                {where_sql}
+                ORDER BY {order_sql}
+                LIMIT ?
+            ''', (*params, limit))
+            return cursor.fetchall()
     
+    def iter_rental_items(self, company_id=None, chunk_size=1000):
+        """Stream rental items in chunks of `chunk_size` with flat memory"""
+        after = None
+        while True:
+            items = self.get_rental_items(company_id, after=after, limit=chunk_size)
+            yield from items
+            if len(items) < chunk_size:
+                return
+            after = items[-1].item_id
+    
+    @queued_write
     def create_booking(self, item_id, user_id, start_date, end_date, total_price):
-        """Create a new booking"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO Bookings (item_id, user_id, start_date, end_date, total_price, status)
-            VALUES (?, ?, ?, ?, ?, 'pending')
-        ''', (item_id, user_id, start_date, end_date, total_price))
+        """Create a new pending booking.
+
+        Dates are stored as 'YYYY-MM-DD' and the end date is inclusive.
+        Returns None if the item already has an active booking overlapping
+        the requested dates.
+        """
+        start_date, end_date = to_iso_date(start_date), to_iso_date(end_date)
+        if end_date < start_date:
+            raise ValueError(f"end_date {end_date} is before start_date {start_date}")
         
-        booking_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            if self.find_conflicts([item_id], start_date, end_date):
+                return None
+            cursor = conn.execute('''
+                INSERT INTO Bookings (item_id, user_id, start_date, end_date, total_price, status)
+                VALUES (?, ?, ?, ?, ?, 'pending')
+            ''', (item_id, user_id, start_date, end_date, total_price))
+            booking_id = cursor.lastrowid
+            version = self._bookings_version(conn)
+        self._bookings_changed([item_id], version)
         return booking_id
     
-    def get_bookings(self, user_id=None, company_id=None):
-        """Get bookings, optionally filtered by user or company"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    # Booking state machine: action -> (statuses it applies to, status it sets)
+    BOOKING_TRANSITIONS = {
+        'confirm': (('pending',), 'confirmed'),
+        'decline': (('pending',), 'cancelled'),
+        'complete': (('confirmed',), 'completed'),
+        'cancel': (('pending', 'confirmed'), 'cancelled'),
+    }
+    
+    @queued_write
+    def transition_bookings(self, booking_ids, action):
+        """Apply a state machine action to many bookings in one transaction.
+
+        A single conditional UPDATE moves only the bookings currently in a
+        state the action applies to; the others are left alone. Returns the
+        ids of the bookings that changed.
+        """
+        if action not in self.BOOKING_TRANSITIONS:
+            raise ValueError(f"Unknown booking action: {action}")
+        from_statuses, to_status = self.BOOKING_TRANSITIONS[action]
+        
+        with self.transaction() as conn:
+            rows = conn.execute(f'''
+                UPDATE Bookings SET status = ?
+                WHERE booking_id IN (SELECT value FROM json_each(?))
+                  AND status IN ({', '.join('?' * len(from_statuses))})
+                RETURNING booking_id, item_id
+            ''', (to_status, json.dumps(list(booking_ids)), *from_statuses)).fetchall()
+            version = self._bookings_version(conn)
+        if rows:
+            self._bookings_changed([item_id for _, item_id in rows], version, len(rows))
+        return [booking_id for booking_id, _ in rows]
+    
+    def confirm_booking(self, booking_id):
+        """pending -> confirmed; returns False if the booking wasn't pending"""
+        return bool(self.transition_bookings([booking_id], 'confirm'))
+    
+    def decline_booking(self, booking_id):
+        """pending -> cancelled; returns False if the booking wasn't pending"""
+        return bool(self.transition_bookings([booking_id], 'decline'))
+    
+    def complete_booking(self, booking_id):
+        """confirmed -> completed; returns False if the booking wasn't confirmed"""
+        return bool(self.transition_bookings([booking_id], 'complete'))
+    
+    def cancel_booking(self, booking_id):
+        """pending or confirmed -> cancelled; returns False otherwise"""
+        return bool(self.transition_bookings([booking_id], 'cancel'))
+    
+    @queued_write
+    def complete_past_bookings(self, as_of=None):
+        """Mark every confirmed booking that ended before as_of (default today) completed.
+
+        One UPDATE over the partial index of confirmed bookings, meant to run
+        nightly. Returns the number of bookings completed.
+        """
+        as_of = to_iso_date(as_of or date.today())
+        with self.transaction() as conn:
+            completed = conn.execute('''
+                UPDATE Bookings SET status = 'completed'
+                WHERE status = 'confirmed' AND end_date < ?
+            ''', (as_of,)).rowcount
+            version = self._bookings_version(conn)
+        if completed:
+            # Completed bookings still occupy their days, so no rows need patching
+            self._bookings_changed([], version, completed)
+        return completed
+    
+    def _bookings_version(self, conn):
+        """Bookings change counter as seen inside the current write transaction"""
+        if self.availability is None:
+            return None
+        return conn.execute("SELECT version FROM TableVersions WHERE table_name = 'Bookings'").fetchone()[0]
+    
+    def _bookings_changed(self, item_ids, version, writes=1):
+        """Let the availability index patch the rows of items whose bookings were written"""
+        if self.availability is None or version is None:
+            return
+        availability = self.availability
+        self._after_commit(lambda: availability.bookings_changed(item_ids, version, writes))
+    
+    def _after_commit(self, callback):
+        """Run callback now, or inside a write-behind group once the group has committed"""
+        if self.writer is not None and self.writer.in_writer_thread():
+            self.writer.after_commit(callback)
+        else:
+            callback()
+    
+    def find_conflicts(self, item_ids, start_date, end_date):
+        """Find active bookings overlapping [start_date, end_date] for the given items.
+
+        Returns a dict of item_id -> list of conflicting booking_ids; items
+        that are free for the whole range are absent.
+        """
+        start_day, end_day = epoch_day(start_date), epoch_day(end_date)
+        
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT s.item_lo, s.booking_id
+                FROM json_each(?) j
+                CROSS JOIN BookingSpans s
+                WHERE s.item_lo <= j.value AND s.item_hi >= j.value
+                  AND s.start_day <= ? AND s.end_day >= ?
+            ''', (json.dumps(list(item_ids)), end_day, start_day)).fetchall()
         
+        conflicts = {}
+        for item_id, booking_id in rows:
+            conflicts.setdefault(item_id, []).append(booking_id)
+        return conflicts
+    
+    def get_bookings(self, user_id=None, company_id=None, after=None, limit=None, columnar=False, status=None):
+        """Get bookings newest first, optionally filtered by user or company and status.
+
+        Pass (created_at, booking_id) of the last row of a page as `after`
+        to fetch the next page of `limit` rows (keyset pagination). Every
+        filter reads rows in page order from an index, so a page costs the
+        same however deep it is. Rows are Booking records, or with
+        columnar=True a dict of column lists ('numpy' for NumPy arrays).
+        """
+        # A company's bookings are walked through CompanyBookings
+        source = "b" if user_id or not company_id else "cb"
+        where, params = [], []
         if user_id:
-            cursor.execute('''
-                SELECT b.*, ri.name as item_name, u.username
-                FROM Bookings b
-                JOIN RentalItems ri ON b.item_id = ri.item_id
-                JOIN Users u ON b.user_id = u.user_id
-                WHERE b.user_id = ?
-                ORDER BY b.created_at DESC
-            ''', (user_id,))
+            where.append("b.user_id = ?")
+            params.append(user_id)
         elif company_id:
-            cursor.execute('''
-                SELECT b.*, ri.name as item_name, u.username
-                FROM Bookings b
+            where.append("cb.company_id = ?")
+            params.append(company_id)
+        if status is not None:
+            where.append(f"{source}.status = ?")
+            params.append(status)
+        if after is not None:
+            where.append(f"({source}.created_at, {source}.booking_id) < (?, ?)")
+            params.extend(after)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        from_sql = "CompanyBookings cb CROSS JOIN Bookings b ON b.booking_id = cb.booking_id" if source == "cb" else "Bookings b"
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if not columnar:
+                cursor.row_factory = record_factory(Booking)
+            cursor.execute(f'''
+                SELECT b.booking_id, b.item_id, b.user_id, b.start_date, b.end_date,
+                       b.total_price, b.status, b.created_at,
+                       ri.name as item_name, u.username
+                FROM {from_sql}
                 JOIN RentalItems ri ON b.item_id = ri.item_id
                 JOIN Users u ON b.user_id = u.user_id
+                {where_sql}
+                ORDER BY {source}.created_at DESC, {source}.booking_id DESC
+                LIMIT ?
+            ''', (*params, -1 if limit is None else limit))
+            if columnar:
+                return fetch_columns(cursor, Booking, as_numpy=columnar == 'numpy')
+            return cursor.fetchall()
+    
+    def iter_bookings(self, user_id=None, company_id=None, chunk_size=1000, status=None):
+        """Stream bookings newest first in chunks of `chunk_size` with flat memory"""
+        after = None
+        while True:
+            bookings = self.get_bookings(user_id, company_id, after=after, limit=chunk_size, status=status)
+            yield from bookings
+            if len(bookings) < chunk_size:
+                return
+            after = (bookings[-1].created_at, bookings[-1].booking_id)
+    
+    def get_bookings_in_range(self, company_id, start_date, end_date,
+                              statuses=('confirmed', 'pending', 'completed')):
+        """Bookings of a company overlapping [start_date, end_date] (inclusive), for rendering.
+
+        Returns CalendarBooking records ordered by start date, found per item
+        through the (item_id, start_date, end_date) index.
+        """
+        statuses = tuple(statuses)
+        if not statuses:
+            return []
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(CalendarBooking)
+            cursor.execute(f'''
+                SELECT b.booking_id, b.item_id, ri.name, u.username, b.start_date, b.end_date, b.status
+                FROM RentalItems ri
+                JOIN Bookings b ON b.item_id = ri.item_id
+                LEFT JOIN Users u ON u.user_id = b.user_id
                 WHERE ri.company_id = ?
-                ORDER BY b.created_at DESC
-            ''', (company_id,))
+                  AND b.start_date <= ? AND b.end_date >= ?
+                  AND b.status IN ({', '.join('?' * len(statuses))})
+                ORDER BY b.start_date, b.booking_id
+            ''', (company_id, to_iso_date(end_date), to_iso_date(start_date), *statuses))
+            return cursor.fetchall()
+    
+    def get_dashboard_summary(self, company_id, as_of=None, top_n=5):
+        """Compute the dashboard metrics for a company in two aggregate queries.
+
+        Revenue counts confirmed and completed bookings. Active bookings are
+        confirmed or pending ones that have not ended by `as_of`. "This month"
+        is the calendar month containing `as_of` (default today), compared
+        with the month before it.
+        """
+        as_of = date.fromisoformat(to_iso_date(as_of or date.today()))
+        month_start = as_of.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        last_month = (month_start - timedelta(days=1)).replace(day=1)
+        windows = {
+            'today': as_of.isoformat(),
+            'month_start': month_start.isoformat(),
+            'next_month': next_month.isoformat(),
+            'last_month': last_month.isoformat(),
+            'company_id': company_id,
+        }
+        
+        with self.connection() as conn:
+            # One pass over the company's bookings, grouped per item
+            per_item = conn.execute('''
+                SELECT ri.item_id, ri.name, ri.availability_status,
+                       ri.created_at >= :month_start AND ri.created_at < :next_month AS added_this_month,
+                       COUNT(b.booking_id) AS bookings,
+                       TOTAL(CASE WHEN b.status IN ('confirmed', 'completed') THEN b.total_price END) AS revenue,
+                       SUM(b.status = 'confirmed') AS confirmed,
+                       SUM(b.status = 'pending') AS pending,
+                       SUM(b.status = 'completed') AS completed,
+                       SUM(b.status = 'cancelled') AS cancelled,
+                       SUM(b.status IN ('confirmed', 'pending') AND b.end_date >= :today) AS active,
+                       SUM(b.created_at >= :month_start AND b.created_at < :next_month) AS bookings_this_month,
+                       SUM(b.created_at >= :last_month AND b.created_at < :month_start) AS bookings_last_month,
+                       TOTAL(CASE WHEN b.status IN ('confirmed', 'completed')
+                                   AND b.created_at >= :month_start AND b.created_at < :next_month
+                                  THEN b.total_price END) AS revenue_this_month,
+                       TOTAL(CASE WHEN b.status IN ('confirmed', 'completed')
+                                   AND b.created_at >= :last_month AND b.created_at < :month_start
+                                  THEN b.total_price END) AS revenue_last_month
+                FROM RentalItems ri
+                LEFT JOIN Bookings b ON b.item_id = ri.item_id
+                WHERE ri.company_id = :company_id
+                GROUP BY ri.item_id
+            ''', windows).fetchall()
+            
+            # Customers whose first booking with this company falls in each month
+            new_customers = conn.execute('''
+                SELECT TOTAL(first_booking >= :month_start AND first_booking < :next_month),
+                       TOTAL(first_booking >= :last_month AND first_booking < :month_start)
+                FROM (
+                    SELECT MIN(b.created_at) AS first_booking
+                    FROM RentalItems ri
+                    JOIN Bookings b ON b.item_id = ri.item_id
+                    WHERE ri.company_id = :company_id
+                    GROUP BY b.user_id
+                )
+            ''', windows).fetchone()
+        
+        def total(column):
+            return sum(row[column] or 0 for row in per_item)
+        
+        top_items = sorted(
+            (row for row in per_item if row[4]), key=lambda row: (row[5], row[4]), reverse=True
+        )[:top_n]
+        return {
+            'total_items': len(per_item),
+            'available_items': sum(row[2] == 'available' for row in per_item),
+            'items_added_this_month': total(3),
+            'total_bookings': total(4),
+            'total_revenue': total(5),
+            'status_counts': {
+                'confirmed': total(6),
+                'pending': total(7),
+                'completed': total(8),
+                'cancelled': total(9),
+            },
+            'active_bookings': total(10),
+            'bookings_this_month': total(11),
+            'bookings_last_month': total(12),
+            'revenue_this_month': total(13),
+            'revenue_last_month': total(14),
+            'new_customers_this_month': int(new_customers[0]),
+            'new_customers_last_month': int(new_customers[1]),
+            'top_items': [
+                {'item_id': row[0], 'name': row[1], 'bookings': row[4], 'revenue': row[5]}
+                for row in top_items
+            ],
+        }
+    
+    def get_daily_stats(self, company_id, start_date=None, end_date=None):
+        """Daily booking counts and revenue for a company from the rollup table, oldest first"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(DailyStats)
+            cursor.execute('''
+                SELECT day, bookings, confirmed, pending, completed, cancelled, revenue
+                FROM DailyBookingStats
+                WHERE company_id = ? AND day >= ? AND day <= ?
+                ORDER BY day
+            ''', (
+                company_id,
+                to_iso_date(start_date) if start_date else '',
+                to_iso_date(end_date) if end_date else '9999-12-31',
+            ))
+            return cursor.fetchall()
+    
+    def get_category_stats(self, company_id, start_month=None, end_month=None):
+        """Monthly booking counts and revenue per category ('YYYY-MM' months, inclusive)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(CategoryStats)
+            cursor.execute('''
+                SELECT month, category, bookings, revenue
+                FROM CategoryMonthlyStats
+                WHERE company_id = ? AND month >= ? AND month <= ?
+                ORDER BY month, category
+            ''', (company_id, start_month or '', end_month or '9999-12'))
+            return cursor.fetchall()
+    
+    def get_activity_heatmap(self, company_id, start_date=None, end_date=None, category=None, location_id=None):
+        """Bookings created per weekday and hour as a 7 x 24 matrix (rows Monday..Sunday).
+
+        Dates bound the day the booking was created, inclusive. Without a
+        location filter this reads HourlyBookingActivity; a location filter
+        groups the company's bookings at that location directly, through
+        the covering idx_bookings_item_summary index.
+        """
+        start = to_iso_date(start_date) if start_date else ''
+        end = to_iso_date(end_date) if end_date else '9999-12-31'
+        if location_id is None:
+            where = "company_id = ? AND day >= ? AND day <= ?"
+            params = [company_id, start, end]
+            if category:
+                where += " AND category = ?"
+                params.append(category)
+            sql = f'''
+                SELECT weekday, hour, SUM(bookings)
+                FROM HourlyBookingActivity
+                WHERE {where}
+                GROUP BY weekday, hour
+            '''
         else:
+            where = "ri.company_id = ? AND ri.location_id = ?"
+            params = [company_id, location_id]
+            if category:
+                where += " AND ri.category = ?"
+                params.append(category)
+            # Compare the date part so the whole end day is included
+            where += " AND b.created_at >= ? AND date(b.created_at) <= ?"
+            params.extend((start, end))
+            sql = f'''
+                SELECT (CAST(strftime('%w', b.created_at) AS INTEGER) + 6) % 7,
+                       CAST(strftime('%H', b.created_at) AS INTEGER), COUNT(*)
+                FROM RentalItems ri
+                JOIN Bookings b ON b.item_id = ri.item_id
+                WHERE {where}
+                GROUP BY 1, 2
+            '''
+        
+        matrix = [[0] * 24 for _ in range(7)]
+        with self.connection() as conn:
+            for weekday, hour, bookings in conn.execute(sql, params):
+                matrix[weekday][hour] = bookings
+        return matrix
+    
+    def get_locations(self, company_id):
+        """A company's locations ordered by name"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(Location)
             cursor.execute('''
-                SELECT b.*, ri.name as item_name, u.username
-                FROM Bookings b
-                JOIN RentalItems ri ON b.item_id = ri.item_id
-                JOIN Users u ON b.user_id = u.user_id
-                ORDER BY b.created_at DESC
-            ''')
+                SELECT location_id, name, address, company_id, latitude, longitude
+                FROM Locations
+                WHERE company_id = ?
+                ORDER BY name
+            ''', (company_id,))
+            return cursor.fetchall()
+    
+    def booking_feed_version(self, company_id):
+        """(latest booking change seq, FeedVersions version) for a company's calendar feeds.
+
+        Three index seeks in one statement; feeds compare it with the version
+        they were built at to answer conditional requests. Moving a booking
+        off one of the company's items counts as a change too. The second part
+        only moves when one of the company's items moves or is deleted.
+        """
+        with self.connection() as conn:
+            return conn.execute('''
+                SELECT MAX((SELECT COALESCE(MAX(seq), 0) FROM BookingChanges WHERE company_id = ?),
+                           (SELECT COALESCE(MAX(seq), 0) FROM BookingMoves WHERE company_id = ?)),
+                       COALESCE((SELECT version FROM FeedVersions WHERE company_id = ?), 0)
+            ''', (company_id, company_id, company_id)).fetchone()
+    
+    def get_booking_feed(self, company_id, since_seq=0, location_id=None, item_id=None):
+        """Bookings of a company changed after since_seq, as FeedBooking records in seq order.
+
+        Deleted bookings come back with deleted=1, their item columns and
+        the dates they had. The location filter uses the item's current location.
+        """
+        where, params = ["c.company_id = ?", "c.seq > ?"], [company_id, since_seq]
+        if location_id is not None:
+            where.append("ri.location_id = ?")
+            params.append(location_id)
+        if item_id is not None:
+            where.append("c.item_id = ?")
+            params.append(item_id)
         
-        bookings = cursor.fetchall()
-        conn.close()
-        return bookings
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(FeedBooking)
+            cursor.execute(f'''
+                SELECT c.booking_id, c.seq, c.deleted, c.item_id, ri.name, ri.location_id, u.username,
+                       c.start_date, c.end_date, b.status, b.created_at
+                FROM BookingChanges c
+                LEFT JOIN Bookings b ON b.booking_id = c.booking_id
+                LEFT JOIN RentalItems ri ON ri.item_id = c.item_id
+                LEFT JOIN Users u ON u.user_id = b.user_id
+                WHERE {' AND '.join(where)}
+                ORDER BY c.seq
+            ''', params)
+            return cursor.fetchall()
+    
+    def get_booking_moves(self, company_id, since_seq=0):
+        """Bookings moved off one of a company's items after since_seq, as FeedBooking tombstones.
 
+        Each comes back with deleted=1, the item it left (and that item's
+        location) and its current seq and dates, once per move.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(FeedBooking)
+            cursor.execute('''
+                SELECT m.booking_id, c.seq, 1, m.item_id, ri.name, ri.location_id, NULL,
+                       c.start_date, c.end_date, NULL, NULL
+                FROM BookingMoves m
+                JOIN BookingChanges c ON c.booking_id = m.booking_id
+                LEFT JOIN RentalItems ri ON ri.item_id = m.item_id
+                WHERE m.company_id = ? AND m.seq > ?
+                ORDER BY m.seq
+            ''', (company_id, since_seq))
+            return cursor.fetchall()
+    
+    @queued_write
+    def create_access_code(self, location_id, user_id, access_code, valid_from, valid_to):
+        """Grant access_code at a location for [valid_from, valid_to] (inclusive); returns the access_id"""
+        valid_from, valid_to = to_timestamp(valid_from), to_timestamp(valid_to)
+        if valid_to < valid_from:
+            raise ValueError(f"valid_to {valid_to} is before valid_from {valid_from}")
+        
+        with self.transaction() as conn:
+            access_id = conn.execute('''
+                INSERT INTO AccessControl (location_id, user_id, access_code, valid_from, valid_to)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (location_id, user_id, str(access_code), valid_from, valid_to)).lastrowid
+        self._access_changed(location_id)
+        return access_id
+    
+    @queued_write
+    def revoke_access_code(self, access_id):
+        """Delete an access grant; returns False if it does not exist"""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "DELETE FROM AccessControl WHERE access_id = ? RETURNING location_id", (access_id,)
+            ).fetchone()
+        if row is None:
+            return False
+        self._access_changed(row[0])
+        return True
+    
+    def _access_changed(self, location_id):
+        if self.access_cache is not None:
+            access_cache = self.access_cache
+            self._after_commit(lambda: access_cache.grant_written(location_id))
+    
+    def validate_access(self, location_id, code, at=None):
+        """The AccessGrant letting `code` open location_id at `at` (default now), or None.
+
+        Answered from an in-process cache of the location's codes valid
+        around `at`, so a door controller's poll normally costs no query.
+        """
+        if self.access_cache is None:
+            from access_cache import AccessCodeCache
+            
+            with self._pool_lock:
+                if self.access_cache is None:
+                    self.access_cache = AccessCodeCache(self)
+        return self.access_cache.validate(location_id, code, at)
+    
+    def find_access_grant(self, location_id, code, at=None):
+        """validate_access straight from the (location_id, access_code) index, bypassing the cache"""
+        at = to_timestamp(at or datetime.now(timezone.utc))
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(AccessGrant)
+            cursor.execute('''
+                SELECT access_id, location_id, user_id, access_code, valid_from, valid_to
+                FROM AccessControl
+                WHERE location_id = ? AND access_code = ? AND valid_from <= ? AND valid_to >= ?
+                ORDER BY valid_to DESC
+                LIMIT 1
+            ''', (location_id, str(code), at, at))
+            return cursor.fetchone()
+    
+    def get_access_grants(self, location_id, start, end):
+        """AccessGrants of a location valid at any time in [start, end], via the expiry index"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(AccessGrant)
+            cursor.execute('''
+                SELECT access_id, location_id, user_id, access_code, valid_from, valid_to
+                FROM AccessControl
+                WHERE location_id = ? AND valid_to >= ? AND valid_from <= ?
+            ''', (location_id, to_timestamp(start), to_timestamp(end)))
+            return cursor.fetchall()
+    
+    def get_payments(self, booking_id=None):
+        """Get payments, optionally for a single booking"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = record_factory(Payment)
+            if booking_id:
+                cursor.execute('''
+                    SELECT payment_id, booking_id, amount, payment_date, payment_method,
+                           transaction_id, status
+                    FROM Payments
+                    WHERE booking_id = ?
+                    ORDER BY payment_date
+                ''', (booking_id,))
+            else:
+                cursor.execute('''
+                    SELECT payment_id, booking_id, amount, payment_date, payment_method,
+                           transaction_id, status
+                    FROM Payments
+                    ORDER BY payment_date
+                ''')
+            return cursor.fetchall()
+    
+    def bulk_insert_items(self, source, batch_size=10000):
+        """Import RentalItems from a CSV/JSONL path or an iterable of dicts"""
+        return self._bulk_insert(
+            'RentalItems',
+            ('item_id', 'name', 'description', 'category', 'company_id', 'location_id',
+             'availability_status', 'rental_price_per_day', 'image_url', 'created_at'),
+            source, batch_size,
+            defaults={'availability_status': 'available'},
+            numbers={'item_id': int, 'company_id': int, 'location_id': int, 'rental_price_per_day': float},
+        )
+    
+    def bulk_insert_bookings(self, source, batch_size=10000):
+        """Import Bookings from a CSV/JSONL path or an iterable of dicts.
+
+        Imported history is taken as-is: overlapping bookings are not rejected.
+        """
+        return self._bulk_insert(
+            'Bookings',
+            ('booking_id', 'item_id', 'user_id', 'start_date', 'end_date', 'total_price',
+             'status', 'created_at'),
+            source, batch_size,
+            defaults={'status': 'pending'},
+            date_columns=('start_date', 'end_date'),
+            numbers={'booking_id': int, 'item_id': int, 'user_id': int, 'total_price': float},
+        )
+    
+    def bulk_insert_payments(self, source, batch_size=10000):
+        """Import Payments from a CSV/JSONL path or an iterable of dicts"""
+        return self._bulk_insert(
+            'Payments',
+            ('payment_id', 'booking_id', 'amount', 'payment_date', 'payment_method',
+             'transaction_id', 'status'),
+            source, batch_size,
+            defaults={'status': 'pending'},
+            numbers={'payment_id': int, 'booking_id': int, 'amount': float},
+        )
+    
+    def _bulk_insert(self, table, columns, source, batch_size, defaults=None, date_columns=(), numbers=None):
+        """Insert rows with executemany, one transaction per batch.
+
+        Values are checked first: `numbers` maps columns to int or float,
+        dates must parse, and nested JSON values are refused. Foreign keys
+        and CHECK constraints are enforced. A batch that fails is rolled back
+        and replayed row by row, so bad rows are reported in the result
+        without aborting the rest of the import.
+        """
+        defaults, numbers = defaults or {}, numbers or {}
+        placeholders = ', '.join(
+            'COALESCE(?, CURRENT_TIMESTAMP)' if column == 'created_at' else '?'
+            for column in columns
+        )
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        inserted, errors = 0, []
+        
+        def prepare(row):
+            values = []
+            for column in columns:
+                value = row.get(column)
+                if value is None or value == '':
+                    value = defaults.get(column)
+                elif isinstance(value, (dict, list)):
+                    raise ValueError(f"{column}: nested value {value!r}")
+                elif column in numbers:
+                    try:
+                        value = to_number(value, numbers[column])
+                    except (ValueError, OverflowError) as e:
+                        raise ValueError(f"{column}: {e}") from None
+                elif column in date_columns:
+                    value = to_iso_date(value)
+                values.append(value)
+            return values
+        
+        # Constraint violations, and values sqlite3 can't bind, reject one row
+        row_errors = (sqlite3.IntegrityError, sqlite3.ProgrammingError, sqlite3.InterfaceError, sqlite3.DataError)
+        
+        def flush(conn, lines, batch):
+            nonlocal inserted
+            try:
+                with self.transaction():
+                    conn.executemany(sql, batch)
+                inserted += len(batch)
+                return
+            except row_errors:
+                pass
+            with self.transaction():
+                for line_number, values in zip(lines, batch):
+                    try:
+                        conn.execute(sql, values)
+                        inserted += 1
+                    except row_errors as e:
+                        errors.append((line_number, str(e)))
+        
+        with self.connection() as conn:
+            conn.execute("PRAGMA foreign_keys = ON")
+            try:
+                lines, batch = [], []
+                for line_number, row in read_rows(source):
+                    if isinstance(row, ValueError):
+                        errors.append((line_number, f"invalid JSON: {row}"))
+                        continue
+                    try:
+                        batch.append(prepare(row))
+                    except (AttributeError, TypeError, ValueError) as e:
+                        errors.append((line_number, str(e)))
+                        continue
+                    lines.append(line_number)
+                    if len(batch) >= batch_size:
+                        flush(conn, lines, batch)
+                        lines, batch = [], []
+                if batch:
+                    flush(conn, lines, batch)
+            finally:
+                conn.execute("PRAGMA foreign_keys = OFF")
+        
+        return ImportResult(inserted, sorted(errors))
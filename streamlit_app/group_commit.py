@@ -0,0 +1,137 @@
+"""Group commit for RentsterDB writes.
+
+SQLite allows one writer at a time, so concurrent sessions each running
+their own write transaction queue up on the write lock, polling it from
+the busy handler. A GroupCommitWriter instead funnels writes through a
+single thread. The thread takes whatever writes are queued and runs each
+in its own savepoint inside one BEGIN IMMEDIATE transaction. A write that
+fails only rolls back its savepoint. The group then commits once. Each
+caller holds a Future that resolves with its write's result, such as the
+new row id, only after the commit.
+
+When writes are arriving concurrently (the previous group had more than
+one) the thread lingers up to `max_delay` seconds for the group to reach
+the previous group's size, so steady concurrent writers commit together
+without waiting out the whole delay. A lone writer is never delayed.
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+_Write = namedtuple('_Write', ['future', 'func', 'args', 'kwargs'])
+_STOP = object()
+
+class GroupCommitWriter:
+    def __init__(self, db, max_batch=256, max_delay=0.002):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.groups = 0
+        self.writes = 0
+        self._queue = queue.SimpleQueue()
+        self._after_commit = []
+        self._last_group_size = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='rentster-writer', daemon=True)
+        self._thread.start()
+
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) to run in the next group; returns its Future.
+
+        Called from inside a queued write, func runs immediately as part of
+        the current group.
+        """
+        future = Future()
+        if self.in_writer_thread():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._closed:
+            raise RuntimeError("GroupCommitWriter is closed")
+        self._queue.put(_Write(future, func, args, kwargs))
+        return future
+
+    def after_commit(self, callback):
+        """Run callback once the group being written commits (writer thread only)"""
+        self._after_commit.append(callback)
+
+    def close(self):
+        """Commit the writes already queued, then stop the thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self):
+        """Block for the next write, then gather a group; returns (group, stop)"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        group = [first]
+        target = min(self._last_group_size, self.max_batch)
+        deadline = time.perf_counter() + self.max_delay
+        while len(group) < self.max_batch:
+            try:
+                # Take what is already queued; wait for more only below the target
+                remaining = deadline - time.perf_counter()
+                if len(group) < target and remaining > 0:
+                    write = self._queue.get(timeout=remaining)
+                else:
+                    write = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if write is _STOP:
+                return group, True
+            group.append(write)
+        return group, False
+
+    def _run(self):
+        while True:
+            group, stop = self._collect()
+            if group:
+                self._commit(group)
+            if stop:
+                return
+
+    def _commit(self, group):
+        running = [write for write in group if write.future.set_running_or_notify_cancel()]
+        outcomes = []
+        self._after_commit = []
+        try:
+            with self.db.transaction():
+                for write in running:
+                    try:
+                        with self.db.transaction():
+                            outcomes.append((write.func(*write.args, **write.kwargs), None))
+                    except Exception as e:
+                        outcomes.append((None, e))
+        except Exception as e:
+            # Nothing in the group was committed
+            for write in running:
+                write.future.set_exception(e)
+            return
+        finally:
+            callbacks, self._after_commit = self._after_commit, []
+        self.groups += 1
+        self.writes += len(running)
+        self._last_group_size = len(running)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # The writes are committed; a failed notification must not stop the writer
+                pass
+        for write, (result, error) in zip(running, outcomes):
+            if error is not None:
+                write.future.set_exception(error)
+            else:
+                write.future.set_result(result)
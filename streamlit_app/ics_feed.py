@@ -0,0 +1,308 @@
+"""iCalendar (ICS) feeds of a company's bookings.
+
+Calendar apps subscribe to a feed URL and poll it every few minutes, so a
+feed is built once and then kept current incrementally. Every write to a
+booking gives it a new, highest sequence number in BookingChanges. A
+CalendarFeed remembers the sequence it was built at and only re-renders
+the events of bookings changed since. A poll first reads the company's
+latest sequence, a single index seek. If it equals the client's ETag the
+answer is 304 Not Modified. Otherwise the cached body is patched with
+the changed bookings and written out block by block.
+
+Clients that keep their own copy can instead pass the token of their last
+sync as `since` and receive only the bookings changed after it. Cancelled
+and deleted bookings are sent as STATUS:CANCELLED so they can be removed,
+as are bookings moved to an item outside the feed's scope.
+
+Renaming an item re-sequences its bookings, so feeds patch those events
+like any other change. Moving an item to another location or company,
+or deleting it, bumps the company's FeedVersions counter (the second
+part of the token) and that company's feeds rebuild from scratch.
+"""
+import hashlib
+import hmac
+import os
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+PRODUCT_ID = "-//Rentster//Booking Calendar//EN"
+
+# Bookings in these states are shown; the others only appear as cancellations
+ACTIVE_STATUSES = {'pending': 'TENTATIVE', 'confirmed': 'CONFIRMED', 'completed': 'CONFIRMED'}
+
+# status is 200 or 304; chunks is a list of byte strings making up the body, None for a 304
+FeedResponse = namedtuple('FeedResponse', ['status', 'etag', 'token', 'chunks'])
+
+def escape_text(value):
+    """Escape a TEXT property value (RFC 5545 section 3.3.11)"""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def fold_line(line):
+    """Fold a content line into CRLF-terminated pieces of at most 75 octets"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces, limit = [], 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return '\r\n '.join(pieces) + '\r\n'
+
+def ics_date(value):
+    return value.replace('-', '')[:8]
+
+def ics_timestamp(value=None):
+    """'YYYY-MM-DD HH:MM:SS' (UTC, as CURRENT_TIMESTAMP writes it) as an ICS UTC date-time; now if missing"""
+    if not value:
+        return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}"
+    value = value.replace('-', '').replace(':', '').replace(' ', 'T')
+    return (value + 'T000000')[:15] + 'Z'
+
+def format_event(booking, cancelled=False):
+    """VEVENT text for a FeedBooking; all-day, with the end date made exclusive"""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:booking-{booking.booking_id}@rentster",
+        f"SEQUENCE:{booking.seq}",
+    ]
+    # Only tombstones older than BookingChanges' date columns lack dates; any day will do for those
+    start_date = booking.start_date or date.today().isoformat()
+    end = date.fromisoformat((booking.end_date or start_date)[:10]) + timedelta(days=1)
+    dates = [f"DTSTART;VALUE=DATE:{ics_date(start_date)}", f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}"]
+    if booking.deleted:
+        lines += [f"DTSTAMP:{ics_timestamp()}", *dates, "STATUS:CANCELLED"]
+    else:
+        summary = booking.item_name or f"Item {booking.item_id}"
+        if booking.customer:
+            summary = f"{summary} - {booking.customer}"
+        lines += [
+            f"DTSTAMP:{ics_timestamp(booking.created_at)}",
+            *dates,
+            f"SUMMARY:{escape_text(summary)}",
+            f"DESCRIPTION:{escape_text(f'Booking #{booking.booking_id} ({booking.status})')}",
+            f"STATUS:{'CANCELLED' if cancelled else ACTIVE_STATUSES[booking.status]}",
+            "TRANSP:OPAQUE",
+        ]
+    lines.append("END:VEVENT")
+    return ''.join(fold_line(line) for line in lines)
+
+def iter_calendar(events, name):
+    """Stream a VCALENDAR around already formatted VEVENT texts"""
+    yield fold_line("BEGIN:VCALENDAR")
+    yield fold_line("VERSION:2.0")
+    yield fold_line(f"PRODID:{PRODUCT_ID}")
+    yield fold_line("CALSCALE:GREGORIAN")
+    yield fold_line(f"X-WR-CALNAME:{escape_text(name)}")
+    yield from events
+    yield fold_line("END:VCALENDAR")
+
+def make_token(version):
+    """Opaque sync token (and ETag value) for a booking_feed_version() result"""
+    return f"{version[0]}.{version[1]}"
+
+def parse_token(token):
+    try:
+        seq, items_version = token.split('.')
+        return int(seq), int(items_version)
+    except (AttributeError, ValueError):
+        return None
+
+class CalendarFeed:
+    """One company's bookings, optionally narrowed to a location or an item, as a cached ICS feed
+
+    Encoded events are kept in blocks of BLOCK_SIZE consecutive booking ids,
+    each with its joined bytes cached, so a change re-joins only its block
+    and the body is served as a list of chunks without being concatenated.
+    """
+    BLOCK_SIZE = 1024
+
+    def __init__(self, db, company_id, location_id=None, item_id=None, name=None):
+        self.db = db
+        self.company_id = company_id
+        self.location_id = location_id
+        self.item_id = item_id
+        self.name = name or "Rentster Bookings"
+        self.version = None
+        self._blocks = {}    # booking_id // BLOCK_SIZE -> {booking_id: encoded VEVENT}
+        self._rendered = {}  # block number -> joined bytes of that block
+        self._chunks = None
+        self._body = None    # (chunks it was joined from, bytes)
+        self._header, _, self._footer = (
+            ''.join(iter_calendar(['\0'], self.name)).encode('utf-8').partition(b'\0')
+        )
+        self._lock = threading.Lock()
+
+    def _in_scope(self, booking):
+        return ((self.location_id is None or booking.location_id == self.location_id)
+                and (self.item_id is None or booking.item_id == self.item_id))
+
+    def _changes(self, since_seq):
+        """Bookings changed after since_seq, then tombstones of bookings that left the scope.
+
+        Changes are unfiltered by location/item, so bookings moved out of
+        scope are seen and dropped. A booking moved off an item in scope,
+        including to another company's item, also comes back as a
+        tombstone unless it is in scope again.
+        """
+        changes = self.db.get_booking_feed(self.company_id, since_seq)
+        current = {booking.booking_id for booking in changes if self._in_scope(booking)}
+        left = {}
+        for booking in self.db.get_booking_moves(self.company_id, since_seq):
+            if booking.booking_id not in current and self._in_scope(booking):
+                left[booking.booking_id] = booking
+        return changes + list(left.values())
+
+    def refresh(self):
+        """Bring the cached events up to date; returns the version they reflect"""
+        version = self.db.booking_feed_version(self.company_id)
+        with self._lock:
+            if version == self.version:
+                return version
+            if self.version is None or version[1] != self.version[1]:
+                self._blocks, self._rendered = {}, {}
+                changes = self.db.get_booking_feed(
+                    self.company_id, location_id=self.location_id, item_id=self.item_id
+                )
+            else:
+                changes = self._changes(self.version[0])
+            for booking in changes:
+                number = booking.booking_id // self.BLOCK_SIZE
+                block = self._blocks.setdefault(number, {})
+                if booking.deleted or booking.status not in ACTIVE_STATUSES or not self._in_scope(booking):
+                    block.pop(booking.booking_id, None)
+                else:
+                    block[booking.booking_id] = format_event(booking).encode('utf-8')
+                self._rendered.pop(number, None)
+            self.version = version
+            self._chunks = None
+            return version
+
+    def chunks(self):
+        """The full feed as a list of byte strings, to be written in order"""
+        self.refresh()
+        return self._render()
+
+    def body(self):
+        """The full feed as one byte string, joined once per version and shared by callers"""
+        chunks = self.chunks()
+        with self._lock:
+            if self._body is None or self._body[0] is not chunks:
+                self._body = (chunks, b''.join(chunks))
+            return self._body[1]
+
+    def _render(self):
+        with self._lock:
+            if self._chunks is None:
+                for number in self._blocks.keys() - self._rendered.keys():
+                    self._rendered[number] = b''.join(self._blocks[number].values())
+                self._chunks = [self._header] + [self._rendered[n] for n in sorted(self._rendered)] + [self._footer]
+            return self._chunks
+
+    def iter_changes(self, since_seq):
+        """Stream a VCALENDAR of the bookings in scope changed after since_seq"""
+        events = (
+            format_event(booking, cancelled=booking.status not in ACTIVE_STATUSES)
+            for booking in self._changes(since_seq)
+            if self._in_scope(booking)
+        )
+        return iter_calendar(events, self.name)
+
+    def respond(self, if_none_match=None, since=None):
+        """Answer a poll: 304 when the client's ETag is current, else the full feed or the changes since a token.
+
+        A since token from before one of the company's items last moved
+        can't be patched, so it is answered with the full feed.
+        """
+        version = self.refresh()
+        token = make_token(version)
+        etag = f'"{token}"'
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return FeedResponse(304, etag, token, None)
+        since_version = parse_token(since)
+        if since_version and since_version[1] == version[1] and since_version[0] <= version[0]:
+            chunks = [chunk.encode('utf-8') for chunk in self.iter_changes(since_version[0])]
+            return FeedResponse(200, etag, token, chunks)
+        return FeedResponse(200, etag, token, self._render())
+
+_shared_feeds = {}
+_shared_feeds_lock = threading.Lock()
+
+def shared_feed(db, company_id, location_id=None, item_id=None):
+    """Process-wide CalendarFeed for a scope, so every poller shares one cached body"""
+    key = (db.db_path, company_id, location_id, item_id)
+    with _shared_feeds_lock:
+        feed = _shared_feeds.get(key)
+        if feed is None:
+            feed = _shared_feeds[key] = CalendarFeed(db, company_id, location_id, item_id)
+    return feed
+
+def feed_key(company_id, location_id=None, item_id=None):
+    """Secret for a feed URL, signed with RENTSTER_FEED_SECRET; None when no secret is set"""
+    secret = os.environ.get('RENTSTER_FEED_SECRET')
+    if not secret:
+        return None
+    scope = f"{company_id}:{location_id or ''}:{item_id or ''}"
+    return hmac.new(secret.encode(), scope.encode(), hashlib.sha256).hexdigest()[:32]
+
+def feed_url(company_id, location_id=None, item_id=None):
+    """Subscription URL under RENTSTER_FEED_URL, or None when feeds aren't served"""
+    base = os.environ.get('RENTSTER_FEED_URL')
+    key = feed_key(company_id, location_id, item_id)
+    if not base or not key:
+        return None
+    query = f"key={key}"
+    if location_id is not None:
+        query += f"&location={location_id}"
+    if item_id is not None:
+        query += f"&item={item_id}"
+    return f"{base.rstrip('/')}/feeds/{company_id}.ics?{query}"
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET /feeds/<company_id>.ics?key=...[&location=...][&item=...][&since=...]
+
+    Set `db` on a subclass (see manage.py serve-feeds). Responses carry an
+    ETag and an X-Sync-Token header holding the token for the next `since`.
+    """
+    db = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        directory, _, file_name = url.path.rpartition('/')
+        try:
+            if directory != '/feeds' or not file_name.endswith('.ics'):
+                raise ValueError
+            company_id = int(file_name[:-4])
+            location_id = int(params['location']) if 'location' in params else None
+            item_id = int(params['item']) if 'item' in params else None
+        except ValueError:
+            self.send_error(404)
+            return
+        expected = feed_key(company_id, location_id, item_id)
+        if expected is None or not hmac.compare_digest(expected, params.get('key', '')):
+            self.send_error(403)
+            return
+
+        feed = shared_feed(self.db, company_id, location_id, item_id)
+        response = feed.respond(self.headers.get('If-None-Match'), params.get('since'))
+        self.send_response(response.status)
+        self.send_header('ETag', response.etag)
+        self.send_header('X-Sync-Token', response.token)
+        self.send_header('Cache-Control', 'no-cache')
+        if response.chunks is None:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', 'text/calendar; charset=utf-8')
+        self.send_header('Content-Length', str(sum(map(len, response.chunks))))
+        self.end_headers()
+        for chunk in response.chunks:
+            self.wfile.write(chunk)
@@ -0,0 +1,136 @@
+"""Command-line maintenance tasks for the Rentster database.
+
+Usage:
+    python manage.py import items items.csv
+    python manage.py --db other.db import bookings bookings.jsonl
+    python manage.py rebuild-rollups
+    python manage.py complete-bookings        # nightly, e.g. from cron
+    RENTSTER_FEED_SECRET=... python manage.py serve-feeds --port 8502
+    python manage.py bench pool --scale 0.1   # see bench/__init__.py
+"""
+import argparse
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from database import RentsterDB
+
+def import_data(db, args):
+    """Bulk import items, bookings or payments from a CSV or JSONL file"""
+    bulk_insert = {
+        'items': db.bulk_insert_items,
+        'bookings': db.bulk_insert_bookings,
+        'payments': db.bulk_insert_payments,
+    }[args.kind]
+    
+    started = time.perf_counter()
+    result = bulk_insert(args.path, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    
+    rate = result.inserted / elapsed if elapsed else 0
+    print(f"Imported {result.inserted} {args.kind} in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    if result.errors:
+        print(f"{len(result.errors)} rows rejected:")
+        for line_number, message in result.errors[:args.show_errors]:
+            print(f"  line {line_number}: {message}")
+        if len(result.errors) > args.show_errors:
+            print(f"  ... and {len(result.errors) - args.show_errors} more")
+        return 1
+    return 0
+
+def rebuild_rollups(db, args):
+    """Recompute the daily, category and hourly rollup tables from Bookings"""
+    started = time.perf_counter()
+    db.rebuild_rollups()
+    print(f"Rebuilt rollups in {time.perf_counter() - started:.2f}s")
+    return 0
+
+def complete_bookings(db, args):
+    """Mark confirmed bookings that have ended as completed"""
+    started = time.perf_counter()
+    completed = db.complete_past_bookings(args.as_of)
+    print(f"Completed {completed} bookings in {time.perf_counter() - started:.2f}s")
+    return 0
+
+def serve_feeds(db, args):
+    """Serve the iCalendar booking feeds over HTTP until interrupted"""
+    from http.server import ThreadingHTTPServer
+    from ics_feed import FeedRequestHandler, feed_key
+    
+    if feed_key(0) is None:
+        print("Set RENTSTER_FEED_SECRET to sign feed URLs before serving feeds")
+        return 1
+    handler = type('Handler', (FeedRequestHandler,), {'db': db})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Serving calendar feeds on http://{args.host}:{args.port}/feeds/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+def run_benchmark(db, args):
+    """Run one of the benchmarks in bench/ on databases it seeds itself"""
+    from bench import BENCHMARKS
+    
+    module = importlib.import_module(BENCHMARKS[args.name])
+    workdir = args.dir or tempfile.mkdtemp(prefix='rentster-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    started = time.perf_counter()
+    try:
+        module.run(workdir, args.scale)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(f"Benchmark {args.name} finished in {time.perf_counter() - started:.1f}s")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rentster database maintenance")
+    parser.add_argument('--db', default="rentster.db", help="SQLite database path")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    import_parser = commands.add_parser('import', help="bulk import rows from CSV or JSONL")
+    import_parser.add_argument('kind', choices=['items', 'bookings', 'payments'])
+    import_parser.add_argument('path', help="a .csv file with a header row, or a .jsonl file")
+    import_parser.add_argument('--batch-size', type=int, default=10000)
+    import_parser.add_argument('--show-errors', type=int, default=20)
+    import_parser.set_defaults(handler=import_data)
+    
+    rollups_parser = commands.add_parser('rebuild-rollups', help="backfill the analytics rollup tables")
+    rollups_parser.set_defaults(handler=rebuild_rollups)
+    
+    complete_parser = commands.add_parser('complete-bookings', help="complete confirmed bookings that have ended")
+    complete_parser.add_argument('--as-of', help="complete bookings ending before this date (default today)")
+    complete_parser.set_defaults(handler=complete_bookings)
+    
+    feeds_parser = commands.add_parser('serve-feeds', help="serve iCalendar booking feeds over HTTP")
+    feeds_parser.add_argument('--host', default="127.0.0.1")
+    feeds_parser.add_argument('--port', type=int, default=8502)
+    feeds_parser.set_defaults(handler=serve_feeds)
+    
+    from bench import BENCHMARKS
+    
+    bench_parser = commands.add_parser('bench', help="run a benchmark on generated data")
+    bench_parser.add_argument('name', choices=sorted(BENCHMARKS))
+    bench_parser.add_argument('--scale', type=float, default=1.0, help="multiply the data sizes")
+    bench_parser.add_argument('--dir', help="directory for the benchmark databases (default a temporary one)")
+    bench_parser.add_argument('--keep', action='store_true', help="keep the benchmark databases afterwards")
+    bench_parser.set_defaults(handler=run_benchmark, open_db=False)
+    
+    args = parser.parse_args(argv)
+    if not getattr(args, 'open_db', True):
+        return args.handler(None, args)
+    db = RentsterDB(args.db)
+    try:
+        return args.handler(db, args)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
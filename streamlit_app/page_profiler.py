@@ -0,0 +1,145 @@
+"""Per-section render profiling for the Streamlit pages.
+
+Pages create a profiler at the top of every rerun and wrap their sections:
+
+    profiler = page_profiler("Analytics")
+    with profiler.section("load data"):
+        ...
+    profiler.render_sidebar()
+
+With RENTSTER_PROFILE=1 each section records wall time and, via
+tracemalloc, the memory it left allocated and its peak above the starting
+point. Finished reruns are kept in a process-wide ring buffer, exportable
+as JSON from the sidebar panel. Without the flag page_profiler() returns
+a profiler whose sections are a shared no-op context manager.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+_NO_SECTION = nullcontext()
+
+# Most recent profiled reruns, across all pages and sessions
+_runs = deque(maxlen=200)
+_runs_lock = threading.Lock()
+
+def enabled():
+    """Whether RENTSTER_PROFILE asks for page profiling"""
+    return os.environ.get('RENTSTER_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+
+class PageProfiler:
+    def __init__(self, page):
+        self.page = page
+        self.started_at = time.time()
+        self.sections = []
+        self._start = time.perf_counter()
+        self._stack = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def section(self, name):
+        """Record wall time and memory for the enclosed block"""
+        if self._stack:
+            # Keep the enclosing section's peak before resetting it for this one
+            parent = self._stack[-1]
+            parent['peak'] = max(parent['peak'], tracemalloc.get_traced_memory()[1])
+        # Appended on entry so sections stay in the order they started
+        record = {'section': name, 'depth': len(self._stack)}
+        self.sections.append(record)
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        frame = {'memory': current, 'peak': current}
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            self._stack.pop()
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame['peak'])
+            record['wall_ms'] = wall * 1000.0
+            record['allocated_kb'] = (current - frame['memory']) / 1024.0
+            record['peak_kb'] = (peak - frame['memory']) / 1024.0
+            if self._stack:
+                parent = self._stack[-1]
+                parent['peak'] = max(parent['peak'], peak)
+
+    def profiled(self, name=None):
+        """Decorator running a function inside a section (named after it by default)"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.section(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def finish(self):
+        """Close the rerun and keep it in the shared history; returns its record"""
+        run = {
+            'page': self.page,
+            'started_at': self.started_at,
+            'total_ms': (time.perf_counter() - self._start) * 1000.0,
+            'sections': self.sections,
+        }
+        with _runs_lock:
+            _runs.append(run)
+        return run
+
+    def render_sidebar(self):
+        """Finish the rerun and show its sections, plus a JSON export, in the sidebar"""
+        import pandas as pd
+        import streamlit as st
+
+        run = self.finish()
+        with st.sidebar.expander(f"⏱️ Render Profile ({run['total_ms']:.0f} ms)"):
+            if run['sections']:
+                sections = pd.DataFrame(run['sections'])
+                sections['section'] = ['  ' * depth + name for depth, name in zip(sections.pop('depth'), sections['section'])]
+                st.dataframe(sections.round(1), use_container_width=True, hide_index=True)
+            else:
+                st.caption("No sections recorded")
+            st.download_button(
+                "Export Profiles (JSON)",
+                data=export_json(),
+                file_name="render_profiles.json",
+                mime="application/json",
+            )
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every call is a no-op"""
+    def __init__(self, page):
+        self.page = page
+
+    def section(self, name):
+        return _NO_SECTION
+
+    def profiled(self, name=None):
+        return lambda func: func
+
+    def finish(self):
+        return None
+
+    def render_sidebar(self):
+        pass
+
+def page_profiler(page):
+    """Profiler for one rerun of page, or a NullProfiler when profiling is off"""
+    return PageProfiler(page) if enabled() else NullProfiler(page)
+
+def recent_runs(page=None):
+    """Profiled reruns, oldest first, optionally for one page"""
+    with _runs_lock:
+        runs = list(_runs)
+    return [run for run in runs if page is None or run['page'] == page]
+
+def export_json(page=None):
+    """Recent profiled reruns as a JSON document"""
+    return json.dumps({'runs': recent_runs(page)}, indent=2)
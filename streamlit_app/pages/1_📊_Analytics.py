@@ -1,9 +1,19 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import numpy as np
+from page_profiler import page_profiler
+
+profiler = page_profiler("Analytics")
+
+with profiler.section("imports"):
+    import streamlit as st
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from datetime import datetime, timedelta
+    import numpy as np
+    from database import CategoryStats, DailyStats, shared_db
+    from query_cache import shared_cache
+    from query_stats import shared_stats
+    from timeseries import chart_width_px, downsample_series
+    from reports import REPORT_TYPES, start_report
 
 st.set_page_config(page_title="Analytics", page_icon="📊", layout="wide")
 
@@ -14,34 +24,42 @@ if 'user' not in st.session_state or st.session_state.user is None:
 
 st.title("📊 Analytics Dashboard")
 
-# Generate sample data for demonstration
-@st.cache_data
-def generate_sample_data():
-    # Revenue data
-    dates = pd.date_range(start='2024-01-01', end='2024-09-05', freq='D')
-    revenue_data = pd.DataFrame({
-        'date': dates,
-        'revenue': np.random.normal(50, 15, len(dates)).cumsum() + np.random.normal(0, 10, len(dates))
-    })
-    revenue_data['revenue'] = np.maximum(revenue_data['revenue'], 0)
+db = shared_db()
+cache = shared_cache(db)
+shared_stats(db, page="Analytics")
+
+@cache.cached('Bookings', 'RentalItems')
+def load_analytics_data(company_id, today):
+    """Read the daily and category rollups; a few hundred rows instead of the fact tables"""
+    daily = pd.DataFrame(db.get_daily_stats(company_id), columns=DailyStats._fields)
     
-    # Booking data
-    booking_data = pd.DataFrame({
-        'date': dates,
-        'bookings': np.random.poisson(3, len(dates))
-    })
+    # One row per calendar day up to today, so quiet days show as zero
+    end = pd.Timestamp(today)
+    start = pd.Timestamp(daily['day'].iloc[0]) if len(daily) else end
+    dates = pd.date_range(start=start, end=max(start, end), freq='D')
+    daily = daily.set_index(pd.to_datetime(daily.pop('day'))).reindex(dates, fill_value=0)
     
-    # Item category data
-    categories = ['Electronics', 'Tools', 'Vehicles', 'Equipment', 'Other']
-    category_data = pd.DataFrame({
-        'category': categories,
-        'bookings': np.random.randint(10, 100, len(categories)),
-        'revenue': np.random.randint(500, 5000, len(categories))
-    })
+    revenue_data = pd.DataFrame({'date': dates, 'revenue': daily['revenue'].astype(float).to_numpy()})
+    booking_data = pd.DataFrame({'date': dates, 'bookings': daily['bookings'].astype(int).to_numpy()})
+    
+    categories = pd.DataFrame(db.get_category_stats(company_id), columns=CategoryStats._fields)
+    category_data = categories.groupby('category', as_index=False)[['bookings', 'revenue']].sum()
     
     return revenue_data, booking_data, category_data
 
-revenue_data, booking_data, category_data = generate_sample_data()
+@cache.cached('Bookings', 'RentalItems')
+def load_activity_heatmap(company_id, start, end, category=None, location_id=None):
+    """Bookings created per weekday and hour; one grouped query over the hourly rollup"""
+    return db.get_activity_heatmap(company_id, start, end, category=category, location_id=location_id)
+
+@cache.cached('Locations')
+def load_locations(company_id):
+    return db.get_locations(company_id)
+
+with profiler.section("load data"):
+    revenue_data, booking_data, category_data = load_analytics_data(
+        st.session_state.user['company_id'], datetime.now().date()
+    )
 
 # Key Metrics
 col1, col2, col3, col4 = st.columns(4)
@@ -67,14 +85,21 @@ st.divider()
 # Charts
 col1, col2 = st.columns(2)
 
-with col1:
+with col1, profiler.section("revenue chart"):
     st.subheader("Revenue Trend")
-    fig_revenue = px.line(revenue_data, x='date', y='revenue', 
-                         title="Daily Revenue Over Time")
+    trend_range = st.selectbox("Range", ["All Time", "Last 12 Months", "Last 90 Days"], key="revenue_range")
+    range_start = {
+        "Last 12 Months": datetime.now() - timedelta(days=365),
+        "Last 90 Days": datetime.now() - timedelta(days=90),
+    }.get(trend_range)
+    # Daily points for short ranges, weekly/monthly totals for long ones
+    trend_data, resolution = downsample_series(revenue_data, 'date', 'revenue', width_px=chart_width_px(), start=range_start)
+    fig_revenue = px.line(trend_data, x='date', y='revenue', 
+                         title=f"{resolution} Revenue Over Time")
     fig_revenue.update_layout(height=400)
     st.plotly_chart(fig_revenue, use_container_width=True)
 
-with col2:
+with col2, profiler.section("bookings chart"):
     st.subheader("Bookings Trend")
     fig_bookings = px.bar(booking_data.tail(30), x='date', y='bookings',
                          title="Daily Bookings (Last 30 Days)")
@@ -86,12 +111,12 @@ st.subheader("Performance by Category")
 
 col1, col2 = st.columns(2)
 
-with col1:
+with col1, profiler.section("category pie"):
     fig_cat_bookings = px.pie(category_data, values='bookings', names='category',
                              title="Bookings by Category")
     st.plotly_chart(fig_cat_bookings, use_container_width=True)
 
-with col2:
+with col2, profiler.section("category bars"):
     fig_cat_revenue = px.bar(category_data, x='category', y='revenue',
                             title="Revenue by Category")
     st.plotly_chart(fig_cat_revenue, use_container_width=True)
@@ -101,7 +126,7 @@ st.subheader("Detailed Analytics")
 
 tab1, tab2, tab3 = st.tabs(["📈 Growth Metrics", "🎯 Performance", "📋 Reports"])
 
-with tab1:
+with tab1, profiler.section("growth tab"):
     col1, col2 = st.columns(2)
     
     with col1:
@@ -119,8 +144,8 @@ with tab1:
         st.markdown("#### Key Performance Indicators")
         
         # Calculate some KPIs
-        current_month_revenue = revenue_data[revenue_data['date'].dt.month == 9]['revenue'].sum()
-        previous_month_revenue = revenue_data[revenue_data['date'].dt.month == 8]['revenue'].sum()
+        current_month_revenue = monthly_data['revenue'].iloc[-1] if len(monthly_data) > 0 else 0
+        previous_month_revenue = monthly_data['revenue'].iloc[-2] if len(monthly_data) > 1 else 0
         growth_rate = ((current_month_revenue - previous_month_revenue) / previous_month_revenue * 100) if previous_month_revenue > 0 else 0
         
         st.metric("Monthly Growth Rate", f"{growth_rate:.1f}%")
@@ -128,7 +153,7 @@ with tab1:
         st.metric("Average Session Duration", "12.5 min")
         st.metric("Conversion Rate", "4.2%")
 
-with tab2:
+with tab2, profiler.section("performance tab"):
     st.markdown("#### Top Performing Items")
     
     # Sample top items data
@@ -144,11 +169,31 @@ with tab2:
     # Performance heatmap
     st.markdown("#### Performance Heatmap")
     
-    # Generate sample heatmap data
-    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    hours = list(range(8, 22))  # 8 AM to 9 PM
+    company_id = st.session_state.user['company_id']
+    locations = {location.name: location.location_id for location in load_locations(company_id)}
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        heatmap_range = st.selectbox("Period", ["Last 90 Days", "Last 12 Months", "All Time"], key="heatmap_range")
+    with col2:
+        heatmap_category = st.selectbox("Category", ["All"] + sorted(category_data['category']), key="heatmap_category")
+    with col3:
+        heatmap_location = st.selectbox("Location", ["All"] + list(locations), key="heatmap_location")
     
-    heatmap_data = np.random.randint(0, 20, size=(len(hours), len(days)))
+    today = datetime.now().date()
+    heatmap_start = {
+        "Last 90 Days": today - timedelta(days=90),
+        "Last 12 Months": today - timedelta(days=365),
+    }.get(heatmap_range)
+    activity = load_activity_heatmap(
+        company_id, heatmap_start, today,
+        category=None if heatmap_category == "All" else heatmap_category,
+        location_id=locations.get(heatmap_location),
+    )
+    
+    # Rows of the matrix are weekdays; show hours down the side as before
+    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    hours = list(range(24))
+    heatmap_data = np.array(activity).T
     
     fig_heatmap = px.imshow(heatmap_data, 
                            x=days, 
@@ -163,21 +208,65 @@ with tab3:
     col1, col2 = st.columns(2)
     
     with col1:
-        report_type = st.selectbox("Report Type", 
-                                  ["Revenue Report", "Booking Report", "Customer Report", "Item Performance"])
+        report_type = st.selectbox("Report Type", list(REPORT_TYPES))
         date_range = st.date_input("Date Range", 
                                   value=[datetime.now() - timedelta(days=30), datetime.now()],
                                   max_value=datetime.now())
     
     with col2:
         format_type = st.selectbox("Format", ["PDF", "Excel", "CSV"])
-        include_charts = st.checkbox("Include Charts", value=True)
         
-        if st.button("Generate Report"):
-            st.success(f"Generated {report_type} in {format_type} format!")
-            st.info("Report would be available for download in a real implementation.")
+        # A range still being picked has only its start date; a cleared one has none
+        report_dates = list(date_range) if isinstance(date_range, (list, tuple)) else [date_range]
+        if st.button("Generate Report", disabled=not report_dates):
+            previous = st.session_state.get('report_job')
+            if previous is not None:
+                previous.cancel()
+                previous.cleanup()
+            st.session_state.report_job = start_report(
+                db, report_type, format_type,
+                st.session_state.user['company_id'], report_dates[0], report_dates[-1]
+            )
+    
+    def discard_report():
+        """Delete the report file once it has been downloaded"""
+        job = st.session_state.pop('report_job', None)
+        if job is not None:
+            job.cleanup()
+    
+    def show_report_job(polling):
+        """Progress of the export running on a background thread, then its download"""
+        job = st.session_state.get('report_job')
+        if job is None:
+            return
+        if not job.done:
+            st.progress(job.progress, text=f"Generating {job.report_type}: {job.rows_written:,} rows written")
+            return
+        if polling:
+            # Finished: rerun the page so this fragment stops polling
+            st.rerun()
+        if job.error is not None:
+            st.error(f"Report failed: {job.error}")
+        elif job.expired:
+            st.info("That report has expired; generate it again to download it.")
+        else:
+            st.progress(1.0, text=f"{job.rows_written:,} rows in {job.finished_at - job.started_at:.1f}s")
+            with open(job.path, 'rb') as report_file:
+                st.download_button(
+                    f"⬇️ Download {job.file_name}",
+                    data=report_file,
+                    file_name=job.file_name,
+                    mime=job.mime,
+                    on_click=discard_report,
+                )
+    
+    # Only this fragment reruns while the export is in progress, so the page stays responsive
+    job = st.session_state.get('report_job')
+    polling = job is not None and not job.done
+    st.fragment(show_report_job, run_every=0.5 if polling else None)(polling)
 
 # Footer
 st.divider()
 st.markdown("*Analytics data is updated in real-time. Last updated: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "*")
 
+profiler.render_sidebar()
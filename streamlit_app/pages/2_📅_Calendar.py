@@ -1,9 +1,19 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta, date
-import calendar
+from page_profiler import page_profiler
+
+profiler = page_profiler("Calendar")
+
+with profiler.section("imports"):
+    import streamlit as st
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from datetime import datetime, timedelta, date
+    import calendar
+    from calendar_engine import bucket_bookings
+    from database import CalendarBooking, shared_db
+    from ics_feed import feed_url, shared_feed
+    from query_cache import shared_cache
+    from query_stats import shared_stats
 
 st.set_page_config(page_title="Calendar", page_icon="📅", layout="wide")
 
@@ -28,38 +38,37 @@ with col3:
         selected_date = datetime.now().date()
         st.rerun()
 
-# Generate sample booking data
-@st.cache_data
-def generate_calendar_data():
-    # Generate sample bookings for the current month
-    start_date = datetime.now().replace(day=1)
-    end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-    
-    bookings = []
-    items = ['Professional Camera', 'Power Drill', 'Mountain Bike', 'Projector', 'Laptop']
-    
-    current = start_date
-    while current <= end_date:
-        # Random number of bookings per day (0-5)
-        num_bookings = max(0, int(np.random.normal(2, 1)))
-        
-        for i in range(num_bookings):
-            booking = {
-                'date': current.date(),
-                'item': np.random.choice(items),
-                'customer': f"Customer {np.random.randint(1, 100)}",
-                'start_time': f"{np.random.randint(8, 18):02d}:00",
-                'duration': np.random.choice([1, 2, 3, 7, 14]),  # days
-                'status': np.random.choice(['confirmed', 'pending', 'completed'], p=[0.6, 0.2, 0.2])
-            }
-            bookings.append(booking)
-        
-        current += timedelta(days=1)
-    
-    return pd.DataFrame(bookings)
+db = shared_db()
+cache = shared_cache(db)
+shared_stats(db, page="Calendar")
 
-import numpy as np
-bookings_df = generate_calendar_data()
+@cache.cached('Bookings', 'RentalItems', 'Users')
+def load_calendar_data(company_id, start, end, statuses=('confirmed', 'pending', 'completed')):
+    """Bookings overlapping [start, end], shaped for the calendar views"""
+    bookings = pd.DataFrame(
+        db.get_bookings_in_range(company_id, start, end, statuses),
+        columns=CalendarBooking._fields
+    )
+    bookings['date'] = pd.to_datetime(bookings['start_date'])
+    bookings['end'] = pd.to_datetime(bookings['end_date'])
+    bookings['duration'] = (bookings['end'] - bookings['date']).dt.days + 1  # days
+    bookings['item'] = bookings['item_name']
+    bookings['customer'] = bookings['customer'].fillna("Unknown customer")
+    return bookings
+
+# Load only the bookings overlapping the visible range
+if view_type == "Month":
+    window_start = selected_date.replace(day=1)
+    window_end = selected_date.replace(day=calendar.monthrange(selected_date.year, selected_date.month)[1])
+elif view_type == "Week":
+    window_start = selected_date - timedelta(days=selected_date.weekday())
+    window_end = window_start + timedelta(days=6)
+else:
+    window_start = window_end = selected_date
+
+company_id = st.session_state.user['company_id']
+with profiler.section("load bookings"):
+    bookings_df = load_calendar_data(company_id, window_start, window_end)
 
 if view_type == "Month":
     st.subheader(f"Month View - {selected_date.strftime('%B %Y')}")
@@ -71,13 +80,11 @@ if view_type == "Month":
     # Get calendar data
     cal = calendar.monthcalendar(year, month)
     
-    # Convert date column to datetime for filtering
-    bookings_df['date'] = pd.to_datetime(bookings_df['date'])
-    
-    month_bookings = bookings_df[
-        (bookings_df['date'].dt.year == year) & 
-        (bookings_df['date'].dt.month == month)
-    ]
+    # Bucket bookings per day across their whole duration, once for the month
+    month_start = date(year, month, 1)
+    month_end = date(year, month, calendar.monthrange(year, month)[1])
+    with profiler.section("bucket bookings"):
+        day_buckets = bucket_bookings(bookings_df, month_start, month_end)
     
     # Create calendar grid
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -95,7 +102,7 @@ if view_type == "Month":
                 cols[i].markdown("")
             else:
                 day_date = date(year, month, day)
-                day_bookings = month_bookings[month_bookings['date'].dt.date == day_date]
+                day_bookings = bookings_df.iloc[day_buckets[day_date]]
                 
                 with cols[i]:
                     # Highlight today
@@ -120,16 +127,13 @@ elif view_type == "Week":
     week_start = selected_date - timedelta(days=selected_date.weekday())
     week_dates = [week_start + timedelta(days=i) for i in range(7)]
     
-    # Filter bookings for this week
-    week_bookings = bookings_df[
-        (bookings_df['date'].dt.date >= week_start) & 
-        (bookings_df['date'].dt.date < week_start + timedelta(days=7))
-    ]
+    # Bucket bookings per day across their whole duration, once for the week
+    day_buckets = bucket_bookings(bookings_df, week_dates[0], week_dates[-1])
     
     # Create week view
     cols = st.columns(7)
     for i, day_date in enumerate(week_dates):
-        day_bookings = week_bookings[week_bookings['date'].dt.date == day_date]
+        day_bookings = bookings_df.iloc[day_buckets[day_date]]
         
         with cols[i]:
             # Highlight today
@@ -141,7 +145,7 @@ elif view_type == "Week":
             # Show all bookings for this day
             for _, booking in day_bookings.iterrows():
                 status_color = "🟢" if booking['status'] == 'confirmed' else "🟡" if booking['status'] == 'pending' else "🔵"
-                st.markdown(f"{status_color} **{booking['start_time']}**")
+                st.markdown(f"{status_color} **{booking['date']:%d %b} – {booking['end']:%d %b}**")
                 st.markdown(f"📦 {booking['item']}")
                 st.markdown(f"👤 {booking['customer']}")
                 st.markdown("---")
@@ -149,8 +153,12 @@ elif view_type == "Week":
 else:  # Day view
     st.subheader(f"Day View - {selected_date.strftime('%A, %B %d, %Y')}")
     
-    # Filter bookings for selected day
-    day_bookings = bookings_df[bookings_df['date'].dt.date == selected_date]
+    if 'calendar_notice' in st.session_state:
+        level, message = st.session_state.pop('calendar_notice')
+        getattr(st, level)(message)
+    
+    # Bookings starting on or spanning the selected day
+    day_bookings = bookings_df.iloc[bucket_bookings(bookings_df, selected_date, selected_date)[selected_date]]
     
     if len(day_bookings) > 0:
         # Create timeline view
@@ -168,29 +176,34 @@ else:  # Day view
                 status_color = "🟢" if booking['status'] == 'confirmed' else "🟡" if booking['status'] == 'pending' else "🔵"
                 
                 with st.container():
-                    st.markdown(f"{status_color} **{booking['start_time']} - {booking['item']}**")
+                    st.markdown(f"{status_color} **{booking['item']}**")
                     st.markdown(f"👤 Customer: {booking['customer']}")
+                    st.markdown(f"📅 {booking['start_date']} to {booking['end_date']}")
                     st.markdown(f"⏱️ Duration: {booking['duration']} day(s)")
                     st.markdown(f"📊 Status: {booking['status'].title()}")
                     
                     col_a, col_b, col_c = st.columns(3)
                     with col_a:
-                        if st.button(f"Edit", key=f"edit_{booking.name}"):
+                        if st.button(f"Edit", key=f"edit_{booking['booking_id']}"):
                             st.info("Edit functionality would open here")
                     with col_b:
-                        if st.button(f"Contact", key=f"contact_{booking.name}"):
+                        if st.button(f"Contact", key=f"contact_{booking['booking_id']}"):
                             st.info("Contact customer functionality")
                     with col_c:
                         if booking['status'] == 'pending':
-                            if st.button(f"Confirm", key=f"confirm_{booking.name}"):
-                                st.success("Booking confirmed!")
+                            if st.button(f"Confirm", key=f"confirm_{booking['booking_id']}"):
+                                if db.confirm_booking(int(booking['booking_id'])):
+                                    st.session_state.calendar_notice = ('success', "Booking confirmed!")
+                                else:
+                                    st.session_state.calendar_notice = ('error', "Booking is no longer pending")
+                                st.rerun()
                     
                     st.markdown("---")
     else:
         st.info("No bookings for this day.")
 
 # Sidebar - Quick Actions
-with st.sidebar:
+with st.sidebar, profiler.section("sidebar"):
     st.markdown("### Quick Actions")
     
     if st.button("➕ New Booking"):
@@ -200,7 +213,30 @@ with st.sidebar:
         st.info("Navigate to Analytics page")
     
     if st.button("📋 Export Calendar"):
-        st.info("Calendar export functionality")
+        st.session_state.show_calendar_export = True
+    
+    if st.session_state.get('show_calendar_export'):
+        # Built once per process, then patched with changed bookings only
+        feed = shared_feed(db, company_id)
+        if st.session_state.get('calendar_export_ready'):
+            # The body is joined once per feed version; reruns stop carrying it once downloaded
+            st.download_button(
+                "⬇️ Download .ics",
+                data=feed.body(),
+                file_name=f"rentster_bookings_{company_id}.ics",
+                mime="text/calendar",
+                on_click=lambda: st.session_state.pop('calendar_export_ready', None)
+            )
+        elif st.button("📦 Prepare .ics"):
+            st.session_state.calendar_export_ready = True
+            st.rerun()
+        subscribe_url = feed_url(company_id)
+        if subscribe_url:
+            st.caption("Subscribe from your calendar app:")
+            st.code(subscribe_url, language=None)
+        else:
+            st.caption("Set RENTSTER_FEED_SECRET and RENTSTER_FEED_URL and run "
+                       "`python manage.py serve-feeds` for a subscription URL.")
     
     st.markdown("---")
     
@@ -224,10 +260,12 @@ with st.sidebar:
 st.markdown("---")
 st.subheader("Upcoming Bookings")
 
-upcoming_bookings = bookings_df[
-    (bookings_df['date'].dt.date >= datetime.now().date()) & 
-    (bookings_df['status'].isin(['confirmed', 'pending']))
-].head(10)
+today = datetime.now().date()
+with profiler.section("load upcoming"):
+    upcoming_bookings = load_calendar_data(
+        company_id, today, today + timedelta(days=30), ('confirmed', 'pending')
+    )
+    upcoming_bookings = upcoming_bookings[upcoming_bookings['date'].dt.date >= today].head(10)
 
 if len(upcoming_bookings) > 0:
     for _, booking in upcoming_bookings.iterrows():
@@ -238,13 +276,14 @@ if len(upcoming_bookings) > 0:
         with col2:
             st.write(f"👤 {booking['customer']}")
         with col3:
-            st.write(f"📅 {booking['date']}")
+            st.write(f"📅 {booking['start_date']}")
         with col4:
             status_emoji = "✅" if booking['status'] == 'confirmed' else "⏳"
             st.write(f"{status_emoji} {booking['status'].title()}")
         with col5:
-            if st.button("View", key=f"view_{booking.name}"):
+            if st.button("View", key=f"view_{booking['booking_id']}"):
                 st.info("Booking details would open here")
 else:
     st.info("No upcoming bookings found.")
 
+profiler.render_sidebar()
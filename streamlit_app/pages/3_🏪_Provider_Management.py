@@ -1,8 +1,3 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
 import sys
 import os
 
@@ -11,10 +6,23 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
+from page_profiler import page_profiler
+
+profiler = page_profiler("Provider Management")
+
+with profiler.section("imports"):
+    import streamlit as st
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from datetime import datetime, timedelta
+
 try:
-    from database import Database
+    from database import shared_db
+    from query_stats import shared_stats
     # Initialize database
-    db = Database()
+    db = shared_db()
+    shared_stats(db, page="Provider Management")
 except ImportError:
     # Fallback if database module is not available
     db = None
@@ -148,47 +156,47 @@ elif action == "Manage Items":
     with col3:
         filter_status = st.selectbox("Filter by status", ["All", "Active", "Inactive", "Rented"])
     
-    # Sample items data
-    items_data = {
-        'Item Name': ['MacBook Pro 15', 'Toyota Prius', 'Wireless Projector', 'Professional Camera'],
-        'Category': ['Laptops', 'Vehicles', 'Presentation tech', 'Photography equipment'],
-        'Hourly Price': ['€5.00', '€12.00', '€3.17', '€8.00'],
-        'Daily Price': ['€35.00', '€85.00', '€25.00', '€60.00'],
-        'Status': ['Active', 'Rented', 'Active', 'Active'],
-        'Bookings': [12, 8, 15, 6],
-        'Rating': [4.8, 4.9, 4.7, 4.6]
-    }
+    # Search and filters run in SQL through the full-text index
+    status_values = {"Active": "available", "Inactive": "maintenance", "Rented": "rented"}
+    with profiler.section("search items"):
+        items = db.search_items(
+            search_term,
+            company_id=st.session_state.user['company_id'],
+            category=None if filter_category == "All" else filter_category,
+            status=status_values.get(filter_status),
+            limit=50
+        ) if db else []
     
-    df = pd.DataFrame(items_data)
+    if not items:
+        st.info("No items match your search.")
     
     # Display items with action buttons
-    for idx, row in df.iterrows():
-        with st.container():
-            col1, col2, col3, col4, col5 = st.columns([3, 2, 1, 1, 1])
-            
-            with col1:
-                st.write(f"**{row['Item Name']}**")
-                st.write(f"Category: {row['Category']}")
-            
-            with col2:
-                st.write(f"Hourly: {row['Hourly Price']}")
-                st.write(f"Daily: {row['Daily Price']}")
-            
-            with col3:
-                status_color = "🟢" if row['Status'] == 'Active' else "🔴" if row['Status'] == 'Rented' else "🟡"
-                st.write(f"{status_color} {row['Status']}")
-            
-            with col4:
-                st.write(f"⭐ {row['Rating']}")
-                st.write(f"📅 {row['Bookings']} bookings")
-            
-            with col5:
-                if st.button("Edit", key=f"edit_{idx}"):
-                    st.info(f"Editing {row['Item Name']}")
-                if st.button("Delete", key=f"delete_{idx}"):
-                    st.warning(f"Delete {row['Item Name']}?")
-            
-            st.divider()
+    with profiler.section("item rows"):
+        for item in items:
+            with st.container():
+                col1, col2, col3, col4, col5 = st.columns([3, 2, 1, 1, 1])
+                
+                with col1:
+                    st.write(f"**{item.name}**")
+                    st.write(f"Category: {item.category}")
+                
+                with col2:
+                    st.write(f"Daily: €{item.rental_price_per_day:.2f}")
+                
+                with col3:
+                    status_color = "🟢" if item.availability_status == 'available' else "🔴" if item.availability_status == 'rented' else "🟡"
+                    st.write(f"{status_color} {item.availability_status.title()}")
+                
+                with col4:
+                    st.write(f"📍 {item.location_name or '-'}")
+                
+                with col5:
+                    if st.button("Edit", key=f"edit_{item.item_id}"):
+                        st.info(f"Editing {item.name}")
+                    if st.button("Delete", key=f"delete_{item.item_id}"):
+                        st.warning(f"Delete {item.name}?")
+                
+                st.divider()
 
 elif action == "Bookings":
     st.header("Booking Management")
@@ -196,40 +204,131 @@ elif action == "Bookings":
     # Booking status tabs
     tab1, tab2, tab3, tab4 = st.tabs(["All Bookings", "Pending", "Active", "Completed"])
     
-    with tab1:
-        # Sample booking data
-        bookings_data = {
-            'Booking ID': ['#001', '#002', '#003', '#004'],
-            'Item': ['MacBook Pro 15', 'Toyota Prius', 'Wireless Projector', 'Professional Camera'],
-            'Customer': ['John Doe', 'Jane Smith', 'Mike Johnson', 'Sarah Wilson'],
-            'Start Date': ['2025-09-06', '2025-09-07', '2025-09-08', '2025-09-09'],
-            'End Date': ['2025-09-08', '2025-09-10', '2025-09-08', '2025-09-11'],
-            'Total': ['€70.00', '€255.00', '€25.00', '€180.00'],
-            'Status': ['Active', 'Pending', 'Completed', 'Active']
-        }
+    def booking_page(key, status=None, page_size=50):
+        """One keyset-paged page of the company's bookings, newest first.
+
+        Returns the page, the `after` cursors of every page visited so far
+        (the last one is shown) and whether older bookings follow.
+        """
+        pages = st.session_state.setdefault(f"{key}_pages", [None])
+        with profiler.section(f"{key} page"):
+            bookings = db.get_bookings(
+                company_id=st.session_state.user['company_id'], status=status,
+                after=pages[-1], limit=page_size + 1
+            ) if db else []
+        return bookings[:page_size], pages, len(bookings) > page_size
+    
+    def page_buttons(key, bookings, pages, has_older):
+        col1, col2, col3 = st.columns([1, 1, 4])
+        with col1:
+            if st.button("◀ Newer", key=f"{key}_newer", disabled=len(pages) == 1):
+                pages.pop()
+                st.rerun()
+        with col2:
+            if st.button("Older ▶", key=f"{key}_older", disabled=not has_older):
+                pages.append((bookings[-1].created_at, bookings[-1].booking_id))
+                st.rerun()
+        with col3:
+            st.caption(f"Page {len(pages)}")
+    
+    def show_booking_pages(key, status=None, page_size=50):
+        """The company's bookings newest first, one keyset-paged page at a time"""
+        bookings, pages, has_older = booking_page(key, status, page_size)
+        if not bookings:
+            st.write("No bookings")
+            return
         
-        df_bookings = pd.DataFrame(bookings_data)
-        st.dataframe(df_bookings, use_container_width=True)
+        st.dataframe(pd.DataFrame({
+            'Booking ID': [f"#{b.booking_id:03d}" for b in bookings],
+            'Item': [b.item_name for b in bookings],
+            'Customer': [b.username for b in bookings],
+            'Start Date': [b.start_date for b in bookings],
+            'End Date': [b.end_date for b in bookings],
+            'Total': [f"€{b.total_price:.2f}" for b in bookings],
+            'Status': [b.status.title() for b in bookings],
+        }), use_container_width=True, hide_index=True)
+        page_buttons(key, bookings, pages, has_older)
+    
+    with tab1:
+        show_booking_pages("all_bookings")
     
     with tab2:
         st.info("Pending bookings require your approval")
-        # Filter for pending bookings
-        pending_bookings = df_bookings[df_bookings['Status'] == 'Pending']
-        if not pending_bookings.empty:
-            for idx, booking in pending_bookings.iterrows():
+        if 'booking_notice' in st.session_state:
+            st.success(st.session_state.pop('booking_notice'))
+        
+        pending_bookings, pending_pages, more_pending = booking_page("pending_bookings", status='pending')
+        if not pending_bookings and len(pending_pages) > 1:
+            # The page emptied out after its bookings were approved or declined
+            pending_pages.pop()
+            st.rerun()
+        if pending_bookings:
+            # Batch actions move every selected booking in one transaction
+            selection = st.data_editor(
+                pd.DataFrame({
+                    'Select': False,
+                    'Booking ID': [b.booking_id for b in pending_bookings],
+                    'Item': [b.item_name for b in pending_bookings],
+                    'Customer': [b.username for b in pending_bookings],
+                    'Start Date': [b.start_date for b in pending_bookings],
+                    'End Date': [b.end_date for b in pending_bookings],
+                    'Total': [f"€{b.total_price:.2f}" for b in pending_bookings],
+                }),
+                disabled=['Booking ID', 'Item', 'Customer', 'Start Date', 'End Date', 'Total'],
+                hide_index=True,
+                use_container_width=True,
+                key=f"pending_selection_{len(pending_pages)}"
+            )
+            selected = selection.loc[selection['Select'], 'Booking ID'].tolist()
+            page_buttons("pending_bookings", pending_bookings, pending_pages, more_pending)
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                if st.button(f"✅ Approve Selected ({len(selected)})", disabled=not selected):
+                    changed = db.transition_bookings(selected, 'confirm')
+                    st.session_state.booking_notice = f"Approved {len(changed)} booking(s)"
+                    st.rerun()
+            with col2:
+                if st.button(f"❌ Decline Selected ({len(selected)})", disabled=not selected):
+                    changed = db.transition_bookings(selected, 'decline')
+                    st.session_state.booking_notice = f"Declined {len(changed)} booking(s)"
+                    st.rerun()
+            with col3:
+                if st.button("✅ Approve All Pending"):
+                    # Only the ids are collected, streamed page by page
+                    pending_ids = [b.booking_id for b in db.iter_bookings(
+                        company_id=st.session_state.user['company_id'], status='pending'
+                    )]
+                    changed = db.transition_bookings(pending_ids, 'confirm')
+                    st.session_state.booking_notice = f"Approved {len(changed)} booking(s)"
+                    st.session_state.pending_bookings_pages = [None]
+                    st.rerun()
+            
+            st.divider()
+            for booking in pending_bookings[:10]:
                 with st.container():
                     col1, col2, col3 = st.columns([3, 1, 1])
                     with col1:
-                        st.write(f"**{booking['Item']}** - {booking['Customer']}")
-                        st.write(f"{booking['Start Date']} to {booking['End Date']} - {booking['Total']}")
+                        st.write(f"**{booking.item_name}** - {booking.username}")
+                        st.write(f"{booking.start_date} to {booking.end_date} - €{booking.total_price:.2f}")
                     with col2:
-                        if st.button("Approve", key=f"approve_{idx}"):
-                            st.success("Booking approved!")
+                        if st.button("Approve", key=f"approve_{booking.booking_id}"):
+                            if db.confirm_booking(booking.booking_id):
+                                st.session_state.booking_notice = "Booking approved!"
+                            st.rerun()
                     with col3:
-                        if st.button("Decline", key=f"decline_{idx}"):
-                            st.error("Booking declined!")
+                        if st.button("Decline", key=f"decline_{booking.booking_id}"):
+                            if db.decline_booking(booking.booking_id):
+                                st.session_state.booking_notice = "Booking declined!"
+                            st.rerun()
         else:
             st.write("No pending bookings")
+    
+    with tab3:
+        show_booking_pages("active_bookings", status='confirmed')
+    
+    with tab4:
+        show_booking_pages("completed_bookings", status='completed')
 
 elif action == "Analytics":
     st.header("Provider Analytics")
@@ -337,3 +436,4 @@ elif action == "Settings":
 st.markdown("---")
 st.markdown("**Rental Manager** - Provider Management System")
 
+profiler.render_sidebar()
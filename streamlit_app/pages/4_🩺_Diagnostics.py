@@ -0,0 +1,83 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+
+from database import shared_db
+from query_cache import shared_cache
+from query_stats import QueryEvent, shared_stats
+
+st.set_page_config(page_title="Diagnostics", page_icon="🩺", layout="wide")
+
+# Check if user is logged in
+if 'user' not in st.session_state or st.session_state.user is None:
+    st.error("Please login first")
+    st.stop()
+
+st.title("🩺 Query Diagnostics")
+
+db = shared_db()
+stats = shared_stats(db)
+
+if stats is None:
+    st.info(
+        "Query instrumentation is off. Start the app with `RENTSTER_QUERY_STATS=1` "
+        "to record per-query latency, slow queries and per-page query counts."
+    )
+    st.stop()
+
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    st.metric("Events Recorded", f"{len(stats.events):,}")
+with col2:
+    st.metric("Buffer Capacity", f"{stats.events.maxlen:,}")
+with col3:
+    slow_ms = st.number_input("Slow Query Threshold (ms)", min_value=1.0, value=float(stats.slow_ms), step=5.0)
+    stats.slow_ms = slow_ms
+with col4:
+    if st.button("🗑️ Clear Stats"):
+        stats.clear()
+        st.rerun()
+
+tab1, tab2, tab3, tab4 = st.tabs(["Hot Queries", "Methods", "Slow Query Log", "Pages"])
+
+with tab1:
+    st.subheader("SQL Statements by Total Time")
+    hot = pd.DataFrame(stats.summary('sql'))
+    if hot.empty:
+        st.info("No statements recorded yet")
+    else:
+        st.dataframe(
+            hot.rename(columns={'name': 'statement'}).drop(columns=['rows']),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+with tab2:
+    st.subheader("RentsterDB Methods by Total Time")
+    methods = pd.DataFrame(stats.summary('method'))
+    if methods.empty:
+        st.info("No method calls recorded yet")
+    else:
+        st.dataframe(methods.rename(columns={'name': 'method'}), use_container_width=True, hide_index=True)
+
+with tab3:
+    st.subheader(f"Events Slower Than {stats.slow_ms:g} ms")
+    slow = pd.DataFrame(stats.slow_queries(), columns=QueryEvent._fields)
+    if slow.empty:
+        st.success("No slow queries recorded")
+    else:
+        slow['timestamp'] = slow['timestamp'].map(lambda ts: datetime.fromtimestamp(ts).strftime('%H:%M:%S'))
+        st.dataframe(slow, use_container_width=True, hide_index=True)
+
+with tab4:
+    st.subheader("Queries per Page")
+    st.caption("A statement count that grows with the data shown on a page is the usual sign of an N+1 pattern.")
+    pages = pd.DataFrame(stats.page_summary())
+    if pages.empty:
+        st.info("No page activity recorded yet")
+    else:
+        st.dataframe(pages, use_container_width=True, hide_index=True)
+
+    cache_stats = shared_cache(db).stats()
+    st.subheader("Query Cache")
+    st.json(cache_stats)
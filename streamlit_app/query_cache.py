@@ -0,0 +1,80 @@
+"""Result cache for pages, invalidated by RentsterDB table change counters.
+
+Entries are tagged with the versions of the tables they were computed from
+and are recomputed only when one of those tables has been written since.
+Values are shared between reruns and sessions, so callers must not mutate
+what they get back.
+"""
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+class QueryCache:
+    def __init__(self, db, max_entries=256):
+        self.db = db
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, tables, compute):
+        """Return the cached value for key, calling compute() if any of tables changed"""
+        # Read the versions before computing: a write that lands mid-compute
+        # leaves the entry tagged as stale, so it is recomputed next time.
+        versions = self.db.table_versions(tables)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        
+        value = compute()
+        with self._lock:
+            self._entries[key] = (versions, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+    
+    def cached(self, *tables):
+        """Decorator caching a function's result per arguments until tables change"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+                return self.get(key, tables, lambda: func(*args, **kwargs))
+            return wrapper
+        return decorator
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+def shared_cache(db, max_entries=256):
+    """Process-wide QueryCache for a RentsterDB, shared by every page and session"""
+    with _shared_caches_lock:
+        cache = _shared_caches.get(db.db_path)
+        if cache is None or cache.db is not db:
+            cache = _shared_caches[db.db_path] = QueryCache(db, max_entries)
+        return cache
@@ -0,0 +1,199 @@
+"""Opt-in query instrumentation for RentsterDB.
+
+When RENTSTER_QUERY_STATS=1 is set, shared_stats() attaches a QueryStats
+to the database. Every public RentsterDB method is wrapped to record its
+latency and rows returned, and each pooled connection gets a
+sqlite3 trace callback recording every statement it runs. The callback
+sees statements with their parameters filled in, so the text is
+normalized, collapsing literal values into '?', as it is recorded;
+emails and password hashes never reach the buffer. A statement's time
+runs from when SQLite starts it until the next statement starts on that
+thread or the connection is released, so it includes reading its rows.
+
+Events go into a fixed-size ring buffer (a deque, whose appends are atomic
+and need no lock), tagged with the page that was rendering. Summaries are
+computed from the buffer on demand by the Diagnostics page.
+"""
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from functools import lru_cache, wraps
+from inspect import isgeneratorfunction
+
+from database import env_flag
+
+QueryEvent = namedtuple('QueryEvent', ['timestamp', 'page', 'kind', 'name', 'duration_ms', 'rows'])
+
+# Longest statement text kept per event; json_each() id lists can be huge
+MAX_SQL_LENGTH = 2000
+
+# Plumbing that is either too hot or not a query on its own
+UNINSTRUMENTED = frozenset({'connection', 'transaction', 'get_connection', 'close', 'explain', 'hash_password'})
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    """SQL text with literals replaced by ? and whitespace collapsed"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?, ...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def count_rows(result):
+    """Rows in a RentsterDB result: list length or columnar dict length"""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and result:
+        columns = list(result.values())
+        if all(isinstance(key, str) for key in result) and all(
+                isinstance(column, list) or hasattr(column, 'shape') for column in columns):
+            return len(columns[0])
+    return None
+
+class QueryStats:
+    def __init__(self, capacity=20000, slow_ms=50.0):
+        self.slow_ms = slow_ms
+        self.events = deque(maxlen=capacity)
+        self.page_runs = {}
+        self._local = threading.local()
+
+    def set_page(self, page):
+        """Tag this thread's following queries with a page name and count the rerun"""
+        self._local.page = page
+        self.page_runs[page] = self.page_runs.get(page, 0) + 1
+
+    def trace(self, sql):
+        """sqlite3 trace callback: close the previous statement on this thread, open this one"""
+        if sql.startswith('--'):
+            # Statements run internally by virtual tables
+            return
+        now = time.perf_counter()
+        open_statement = getattr(self._local, 'statement', None)
+        if open_statement is not None:
+            if open_statement[0] == sql:
+                # Trigger programs are reported again with the parent's text
+                return
+            self._record_statement(open_statement[0], now - open_statement[1])
+        self._local.statement = (sql, now)
+
+    def statement_done(self):
+        """Close the open statement on this thread, e.g. when its connection is released"""
+        open_statement = getattr(self._local, 'statement', None)
+        if open_statement is not None:
+            self._local.statement = None
+            self._record_statement(open_statement[0], time.perf_counter() - open_statement[1])
+
+    def wrap(self, name, method):
+        """Timing wrapper recording a method call's latency and rows returned"""
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            self._record('method', name, time.perf_counter() - start, count_rows(result))
+            return result
+        return wrapper
+
+    def _record_statement(self, sql, seconds):
+        # Normalize before truncating, so a cut can't leave a literal unclosed
+        self._record('sql', normalize_sql(sql)[:MAX_SQL_LENGTH], seconds, None)
+
+    def _record(self, kind, name, seconds, rows):
+        page = getattr(self._local, 'page', None)
+        self.events.append(QueryEvent(time.time(), page, kind, name, seconds * 1000.0, rows))
+
+    def summary(self, kind='sql'):
+        """Per-name count, total/p50/p99 latency (ms) and rows, slowest total first"""
+        groups = {}
+        for event in list(self.events):
+            if event.kind == kind:
+                groups.setdefault(event.name, []).append(event)
+        rows = []
+        for name, events in groups.items():
+            durations = sorted(event.duration_ms for event in events)
+            returned = [event.rows for event in events if event.rows is not None]
+            rows.append({
+                'name': name,
+                'count': len(events),
+                'total_ms': sum(durations),
+                'p50_ms': percentile(durations, 0.50),
+                'p99_ms': percentile(durations, 0.99),
+                'rows': sum(returned) if returned else None,
+            })
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def slow_queries(self, limit=100):
+        """Most recent events slower than slow_ms, newest first"""
+        slow = [event for event in list(self.events) if event.duration_ms >= self.slow_ms]
+        return slow[::-1][:limit]
+
+    def page_summary(self):
+        """Per-page reruns and statements/method calls per rerun"""
+        counts = {}
+        for event in list(self.events):
+            page_counts = counts.setdefault(event.page, {'sql': 0, 'method': 0, 'total_ms': 0.0})
+            page_counts[event.kind] += 1
+            if event.kind == 'sql':
+                page_counts['total_ms'] += event.duration_ms
+        rows = []
+        for page, page_counts in counts.items():
+            runs = self.page_runs.get(page, 0)
+            rows.append({
+                'page': page or '(untagged)',
+                'reruns': runs,
+                'statements': page_counts['sql'],
+                'statements_per_rerun': page_counts['sql'] / runs if runs else None,
+                'method_calls': page_counts['method'],
+                'sql_ms': page_counts['total_ms'],
+            })
+        rows.sort(key=lambda row: row['statements'], reverse=True)
+        return rows
+
+    def clear(self):
+        self.events.clear()
+        self.page_runs.clear()
+
+def instrument(db, stats):
+    """Attach stats to a RentsterDB: wrap its public methods and trace its connections"""
+    for name in dir(type(db)):
+        method = getattr(type(db), name)
+        if (name.startswith('_') or name in UNINSTRUMENTED or not callable(method)
+                or isinstance(method, type) or isgeneratorfunction(method)):
+            continue
+        setattr(db, name, stats.wrap(name, getattr(db, name)))
+    db.stats = stats
+
+def enabled():
+    """Whether RENTSTER_QUERY_STATS asks for instrumentation"""
+    return env_flag('RENTSTER_QUERY_STATS')
+
+_shared_stats = {}
+_shared_stats_lock = threading.Lock()
+
+def shared_stats(db, page=None):
+    """Process-wide QueryStats for a RentsterDB, or None when instrumentation is off.
+
+    Pages pass their name so their queries and reruns are counted per page.
+    """
+    if not enabled():
+        return None
+    with _shared_stats_lock:
+        stats = _shared_stats.get(db.db_path)
+        if stats is None or db.stats is not stats:
+            stats = _shared_stats[db.db_path] = QueryStats()
+            instrument(db, stats)
+    if page:
+        stats.set_page(page)
+    return stats
@@ -0,0 +1,345 @@
+"""Report export for the Analytics page.
+
+Reports are streamed: rows are read from a single SQLite cursor in chunks
+and handed straight to the output writer, which writes them to a temporary
+file. Memory stays flat however long the date range is. Jobs run on a
+small thread pool and expose their progress so the page can poll them.
+A finished report's file is deleted once it has been downloaded, or
+REPORT_TTL seconds after it was written if it never is.
+
+Excel output needs openpyxl and PDF output needs reportlab; both are
+imported only when that format is requested.
+"""
+import csv
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+from database import to_iso_date
+
+REPORT_TYPES = ("Revenue Report", "Booking Report", "Customer Report", "Item Performance")
+
+# Format name -> (file extension, MIME type)
+FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'PDF': ('pdf', 'application/pdf'),
+}
+
+# A PDF table past this many rows is unreadable; CSV/Excel carry the full data
+PDF_MAX_ROWS = 5000
+
+# Data rows per Excel worksheet (the format's limit, less the header row)
+EXCEL_MAX_ROWS = 1048575
+
+# Seconds a finished report file is kept for download
+REPORT_TTL = 15 * 60
+
+# Temporary report files are named with this prefix
+REPORT_PREFIX = 'rentster_report_'
+
+# SELECT {select} {source} [GROUP BY {group_by}] {order}. Rows of date-ordered
+# reports carry their date in column date_column, which drives progress.
+ReportQuery = namedtuple('ReportQuery', [
+    'columns', 'select', 'source', 'params', 'group_by', 'order', 'date_column',
+])
+
+def report_query(report_type, company_id, start_date, end_date):
+    """The ReportQuery for a report over [start_date, end_date]"""
+    start, end = to_iso_date(start_date), to_iso_date(end_date)
+    if report_type == "Revenue Report":
+        return ReportQuery(
+            ['day', 'bookings', 'confirmed', 'pending', 'completed', 'cancelled', 'revenue'],
+            "day, bookings, confirmed, pending, completed, cancelled, revenue",
+            "FROM DailyBookingStats WHERE company_id = ? AND day >= ? AND day <= ?",
+            (company_id, start, end),
+            None,
+            "ORDER BY day",
+            0,
+        )
+    # Bookings created in the range; created_at is compared by its date part
+    bookings = '''
+        FROM Bookings b
+        JOIN RentalItems ri ON ri.item_id = b.item_id
+        LEFT JOIN Users u ON u.user_id = b.user_id
+        WHERE ri.company_id = ? AND b.created_at >= ? AND b.created_at < date(?, '+1 day')
+    '''
+    params = (company_id, start, end)
+    revenue = "TOTAL(CASE WHEN b.status IN ('confirmed', 'completed') THEN b.total_price ELSE 0 END)"
+    if report_type == "Booking Report":
+        return ReportQuery(
+            ['booking_id', 'created_at', 'item', 'customer', 'start_date', 'end_date', 'status', 'total_price'],
+            "b.booking_id, b.created_at, ri.name, u.username, b.start_date, b.end_date, b.status, b.total_price",
+            bookings, params, None,
+            # Walks idx_bookings_created, so no sort is needed however many rows match
+            "ORDER BY b.created_at",
+            1,
+        )
+    if report_type == "Customer Report":
+        return ReportQuery(
+            ['customer', 'email', 'bookings', 'cancelled', 'revenue', 'first_booking', 'last_booking'],
+            f"u.username, u.email, COUNT(*), SUM(b.status = 'cancelled'), {revenue}, "
+            "MIN(b.created_at), MAX(b.created_at)",
+            bookings, params, "b.user_id",
+            "ORDER BY 5 DESC",
+            None,
+        )
+    if report_type == "Item Performance":
+        return ReportQuery(
+            ['item_id', 'item', 'category', 'bookings', 'days_booked', 'revenue'],
+            "ri.item_id, ri.name, ri.category, COUNT(*), "
+            "SUM(CASE WHEN b.status != 'cancelled' THEN julianday(b.end_date) - julianday(b.start_date) + 1 ELSE 0 END), "
+            f"{revenue}",
+            bookings, params, "ri.item_id",
+            "ORDER BY 6 DESC",
+            None,
+        )
+    raise ValueError(f"Unknown report type: {report_type}")
+
+def iter_report_chunks(db, report_type, company_id, start_date, end_date, chunk_size=5000):
+    """Yield the report's rows as lists of up to chunk_size tuples from one open cursor.
+
+    For the duration the connection stops memory-mapping the file, which a
+    full scan would otherwise pull into the process up to mmap_size, and
+    sorts for GROUP BY spill to temp files instead of growing in memory.
+    """
+    query = report_query(report_type, company_id, start_date, end_date)
+    group_by = f"GROUP BY {query.group_by}" if query.group_by else ""
+    with db.connection() as conn:
+        mmap_size = conn.execute("PRAGMA mmap_size").fetchone()[0]
+        temp_store = conn.execute("PRAGMA temp_store").fetchone()[0]
+        conn.execute("PRAGMA mmap_size = 0")
+        conn.execute("PRAGMA temp_store = FILE")
+        try:
+            cursor = conn.execute(f"SELECT {query.select} {query.source} {group_by} {query.order}", query.params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+            conn.execute(f"PRAGMA temp_store = {int(temp_store)}")
+
+class CsvReportWriter:
+    full = False
+
+    def __init__(self, path, title, columns):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+        return len(rows)
+
+    def close(self):
+        self._file.close()
+
+class ExcelReportWriter:
+    """Write-only openpyxl workbook; rows go straight to disk, spilling onto new sheets at the row limit"""
+    full = False
+
+    def __init__(self, path, title, columns):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.title = title[:28]
+        self.columns = columns
+        self._workbook = Workbook(write_only=True)
+        self._sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._sheets += 1
+        name = self.title if self._sheets == 1 else f"{self.title[:24]} ({self._sheets})"
+        self._sheet = self._workbook.create_sheet(name)
+        self._sheet.append(self.columns)
+        self._sheet_rows = 0
+
+    def write_rows(self, rows):
+        for row in rows:
+            if self._sheet_rows == EXCEL_MAX_ROWS:
+                self._new_sheet()
+            self._sheet.append(row)
+            self._sheet_rows += 1
+        return len(rows)
+
+    def close(self):
+        self._workbook.save(self.path)
+
+class PdfReportWriter:
+    """Landscape A4 table drawn page by page with reportlab, capped at PDF_MAX_ROWS rows"""
+    def __init__(self, path, title, columns):
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.pdfgen import canvas
+
+        self.title = title
+        self.columns = columns
+        self.width, self.height = landscape(A4)
+        self._canvas = canvas.Canvas(path, pagesize=(self.width, self.height))
+        self._column_width = (self.width - 60) / len(columns)
+        self._rows = 0
+        self.full = False
+        self._new_page(first=True)
+
+    def _new_page(self, first=False):
+        if not first:
+            self._canvas.showPage()
+        self._y = self.height - 40
+        if first:
+            self._canvas.setFont('Helvetica-Bold', 14)
+            self._canvas.drawString(30, self._y, self.title)
+            self._y -= 24
+        self._canvas.setFont('Helvetica-Bold', 8)
+        self._draw_row(self.columns)
+        self._canvas.setFont('Helvetica', 8)
+
+    def _draw_row(self, values):
+        max_chars = int(self._column_width / 4.5)
+        for i, value in enumerate(values):
+            text = '' if value is None else f"{value:,.2f}" if isinstance(value, float) else str(value)
+            self._canvas.drawString(30 + i * self._column_width, self._y, text[:max_chars])
+        self._y -= 12
+
+    def write_rows(self, rows):
+        """Draw rows up to the cap; returns how many were drawn and sets `full` once capped"""
+        rows = rows[:PDF_MAX_ROWS - self._rows]
+        for row in rows:
+            if self._y < 30:
+                self._new_page()
+            self._draw_row(row)
+        self._rows += len(rows)
+        self.full = self._rows >= PDF_MAX_ROWS
+        return len(rows)
+
+    def close(self):
+        if self.full:
+            self._canvas.setFont('Helvetica-Oblique', 8)
+            if self._y < 30:
+                self._new_page()
+            self._canvas.drawString(30, self._y, f"First {PDF_MAX_ROWS:,} rows shown; export CSV or Excel for the full report.")
+        self._canvas.save()
+
+WRITERS = {'CSV': CsvReportWriter, 'Excel': ExcelReportWriter, 'PDF': PdfReportWriter}
+
+class ReportJob:
+    """One report export; run() streams it to a temporary file and tracks progress"""
+    def __init__(self, db, report_type, format_type, company_id, start_date, end_date, chunk_size=5000):
+        if format_type not in FORMATS:
+            raise ValueError(f"Unknown report format: {format_type}")
+        self.db = db
+        self.report_type = report_type
+        self.format_type = format_type
+        self.company_id = company_id
+        self.start_date = to_iso_date(start_date)
+        self.end_date = to_iso_date(end_date)
+        self.chunk_size = chunk_size
+        extension, self.mime = FORMATS[format_type]
+        slug = report_type.lower().replace(' ', '_')
+        self.file_name = f"{slug}_{self.start_date}_{self.end_date}.{extension}"
+        self.path = None
+        self.rows_written = 0
+        self.position = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._cancelled = False
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def progress(self):
+        """Fraction complete, 0.0 to 1.0.
+
+        Date-ordered reports advance with the date of the last row written;
+        grouped reports only arrive once SQLite has aggregated them, so they
+        stay at 0.0 until they are done.
+        """
+        if self.done:
+            return 1.0
+        if self.position is None:
+            return 0.0
+        first = date.fromisoformat(self.start_date)
+        days = (date.fromisoformat(self.end_date) - first).days + 1
+        return min(max((date.fromisoformat(self.position[:10]) - first).days / days, 0.0), 0.99)
+
+    def run(self):
+        self.started_at = time.time()
+        try:
+            query = report_query(self.report_type, self.company_id, self.start_date, self.end_date)
+            fd, self.path = tempfile.mkstemp(prefix=REPORT_PREFIX, suffix='.' + FORMATS[self.format_type][0])
+            os.close(fd)
+            writer = WRITERS[self.format_type](self.path, self.report_type, query.columns)
+            try:
+                for rows in iter_report_chunks(
+                    self.db, self.report_type, self.company_id, self.start_date, self.end_date, self.chunk_size
+                ):
+                    if self._cancelled or writer.full:
+                        break
+                    self.rows_written += writer.write_rows(rows)
+                    if query.date_column is not None:
+                        self.position = rows[-1][query.date_column]
+            finally:
+                writer.close()
+        except Exception as e:
+            self.error = e
+        finally:
+            if self._cancelled or self.error is not None:
+                self.cleanup()
+            else:
+                expiry = threading.Timer(REPORT_TTL, self.cleanup)
+                expiry.daemon = True
+                expiry.start()
+            self.finished_at = time.time()
+            self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """Stop after the current chunk; the partial file is deleted"""
+        self._cancelled = True
+
+    @property
+    def expired(self):
+        """True once the finished report's file is gone"""
+        return self.done and not (self.path and os.path.exists(self.path))
+
+    def cleanup(self):
+        """Delete the output file"""
+        try:
+            if self.path:
+                os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def remove_stale_reports(max_age=REPORT_TTL):
+    """Delete report files in the temp directory untouched for max_age seconds, e.g. left by a restarted server"""
+    directory = tempfile.gettempdir()
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        if not name.startswith(REPORT_PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='report')
+
+def start_report(db, report_type, format_type, company_id, start_date, end_date, chunk_size=5000):
+    """Queue a report export on the background pool and return its ReportJob"""
+    remove_stale_reports()
+    job = ReportJob(db, report_type, format_type, company_id, start_date, end_date, chunk_size)
+    _executor.submit(job.run)
+    return job
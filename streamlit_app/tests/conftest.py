@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+# The app imports its modules by bare name from streamlit_app/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import RentsterDB
+
+@pytest.fixture
+def db(tmp_path):
+    db = RentsterDB(str(tmp_path / "test.db"))
+    yield db
+    db.close()
+
+@pytest.fixture
+def seeded_db(db):
+    """Two companies with located items, customers, bookings, payments and access codes"""
+    with db.transaction() as conn:
+        conn.executemany("INSERT INTO Companies (name) VALUES (?)", [("Acme",), ("Globex",)])
+        conn.executemany('''
+            INSERT INTO Users (username, email, password_hash, role, company_id)
+            VALUES (?, ?, ?, 'customer', NULL)
+        ''', [(f"user{i}", f"user{i}@example.com", db.hash_password('secret')) for i in range(20)])
+        conn.executemany('''
+            INSERT INTO Locations (name, company_id, latitude, longitude) VALUES (?, ?, ?, ?)
+        ''', [(f"Location {i}", 1 + i % 2, 59.0 + i / 10, 24.0 + i / 10) for i in range(10)])
+        conn.executemany('''
+            INSERT INTO RentalItems
+                (name, description, category, company_id, location_id, availability_status, rental_price_per_day)
+            VALUES (?, ?, ?, ?, ?, 'available', ?)
+        ''', [
+            (f"Item {i}", f"A rentable thing number {i}", ('Tools', 'Camping')[i % 2], 1 + i % 2, 1 + i % 10, 10.0 + i)
+            for i in range(60)
+        ])
+        conn.executemany('''
+            INSERT INTO Bookings (item_id, user_id, start_date, end_date, total_price, status, created_at)
+            VALUES (?, ?, ?, ?, 50.0, ?, ?)
+        ''', [
+            (1 + i % 60, 1 + i % 20, f"2026-{1 + i % 12:02d}-{1 + i % 27:02d}", f"2026-{1 + i % 12:02d}-{2 + i % 27:02d}",
+             ('pending', 'confirmed', 'completed', 'cancelled')[i % 4], f"2025-12-{1 + i % 28:02d} {i % 24:02d}:00:00")
+            for i in range(400)
+        ])
+        conn.executemany('''
+            INSERT INTO Payments (booking_id, amount, payment_date, payment_method) VALUES (?, 50.0, ?, 'card')
+        ''', [(1 + i, f"2026-01-{1 + i % 28:02d}") for i in range(100)])
+        conn.executemany('''
+            INSERT INTO AccessControl (location_id, user_id, access_code, valid_from, valid_to) VALUES (?, ?, ?, ?, ?)
+        ''', [(1 + i % 10, 1 + i % 20, f"{1000 + i}", '2026-01-01 00:00:00', '2026-12-31 23:59:59') for i in range(50)])
+    return db
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+import pytest
+
+from availability_index import AvailabilityIndex
+from database import RentsterDB
+
+def test_another_process_rebuilding_never_pairs_old_bits_with_a_new_version(seeded_db):
+    path = seeded_db.db_path + '.avail.npy'
+    start, end = date.today() + timedelta(days=5), date.today() + timedelta(days=6)
+    seeded_db.availability = AvailabilityIndex(seeded_db, path=path)
+    # A second process, with its own connections, rebuilds and publishes a new file
+    other = RentsterDB(seeded_db.db_path)
+    AvailabilityIndex(other, path=path).rebuild()
+
+    # This process then patches its own rows for a booking it makes
+    seeded_db.create_booking(5, 1, start, end, 30.0)
+    assert not seeded_db.availability.is_free(5, start, end)
+
+    # A process starting now must not map a file that lacks that booking as current
+    assert not AvailabilityIndex(other, path=path).is_free(5, start, end)
+    other.close()
+
+def test_loads_the_published_file_when_nothing_changed(seeded_db, monkeypatch):
+    path = seeded_db.db_path + '.avail.npy'
+    start, end = date.today() + timedelta(days=5), date.today() + timedelta(days=6)
+    seeded_db.create_booking(5, 1, start, end, 30.0)
+    built = AvailabilityIndex(seeded_db, path=path)
+
+    monkeypatch.setattr(AvailabilityIndex, 'rebuild', lambda self: pytest.fail("rebuilt a current index"))
+    loaded = AvailabilityIndex(seeded_db, path=path)
+    assert loaded.version == built.version
+    assert not loaded.is_free(5, start, end) and loaded.is_free(6, start, end)
@@ -0,0 +1,31 @@
+import json
+
+def test_bad_rows_are_rejected_without_aborting(db, tmp_path):
+    path = tmp_path / "items.jsonl"
+    rows = [
+        {'name': 'Drill', 'rental_price_per_day': 12.5},
+        {'name': {'nested': 'value'}, 'rental_price_per_day': 5},
+        {'name': 'Saw', 'rental_price_per_day': 'abc'},
+        {'name': 'Ladder', 'rental_price_per_day': '7.25', 'location_id': 1.5},
+        {'name': 'Tent', 'rental_price_per_day': 9, 'availability_status': 'lost'},
+    ]
+    path.write_text('\n'.join(json.dumps(row) for row in rows) + '\n{not json\n'
+                    + json.dumps({'name': 'Kayak', 'rental_price_per_day': '30'}) + '\n')
+
+    result = db.bulk_insert_items(str(path), batch_size=2)
+
+    assert result.inserted == 2
+    assert [line for line, _ in result.errors] == [2, 3, 4, 5, 6]
+    assert [(item.name, item.rental_price_per_day) for item in db.get_rental_items()] == [
+        ('Drill', 12.5), ('Kayak', 30.0),
+    ]
+
+def test_unbindable_value_rejects_only_its_row(db):
+    result = db.bulk_insert_items([
+        {'name': 'Drill', 'rental_price_per_day': 10},
+        {'name': object(), 'rental_price_per_day': 10},
+        {'name': 'Saw', 'rental_price_per_day': 10},
+    ])
+
+    assert result.inserted == 2
+    assert [line for line, _ in result.errors] == [2]
@@ -0,0 +1,70 @@
+import math
+from datetime import date, timedelta
+
+import pytest
+
+from database import EARTH_RADIUS_KM
+
+def destination(latitude, longitude, bearing, distance_km):
+    """The point distance_km from (latitude, longitude) along an initial bearing in degrees"""
+    lat1, lon1, theta = map(math.radians, (latitude, longitude, bearing))
+    angle = distance_km / EARTH_RADIUS_KM
+    lat2 = math.asin(math.sin(lat1) * math.cos(angle) + math.cos(lat1) * math.sin(angle) * math.cos(theta))
+    lon2 = lon1 + math.atan2(math.sin(theta) * math.sin(angle) * math.cos(lat1),
+                             math.cos(angle) - math.sin(lat1) * math.sin(lat2))
+    return math.degrees(lat2), (math.degrees(lon2) + 540) % 360 - 180
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+@pytest.mark.parametrize('latitude, longitude, radius_km', [
+    (0.0, 0.0, 100),
+    (59.4, 24.7, 50),
+    (70.0, 25.0, 500),
+    (-85.0, 10.0, 300),
+    (89.5, 0.0, 100),
+    (10.0, 179.9, 100),
+    (-40.0, -179.5, 200),
+])
+def test_matches_brute_force_at_the_edge(db, latitude, longitude, radius_km):
+    with db.transaction() as conn:
+        company_id = conn.execute("INSERT INTO Companies (name) VALUES ('Acme')").lastrowid
+    points = {}
+    for bearing in range(0, 360, 15):
+        for factor in (0.5, 0.9999, 1.0, 1.0001, 1.05):
+            point = destination(latitude, longitude, bearing, radius_km * factor)
+            location_id = db.create_location(f"{bearing}/{factor}", company_id, latitude=point[0], longitude=point[1])
+            points[location_id] = point
+    with db.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO RentalItems (name, company_id, location_id, availability_status, rental_price_per_day)
+            VALUES ('Item', ?, ?, 'available', 1)
+        ''', [(company_id, location_id) for location_id in points])
+
+    found = {item.location_id for item in db.find_items_near(latitude, longitude, radius_km)}
+
+    expected = {
+        location_id for location_id, (lat, lon) in points.items()
+        if haversine_km(latitude, longitude, lat, lon) <= radius_km
+    }
+    assert found == expected
+    # Every point placed just inside the radius is among them
+    assert len(expected) >= 2 * 24
+
+def test_available_between_agrees_with_the_availability_index(seeded_db):
+    from availability_index import AvailabilityIndex
+
+    start, end = date.today() + timedelta(days=10), date.today() + timedelta(days=12)
+    for item_id in (1, 2, 3, 11):
+        seeded_db.create_booking(item_id, 1, start, end, 30.0)
+    seeded_db.create_booking(4, 1, end + timedelta(days=1), end + timedelta(days=2), 30.0)
+    without_index = seeded_db.find_items_near(59.4, 24.4, 100, available_between=(start, end))
+
+    seeded_db.availability = AvailabilityIndex(seeded_db)
+    with_index = seeded_db.find_items_near(59.4, 24.4, 100, available_between=(start, end))
+
+    assert with_index == without_index
+    assert {1, 2, 3, 11}.isdisjoint(item.item_id for item in with_index)
+    assert 4 in {item.item_id for item in with_index}
@@ -0,0 +1,49 @@
+import threading
+
+def test_writes_inside_a_transaction_run_inline(seeded_db):
+    seeded_db.enable_write_behind()
+    with seeded_db.transaction():
+        user_id = seeded_db.create_user('inline', 'inline@example.com', 'secret')
+        booking_id = seeded_db.create_booking(1, user_id, '2030-01-01', '2030-01-02', 10.0)
+        future = seeded_db.submit_write(seeded_db.create_booking, 2, user_id, '2030-01-01', '2030-01-02', 10.0)
+        assert future.done()
+
+    assert seeded_db.writer.writes == 0
+    bookings = seeded_db.get_bookings(user_id=user_id)
+    assert {booking.booking_id for booking in bookings} == {booking_id, future.result()}
+
+def test_rolled_back_transaction_discards_inline_writes(seeded_db):
+    seeded_db.enable_write_behind()
+    try:
+        with seeded_db.transaction():
+            seeded_db.create_user('gone', 'gone@example.com', 'secret')
+            raise RuntimeError
+    except RuntimeError:
+        pass
+
+    assert seeded_db.authenticate_user('gone@example.com', 'secret') is None
+
+def test_concurrent_top_level_writes_go_through_the_writer(seeded_db):
+    seeded_db.enable_write_behind(max_delay=0.05)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def book(n):
+        barrier.wait()
+        results.append(seeded_db.create_booking(1 + n, 1, '2031-01-01', '2031-01-02', 10.0))
+
+    threads = [threading.Thread(target=book, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 8 and None not in results
+    assert seeded_db.writer.writes == 8
+
+def test_completion_sweep_goes_through_the_writer(seeded_db):
+    seeded_db.enable_write_behind()
+    completed = seeded_db.complete_past_bookings('2100-01-01')
+
+    assert completed and seeded_db.writer.writes == 1
+    assert not seeded_db.get_bookings(status='confirmed')
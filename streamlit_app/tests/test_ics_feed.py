@@ -0,0 +1,110 @@
+import re
+
+from ics_feed import CalendarFeed
+
+def events(feed):
+    """The feed's VEVENT texts; their order within the body is not significant"""
+    return set(re.findall(r'BEGIN:VEVENT.*?END:VEVENT', feed.body().decode('utf-8'), re.DOTALL))
+
+def event_ids(feed):
+    body = feed.body().decode('utf-8')
+    return {int(line.split('-')[1].split('@')[0]) for line in body.splitlines() if line.startswith('UID:')}
+
+def test_item_writes_only_touch_their_own_company(seeded_db):
+    acme, globex = seeded_db.booking_feed_version(1), seeded_db.booking_feed_version(2)
+    with seeded_db.transaction() as conn:
+        # Item 2 belongs to company 2
+        conn.execute("UPDATE RentalItems SET name = 'Renamed', rental_price_per_day = 99 WHERE item_id = 2")
+
+    assert seeded_db.booking_feed_version(1) == acme
+    renamed = seeded_db.booking_feed_version(2)
+    assert renamed[0] > globex[0] and renamed[1] == globex[1]
+    changed = seeded_db.get_booking_feed(2, since_seq=globex[0])
+    assert changed and {booking.item_id for booking in changed} == {2}
+    assert {booking.item_name for booking in changed} == {'Renamed'}
+
+def test_rename_patches_the_cached_feed(seeded_db):
+    feed = CalendarFeed(seeded_db, 2)
+    built = feed.body()
+    with seeded_db.transaction() as conn:
+        conn.execute("UPDATE RentalItems SET name = 'Renamed' WHERE item_id = 2")
+
+    assert b'Renamed' not in built and b'Renamed' in feed.body()
+    assert events(feed) == events(CalendarFeed(seeded_db, 2))
+
+def test_item_moving_company_moves_its_bookings(seeded_db):
+    acme, globex = CalendarFeed(seeded_db, 1), CalendarFeed(seeded_db, 2)
+    moved = {booking.booking_id for booking in seeded_db.get_booking_feed(1, item_id=1)}
+    assert moved and moved & event_ids(acme)
+    version = seeded_db.booking_feed_version(1)
+    event_ids(globex)
+
+    with seeded_db.transaction() as conn:
+        conn.execute("UPDATE RentalItems SET company_id = 2 WHERE item_id = 1")
+
+    assert seeded_db.booking_feed_version(1)[1] == version[1] + 1
+    assert not moved & event_ids(acme)
+    assert moved & event_ids(globex)
+    assert event_ids(acme) == event_ids(CalendarFeed(seeded_db, 1))
+    assert event_ids(globex) == event_ids(CalendarFeed(seeded_db, 2))
+    assert {booking.booking_id for booking in seeded_db.get_booking_feed(2, item_id=1)} == moved
+
+def test_tombstone_keeps_the_booking_dates(seeded_db):
+    booking_id = seeded_db.create_booking(1, 1, '2030-05-01', '2030-05-03', 30.0)
+    since = seeded_db.booking_feed_version(1)[0]
+    with seeded_db.transaction() as conn:
+        conn.execute("DELETE FROM Bookings WHERE booking_id = ?", (booking_id,))
+
+    lines = ''.join(CalendarFeed(seeded_db, 1).iter_changes(since)).splitlines()
+    assert f"UID:booking-{booking_id}@rentster" in lines
+    assert 'DTSTART;VALUE=DATE:20300501' in lines
+    assert 'DTEND;VALUE=DATE:20300504' in lines
+    assert 'STATUS:CANCELLED' in lines
+
+def test_booking_moved_out_of_scope_is_cancelled(seeded_db):
+    # Items 1 and 3 belong to company 1, at locations 1 and 3
+    booking_id = seeded_db.create_booking(1, 1, '2030-06-01', '2030-06-02', 30.0)
+    item_feed, location_feed = CalendarFeed(seeded_db, 1, item_id=1), CalendarFeed(seeded_db, 1, location_id=1)
+    assert booking_id in event_ids(item_feed) and booking_id in event_ids(location_feed)
+    since = seeded_db.booking_feed_version(1)[0]
+
+    with seeded_db.transaction() as conn:
+        conn.execute("UPDATE Bookings SET item_id = 3 WHERE booking_id = ?", (booking_id,))
+
+    for feed in (item_feed, location_feed):
+        lines = ''.join(feed.iter_changes(since)).splitlines()
+        assert f"UID:booking-{booking_id}@rentster" in lines and 'STATUS:CANCELLED' in lines
+        assert booking_id not in event_ids(feed)
+    assert booking_id in event_ids(CalendarFeed(seeded_db, 1, item_id=3))
+
+def test_booking_moved_to_another_company_is_cancelled(seeded_db):
+    booking_id = seeded_db.create_booking(1, 1, '2030-06-01', '2030-06-02', 30.0)
+    acme = CalendarFeed(seeded_db, 1)
+    assert booking_id in event_ids(acme)
+    version = seeded_db.booking_feed_version(1)
+
+    with seeded_db.transaction() as conn:
+        # Item 2 belongs to company 2
+        conn.execute("UPDATE Bookings SET item_id = 2 WHERE booking_id = ?", (booking_id,))
+
+    assert seeded_db.booking_feed_version(1) > version
+    assert f"UID:booking-{booking_id}@rentster" in ''.join(acme.iter_changes(version[0]))
+    assert booking_id not in event_ids(acme)
+
+def test_booking_moved_back_is_not_cancelled(seeded_db):
+    booking_id = seeded_db.create_booking(1, 1, '2030-06-01', '2030-06-02', 30.0)
+    since = seeded_db.booking_feed_version(1)[0]
+    for item_id in (3, 1):
+        with seeded_db.transaction() as conn:
+            conn.execute("UPDATE Bookings SET item_id = ? WHERE booking_id = ?", (item_id, booking_id))
+
+    lines = ''.join(CalendarFeed(seeded_db, 1, item_id=1).iter_changes(since)).splitlines()
+    assert f"UID:booking-{booking_id}@rentster" in lines and 'STATUS:CANCELLED' not in lines
+
+def test_body_is_joined_once_per_version(seeded_db):
+    feed = CalendarFeed(seeded_db, 1)
+    body = feed.body()
+    assert feed.body() is body
+
+    seeded_db.create_booking(1, 1, '2030-07-01', '2030-07-02', 30.0)
+    assert feed.body() is not body and len(feed.body()) > len(body)
@@ -0,0 +1,133 @@
+"""Every public RentsterDB query must be answered through an index.
+
+Each case calls a method with a statement trace on its connection and
+checks the EXPLAIN QUERY PLAN of every statement it ran. A plan may not
+SCAN a table; scans of virtual tables (R*Tree, FTS5, json_each), of
+subquery results and of the constant row are lookups of their own.
+Paged queries must also read rows in page order, without a sort.
+"""
+import inspect
+import re
+
+import pytest
+
+from database import RentsterDB
+
+# name -> call, for every method that runs SQL on behalf of a caller
+QUERIES = {
+    'authenticate_user': lambda db: db.authenticate_user('user1@example.com', 'secret'),
+    'create_user': lambda db: db.create_user('new', 'new@example.com', 'secret'),
+    'create_location': lambda db: db.create_location('New', 1, latitude=59.5, longitude=24.5),
+    'find_items_near': lambda db: db.find_items_near(59.4, 24.4, 50, category='Tools'),
+    'find_items_near(available_between)': lambda db: db.find_items_near(
+        59.4, 24.4, 50, available_between=('2026-03-01', '2026-03-05')
+    ),
+    'get_rental_items(company)': lambda db: db.get_rental_items(1, limit=20),
+    'get_rental_items(company, after)': lambda db: db.get_rental_items(1, after=20, limit=20),
+    'iter_rental_items(company)': lambda db: list(db.iter_rental_items(1, chunk_size=10)),
+    'search_available': lambda db: db.search_available('Tools', '2026-03-01', '2026-03-05', limit=20),
+    'search_available(location, price, after)': lambda db: db.search_available(
+        'Tools', '2026-03-01', '2026-03-05', location_id=3, price_range=(10, 40), after=5, limit=20
+    ),
+    'search_items': lambda db: db.search_items('rentable thing', company_id=1, category='Tools'),
+    'search_items(no terms)': lambda db: db.search_items('', company_id=1, status='available'),
+    'create_booking': lambda db: db.create_booking(1, 1, '2030-01-01', '2030-01-03', 30.0),
+    'transition_bookings': lambda db: db.transition_bookings([1, 2, 3, 4], 'confirm'),
+    'confirm_booking': lambda db: db.confirm_booking(1),
+    'decline_booking': lambda db: db.decline_booking(5),
+    'complete_booking': lambda db: db.complete_booking(2),
+    'cancel_booking': lambda db: db.cancel_booking(6),
+    'complete_past_bookings': lambda db: db.complete_past_bookings('2026-06-01'),
+    'find_conflicts': lambda db: db.find_conflicts([1, 2, 3], '2026-03-01', '2026-03-05'),
+    'get_bookings(user)': lambda db: db.get_bookings(user_id=3, limit=20),
+    'get_bookings(company)': lambda db: db.get_bookings(company_id=1, limit=20),
+    'get_bookings(company, status, after)': lambda db: db.get_bookings(
+        company_id=1, status='pending', after=('2025-12-15 00:00:00', 200), limit=20
+    ),
+    'iter_bookings(company)': lambda db: list(db.iter_bookings(company_id=1, chunk_size=50)),
+    'get_bookings_in_range': lambda db: db.get_bookings_in_range(1, '2026-03-01', '2026-03-31'),
+    'get_dashboard_summary': lambda db: db.get_dashboard_summary(1, as_of='2025-12-20'),
+    'get_daily_stats': lambda db: db.get_daily_stats(1, '2025-12-01', '2025-12-31'),
+    'get_category_stats': lambda db: db.get_category_stats(1, '2025-01', '2025-12'),
+    'get_activity_heatmap': lambda db: db.get_activity_heatmap(1, '2025-12-01', '2025-12-31', category='Tools'),
+    'get_activity_heatmap(location)': lambda db: db.get_activity_heatmap(1, location_id=3),
+    'get_locations': lambda db: db.get_locations(1),
+    'booking_feed_version': lambda db: db.booking_feed_version(1),
+    'get_booking_feed': lambda db: db.get_booking_feed(1, since_seq=100),
+    'get_booking_feed(location, item)': lambda db: db.get_booking_feed(1, location_id=3, item_id=3),
+    'get_booking_moves': lambda db: db.get_booking_moves(1, since_seq=100),
+    'create_access_code': lambda db: db.create_access_code(3, 1, '9999', '2026-01-01', '2026-02-01'),
+    'revoke_access_code': lambda db: db.revoke_access_code(1),
+    'validate_access': lambda db: db.validate_access(3, '1002', at='2026-06-01 12:00:00'),
+    'find_access_grant': lambda db: db.find_access_grant(3, '1002', at='2026-06-01 12:00:00'),
+    'get_access_grants': lambda db: db.get_access_grants(3, '2026-06-01', '2026-06-02'),
+    'get_payments(booking)': lambda db: db.get_payments(booking_id=3),
+    'table_versions': lambda db: db.table_versions(('Bookings', 'RentalItems')),
+    'bulk_insert_items': lambda db: db.bulk_insert_items([{'name': 'Imported', 'rental_price_per_day': 5}]),
+    'bulk_insert_bookings': lambda db: db.bulk_insert_bookings([
+        {'item_id': 1, 'user_id': 1, 'start_date': '2031-01-01', 'end_date': '2031-01-02', 'total_price': 5},
+    ]),
+    'bulk_insert_payments': lambda db: db.bulk_insert_payments([
+        {'booking_id': 1, 'amount': 5, 'payment_date': '2026-01-01'},
+    ]),
+}
+
+# Unfiltered listings read every row by design; they must still come out in order without a sort
+LISTINGS = {
+    'get_rental_items': lambda db: db.get_rental_items(limit=20),
+    'get_bookings': lambda db: db.get_bookings(limit=20),
+    'get_payments': lambda db: db.get_payments(),
+}
+
+# Keyset-paged queries: the ORDER BY must be served by the index walked
+PAGED = {
+    'get_rental_items(company)', 'get_rental_items(company, after)', 'iter_rental_items(company)',
+    'search_available', 'search_available(location, price, after)', 'search_items(no terms)',
+    'get_bookings(user)', 'get_bookings(company)', 'get_bookings(company, status, after)',
+    'iter_bookings(company)',
+}
+
+# Public methods that are plumbing, or rebuild whole tables on purpose
+NOT_QUERIES = {
+    'connection', 'transaction', 'get_connection', 'close', 'explain', 'init_database',
+    'enable_write_behind', 'submit_write', 'hash_password', 'insert_default_plans', 'rebuild_rollups',
+}
+
+_STATEMENT = re.compile(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+def traced_plans(db, call):
+    """EXPLAIN QUERY PLAN lines of each statement `call` runs"""
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            call(db)
+        finally:
+            conn.set_trace_callback(None)
+    statements = [sql for sql in statements if _STATEMENT.match(sql)]
+    assert statements, "no query was traced"
+    return [(' '.join(sql.split()), db.explain(sql)) for sql in statements]
+
+def table_scans(plan):
+    return [
+        line for line in plan
+        if line.startswith('SCAN ') and 'VIRTUAL TABLE' not in line
+        and not line.startswith(('SCAN CONSTANT ROW', 'SCAN (subquery'))
+    ]
+
+def test_every_public_method_has_a_plan_case():
+    public = {name for name, _ in inspect.getmembers(RentsterDB, inspect.isfunction) if not name.startswith('_')}
+    covered = {name.split('(')[0] for name in (*QUERIES, *LISTINGS)}
+    assert public - covered - NOT_QUERIES == set()
+
+@pytest.mark.parametrize('name', sorted(QUERIES))
+def test_query_uses_indexes(seeded_db, name):
+    for sql, plan in traced_plans(seeded_db, QUERIES[name]):
+        assert not table_scans(plan), f"{name} scans a table:\n{sql}\n{plan}"
+        if name in PAGED:
+            assert 'USE TEMP B-TREE FOR ORDER BY' not in plan, f"{name} sorts its pages:\n{sql}\n{plan}"
+
+@pytest.mark.parametrize('name', sorted(LISTINGS))
+def test_listing_is_read_in_order(seeded_db, name):
+    for sql, plan in traced_plans(seeded_db, LISTINGS[name]):
+        assert 'USE TEMP B-TREE FOR ORDER BY' not in plan, f"{name} sorts every row:\n{sql}\n{plan}"
@@ -0,0 +1,14 @@
+from query_stats import QueryStats, instrument
+
+def test_recorded_statements_carry_no_literals(seeded_db):
+    stats = QueryStats()
+    instrument(seeded_db, stats)
+
+    assert seeded_db.authenticate_user('user1@example.com', 'secret') is not None
+
+    recorded = ' '.join(event.name for event in stats.events)
+    assert 'authenticate_user' in recorded
+    assert 'FROM Users' in recorded
+    assert 'user1@example.com' not in recorded
+    assert seeded_db.hash_password('secret') not in recorded
+    assert 'hash_password' not in {event.name for event in stats.events}
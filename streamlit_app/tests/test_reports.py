@@ -0,0 +1,36 @@
+import os
+import time
+
+import reports
+from reports import start_report
+
+def test_finished_report_is_deleted_after_its_ttl(seeded_db, monkeypatch):
+    monkeypatch.setattr(reports, 'REPORT_TTL', 0.2)
+    job = start_report(seeded_db, "Booking Report", 'CSV', 1, '2025-12-01', '2025-12-31')
+    assert job.wait(10) and job.error is None
+    assert job.rows_written == 200 and os.path.exists(job.path)
+
+    deadline = time.monotonic() + 5
+    while not job.expired and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert job.expired
+
+def test_failed_report_leaves_no_file(seeded_db):
+    job = start_report(seeded_db, "No Such Report", 'CSV', 1, '2025-12-01', '2025-12-31')
+    assert job.wait(10)
+    assert job.error is not None
+    assert not job.path or not os.path.exists(job.path)
+
+def test_stale_report_files_are_swept(tmp_path, monkeypatch):
+    monkeypatch.setattr(reports.tempfile, 'gettempdir', lambda: str(tmp_path))
+    stale, fresh, other = (tmp_path / name for name in (
+        reports.REPORT_PREFIX + 'old.csv', reports.REPORT_PREFIX + 'new.csv', 'unrelated.csv',
+    ))
+    for path in (stale, fresh, other):
+        path.write_text('x')
+    os.utime(stale, (time.time() - reports.REPORT_TTL - 60,) * 2)
+    os.utime(other, (time.time() - reports.REPORT_TTL - 60,) * 2)
+
+    reports.remove_stale_reports()
+
+    assert not stale.exists() and fresh.exists() and other.exists()
@@ -0,0 +1,25 @@
+ROLLUPS = {
+    'DailyBookingStats': 'company_id, day',
+    'CategoryMonthlyStats': 'company_id, category, month',
+    'HourlyBookingActivity': 'company_id, day, hour, category',
+}
+
+def rollup_rows(db):
+    """Every rollup table's rows, leaving out rows whose bookings all moved away"""
+    with db.connection() as conn:
+        return {
+            table: conn.execute(f"SELECT * FROM {table} WHERE bookings != 0 ORDER BY {key}").fetchall()
+            for table, key in ROLLUPS.items()
+        }
+
+def test_reassigned_items_take_their_bookings_along(seeded_db):
+    with seeded_db.transaction() as conn:
+        # Item 1 belongs to company 1 and is a tool; items 2 and 4 belong to company 2
+        conn.execute("UPDATE RentalItems SET company_id = 2 WHERE item_id = 1")
+        conn.execute("UPDATE RentalItems SET category = 'Vehicles' WHERE item_id = 2")
+        conn.execute("UPDATE RentalItems SET company_id = 1, category = NULL WHERE item_id = 4")
+    maintained = rollup_rows(seeded_db)
+
+    seeded_db.rebuild_rollups()
+    assert maintained == rollup_rows(seeded_db)
+    assert any(row[1] == 'Vehicles' for row in maintained['CategoryMonthlyStats'])
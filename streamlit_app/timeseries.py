@@ -0,0 +1,131 @@
+"""Server-side downsampling for time-series charts.
+
+A chart can't show more points than it has pixels, so long series are
+reduced before they are handed to Plotly. Spans too long to draw daily
+are first aggregated to weekly or monthly totals. Whatever is still over
+the point budget is thinned with Largest-Triangle-Three-Buckets, which
+keeps the visual shape (peaks and dips) of the line.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Finest first: (pandas frequency, label)
+RESOLUTIONS = (('D', 'Daily'), ('W', 'Weekly'), ('MS', 'Monthly'))
+
+def chart_width_px(default=600):
+    """Plot width line charts are downsampled for, from RENTSTER_CHART_WIDTH_PX.
+
+    The default suits a wide-layout column; set it higher for wide
+    screens, where the extra points become visible.
+    """
+    try:
+        return int(os.environ.get('RENTSTER_CHART_WIDTH_PX', default))
+    except ValueError:
+        return default
+
+def point_budget(width_px, px_per_point=1):
+    """Points worth drawing in a chart width_px wide"""
+    return max(3, int(width_px) // px_per_point)
+
+def lttb_indices(x, y, threshold):
+    """Positions of the points Largest-Triangle-Three-Buckets keeps, in order.
+
+    The first and last points are always kept. The rest are split into
+    threshold - 2 buckets, and each bucket keeps the point forming the
+    largest triangle with the previously kept point and the next bucket's
+    average. Bucket averages are computed for all buckets at once; only
+    the triangle step walks bucket by bucket.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # Each bucket looks ahead to the next one; the last looks at the final point
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[a] - next_x[bucket]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[bucket] - y[a])
+        )
+        a = lo + int(area.argmax())
+        kept[bucket + 1] = a
+    return kept
+
+def minmax_indices(y, n_buckets):
+    """Positions of each bucket's minimum and maximum, in order (fully vectorized)"""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    starts = np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1]
+    counts = np.diff(np.append(starts, n))
+    buckets = np.repeat(np.arange(n_buckets), counts)
+    kept = []
+    for extreme in (np.minimum, np.maximum):
+        # First position in each bucket holding the bucket's extreme value
+        hits = np.flatnonzero(y == np.repeat(extreme.reduceat(y, starts), counts))
+        kept.append(hits[np.unique(buckets[hits], return_index=True)[1]])
+    return np.unique(np.concatenate(kept))
+
+def choose_resolution(start, end, max_points):
+    """Finest (frequency, label) from RESOLUTIONS that fits [start, end] in max_points"""
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for freq, label in RESOLUTIONS:
+        points = {'D': days, 'W': days / 7, 'MS': days / 30.44}[freq]
+        if points <= max_points:
+            return freq, label
+    return RESOLUTIONS[-1]
+
+def downsample_series(data, x, y, width_px=None, start=None, end=None, resample=True, method='lttb'):
+    """Reduce a daily series to what a chart width_px (default chart_width_px()) wide can show.
+
+    Rows outside [start, end] (the visible range) are dropped first. With
+    resample=True, values are summed into weekly or monthly buckets when
+    the span has too many days for the width. Any remaining excess is
+    thinned with LTTB ('lttb') or per-bucket min/max ('minmax'). Returns
+    (frame, resolution label).
+    """
+    dates = pd.to_datetime(data[x])
+    if start is not None or end is not None:
+        visible = np.ones(len(data), dtype=bool)
+        if start is not None:
+            visible &= (dates >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            visible &= (dates <= pd.Timestamp(end)).to_numpy()
+        data, dates = data[visible], dates[visible]
+    if data.empty:
+        return data, RESOLUTIONS[0][1]
+
+    budget = point_budget(chart_width_px() if width_px is None else width_px)
+    label = RESOLUTIONS[0][1]
+    if resample:
+        freq, label = choose_resolution(dates.iloc[0], dates.iloc[-1], budget)
+        if freq != 'D':
+            data = (
+                data.assign(**{x: dates})
+                .resample(freq, on=x)[y].sum()
+                .reset_index()
+            )
+            dates = data[x]
+
+    if len(data) > budget:
+        if method == 'minmax':
+            keep = minmax_indices(data[y].to_numpy(), budget // 2)
+        else:
+            keep = lttb_indices(dates.to_numpy().astype('datetime64[ns]').astype(np.int64), data[y].to_numpy(), budget)
+        data = data.iloc[keep]
+    return data, label